@@ -0,0 +1,157 @@
+"""
+FixIntel AI - Batched API Requests
+Company: RentMouse
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from pydantic import BaseModel
+
+# Most sub-requests one batch may carry, and how many of them run at once
+MAX_BATCH_ITEMS = 20
+MAX_BATCH_CONCURRENCY = 6
+
+# Only API routes can be batched, and never the batch endpoint itself
+BATCHABLE_PREFIX = "/api/"
+BATCH_PATH = "/api/batch"
+
+# Response headers worth passing back to the client per item
+FORWARDED_RESPONSE_HEADERS = ("x-next-cursor", "idempotent-replayed", "etag")
+
+# Status reported for items whose dependency failed (WebDAV "Failed Dependency")
+FAILED_DEPENDENCY = 424
+
+
+class BatchItem(BaseModel):
+    id: Optional[str] = None  # Needed to be referenced from depends_on
+    method: str = "GET"
+    path: str  # e.g. /api/search-parts
+    query: Optional[Dict[str, Any]] = None
+    headers: Optional[Dict[str, str]] = None
+    body: Optional[Any] = None
+    depends_on: List[str] = []
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchItem]
+    stream: bool = False  # Stream results as NDJSON in completion order
+
+
+class BatchError(ValueError):
+    """The batch itself is invalid; no sub-request has been run"""
+
+
+def validate_batch(items: List[BatchItem]):
+    if not items:
+        raise BatchError("Batch is empty")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise BatchError(f"A batch can hold at most {MAX_BATCH_ITEMS} requests")
+
+    ids = [item.id for item in items if item.id is not None]
+    if len(ids) != len(set(ids)):
+        raise BatchError("Request ids must be unique within a batch")
+
+    for item in items:
+        path = item.path.split("?", 1)[0].rstrip("/")
+        if not item.path.startswith(BATCHABLE_PREFIX) or path == BATCH_PATH:
+            raise BatchError(f"Path {item.path} cannot be batched")
+        for dependency in item.depends_on:
+            if dependency not in ids:
+                raise BatchError(f"Request {item.id} depends on unknown request {dependency}")
+
+    # Reject cycles up front, they would never finish
+    graph = {item.id: item.depends_on for item in items if item.id is not None}
+    visiting, done = set(), set()
+
+    def visit(node: str):
+        if node in done:
+            return
+        if node in visiting:
+            raise BatchError(f"Dependency cycle through request {node}")
+        visiting.add(node)
+        for dependency in graph[node]:
+            visit(dependency)
+        visiting.discard(node)
+        done.add(node)
+
+    for node in graph:
+        visit(node)
+
+
+class BatchExecutor:
+    """Runs batched sub-requests against the app in-process, without a network hop.
+
+    Sub-requests go through the full ASGI stack (middleware, validation,
+    exception handlers), so each behaves exactly like the standalone call.
+    Items without unmet dependencies run concurrently.
+    """
+
+    def __init__(self, app, concurrency: int = MAX_BATCH_CONCURRENCY):
+        self.app = app
+        self.concurrency = concurrency
+
+    async def _call(self, client: httpx.AsyncClient, item: BatchItem) -> Dict[str, Any]:
+        response = await client.request(
+            item.method.upper(),
+            item.path,
+            params=item.query,
+            headers=item.headers,
+            json=item.body,
+        )
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text
+        result = {"status": response.status_code, "body": body}
+        headers = {k: v for k, v in response.headers.items() if k.lower() in FORWARDED_RESPONSE_HEADERS}
+        if headers:
+            result["headers"] = headers
+        return result
+
+    async def run(self, items: List[BatchItem]) -> AsyncIterator[Dict[str, Any]]:
+        """Yield one result per item as it completes; items must have passed validate_batch"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        finished: Dict[str, asyncio.Future] = {
+            item.id: asyncio.get_running_loop().create_future() for item in items if item.id is not None
+        }
+        results: asyncio.Queue = asyncio.Queue()
+
+        transport = httpx.ASGITransport(app=self.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://batch") as client:
+
+            async def execute(index: int, item: BatchItem):
+                try:
+                    statuses = [await asyncio.shield(finished[d]) for d in item.depends_on]
+                    if any(status >= 400 for status in statuses):
+                        result = {"status": FAILED_DEPENDENCY, "body": {"detail": "A dependency failed"}}
+                    else:
+                        async with semaphore:
+                            result = await self._call(client, item)
+                except Exception as e:
+                    result = {"status": 500, "body": {"detail": str(e)}}
+                if item.id is not None:
+                    finished[item.id].set_result(result["status"])
+                await results.put({"index": index, "id": item.id, **result})
+
+            tasks = [asyncio.ensure_future(execute(i, item)) for i, item in enumerate(items)]
+            try:
+                for _ in items:
+                    yield await results.get()
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+
+async def collect_batch(executor: BatchExecutor, items: List[BatchItem]) -> List[Dict[str, Any]]:
+    """Run a batch and return the results in request order"""
+    results = [result async for result in executor.run(items)]
+    return sorted(results, key=lambda r: r["index"])
+
+
+async def stream_batch(executor: BatchExecutor, items: List[BatchItem]) -> AsyncIterator[bytes]:
+    """Run a batch, emitting each result as an NDJSON line as soon as it is ready"""
+    async for result in executor.run(items):
+        yield (json.dumps(result, default=str) + "\n").encode("utf-8")
@@ -0,0 +1,60 @@
+"""
+FixIntel AI - Client Disconnect Cancellation
+Company: RentMouse
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Set
+
+from starlette.requests import Request
+
+logger = logging.getLogger(__name__)
+
+# Status code used for responses nobody is waiting for (nginx convention)
+CLIENT_CLOSED_REQUEST = 499
+
+# Strong references to detached tasks so they are not garbage collected mid-flight
+_detached_tasks: Set[asyncio.Task] = set()
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client went away before the response was ready"""
+
+
+async def run_until_disconnect(request: Request, work: Awaitable[Any], detach: bool = False,
+                               poll_interval: float = 0.25) -> Any:
+    """Run work as a task tied to the lifetime of the HTTP request.
+
+    If the client disconnects first, the task is cancelled, or when detach is
+    set (the result is cacheable) left to finish in the background so its
+    result lands in the cache for the client's retry. Either way
+    ClientDisconnected is raised to unwind the handler.
+    """
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                break
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+
+    if detach:
+        _detached_tasks.add(task)
+        task.add_done_callback(_finish_detached)
+        logger.info(f"Client disconnected from {request.url.path}, finishing work detached")
+    else:
+        task.cancel()
+        logger.info(f"Client disconnected from {request.url.path}, cancelled outstanding work")
+    raise ClientDisconnected()
+
+
+def _finish_detached(task: asyncio.Task):
+    _detached_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning(f"Detached task failed: {str(task.exception())}")
+
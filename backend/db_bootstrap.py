@@ -0,0 +1,552 @@
+"""
+FixIntel AI - Index Bootstrap and Data Migrations
+Company: RentMouse
+"""
+
+import asyncio
+import logging
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+
+from idempotency import IDEMPOTENCY_TTL_SECONDS
+from search import POST_TEXT_INDEX, REPAIR_TEXT_INDEX
+from feed_ranking import SET_HOT_SCORE
+from spam_detection import FINGERPRINT_TTL_SECONDS
+from sync import TOMBSTONE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Indexes every collection needs, keyed by collection name. Names are explicit
+# so drift can be detected by comparing against what the server reports.
+REQUIRED_INDEXES: Dict[str, List[IndexModel]] = {
+    "repairs": [
+        IndexModel([("repair_id", ASCENDING)], name="repair_id_unique", unique=True),
+        REPAIR_TEXT_INDEX,
+    ],
+    "repair_sessions": [
+        IndexModel([("user_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)], name="user_updated_id"),
+        IndexModel([("repair_id", ASCENDING)], name="repair_id"),
+        IndexModel([("user_id", ASCENDING), ("repair_id", ASCENDING)], name="user_repair_unique", unique=True),
+    ],
+    "community_posts": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("timestamp", DESCENDING), ("id", DESCENDING)], name="timestamp_id"),
+        IndexModel([("score", DESCENDING), ("id", DESCENDING)], name="score_id"),
+        IndexModel([("updated_at", ASCENDING), ("id", ASCENDING)], name="updated_at_id"),
+        POST_TEXT_INDEX,
+        IndexModel(
+            [("pending_reports", DESCENDING), ("last_reported_at", DESCENDING), ("id", DESCENDING)],
+            name="moderation_queue", partialFilterExpression={"pending_reports": {"$gt": 0}}
+        ),
+    ],
+    "post_fingerprints": [
+        IndexModel([("text_bands", ASCENDING)], name="text_bands"),
+        IndexModel([("image_bands", ASCENDING)], name="image_bands"),
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=FINGERPRINT_TTL_SECONDS),
+    ],
+    "post_likes": [
+        IndexModel([("post_id", ASCENDING), ("user_id", ASCENDING)], name="post_user_unique", unique=True),
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+    ],
+    # GridFS creates the first two itself; they are declared so they are not reported as drift
+    "images.files": [
+        IndexModel([("filename", ASCENDING), ("uploadDate", ASCENDING)], name="filename_1_uploadDate_1"),
+        IndexModel([("metadata.digest", ASCENDING), ("metadata.rendition", ASCENDING)], name="digest_rendition"),
+    ],
+    "images.chunks": [
+        IndexModel([("files_id", ASCENDING), ("n", ASCENDING)], name="files_id_1_n_1", unique=True),
+    ],
+    "reports": [
+        IndexModel([("status", ASCENDING), ("timestamp", DESCENDING)], name="status_timestamp"),
+        IndexModel([("post_id", ASCENDING)], name="post_id"),
+        IndexModel(
+            [("post_id", ASCENDING), ("reporter_key", ASCENDING)], name="post_reporter_unique", unique=True,
+            partialFilterExpression={"reporter_key": {"$type": "string"}}
+        ),
+    ],
+    "gamification_profiles": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+        IndexModel([("xp", DESCENDING)], name="xp"),
+        IndexModel([("updated_at", ASCENDING)], name="updated_at"),
+    ],
+    "leaderboard_snapshots": [
+        IndexModel([("board", ASCENDING), ("generation", ASCENDING), ("chunk", ASCENDING)], name="board_generation_chunk"),
+    ],
+    "xp_events": [
+        IndexModel(
+            [("user_id", ASCENDING), ("repair_id", ASCENDING), ("kind", ASCENDING), ("step_number", ASCENDING)],
+            name="user_repair_kind_step_unique", unique=True
+        ),
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING)], name="user_created_at"),
+        IndexModel([("created_at", ASCENDING)], name="created_at"),
+        IndexModel([("occurred_at", ASCENDING)], name="occurred_at"),
+        IndexModel([("created_at", ASCENDING)], name="unapplied_created_at",
+                   partialFilterExpression={"applied": False}),
+    ],
+    "xp_buckets": [
+        IndexModel([("window", ASCENDING), ("period", ASCENDING), ("user_id", ASCENDING)],
+                   name="window_period_user_unique", unique=True),
+        IndexModel([("window", ASCENDING), ("period", ASCENDING), ("xp", DESCENDING)], name="window_period_xp"),
+        IndexModel([("window", ASCENDING), ("period", ASCENDING), ("updated_at", ASCENDING)],
+                   name="window_period_updated_at"),
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=0),
+    ],
+    "xp_snapshots": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+    ],
+    "user_insights": [
+        IndexModel([("user_id", ASCENDING)], name="user_id_unique", unique=True),
+        IndexModel([("reconciled_at", ASCENDING)], name="reconciled_at"),
+    ],
+    "usage": [
+        IndexModel(
+            [("hour", ASCENDING), ("endpoint", ASCENDING), ("model", ASCENDING), ("user_id", ASCENDING)],
+            name="hour_endpoint_model_user", unique=True
+        ),
+    ],
+    "tombstones": [
+        IndexModel([("user_id", ASCENDING), ("deleted_at", ASCENDING)], name="user_deleted_at"),
+        IndexModel([("deleted_at", ASCENDING)], name="deleted_at_ttl", expireAfterSeconds=TOMBSTONE_TTL_SECONDS),
+    ],
+    "idempotency_keys": [
+        IndexModel([("created_at", ASCENDING)], name="created_at_ttl", expireAfterSeconds=IDEMPOTENCY_TTL_SECONDS),
+    ],
+}
+
+# Index options that matter when comparing a declared index to an existing one
+_COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression", "weights")
+
+
+def _index_options(spec: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: spec[k] for k in _COMPARED_OPTIONS if k in spec}
+
+
+def _index_keys(keys) -> List[tuple]:
+    """Normalize key specs; text indexes are stored as _fts/_ftsx and compared by weights instead"""
+    pairs = [(k, int(v) if isinstance(v, float) else v) for k, v in keys]
+    if any(k == "_fts" or v == "text" for k, v in pairs):
+        return [("text", "text")]
+    return pairs
+
+
+async def ensure_indexes(db, include_unique: bool = True) -> Dict[str, Any]:
+    """Create missing indexes and report drift from the declared set.
+
+    Existing indexes whose keys or options differ from the declaration, and
+    indexes that are not declared at all, are reported but never dropped.
+    With include_unique false, missing unique indexes are reported as
+    deferred instead of built, for when the migrations that dedupe their
+    data have not run.
+    """
+    report: Dict[str, Any] = {"created": [], "mismatched": [], "unexpected": [], "failed": [], "deferred": [],
+                              "checked_at": datetime.utcnow()}
+
+    for collection_name, models in REQUIRED_INDEXES.items():
+        collection = db[collection_name]
+        existing = await collection.index_information()
+        declared_names = set()
+
+        for model in models:
+            declared = model.document
+            name = declared["name"]
+            declared_names.add(name)
+            declared_keys = list(declared["key"].items())
+            options = {k: v for k, v in declared.items() if k != "key"}
+
+            current = existing.get(name)
+            if current is None and declared.get("unique") and not include_unique:
+                report["deferred"].append(f"{collection_name}.{name}")
+                continue
+            if current is None:
+                try:
+                    await collection.create_indexes([IndexModel(declared_keys, background=True, **options)])
+                    report["created"].append(f"{collection_name}.{name}")
+                    logger.info(f"Created index {collection_name}.{name}")
+                except Exception as e:
+                    report["failed"].append({"index": f"{collection_name}.{name}", "error": str(e)})
+                    logger.error(f"Failed to create index {collection_name}.{name}: {str(e)}")
+                continue
+
+            if _index_keys(current["key"]) != _index_keys(declared_keys) or \
+                    _index_options(current) != _index_options(declared):
+                report["mismatched"].append(f"{collection_name}.{name}")
+                logger.warning(f"Index {collection_name}.{name} differs from its declaration")
+
+        for name in existing:
+            if name != "_id_" and name not in declared_names:
+                report["unexpected"].append(f"{collection_name}.{name}")
+
+    if report["unexpected"]:
+        logger.warning(f"Undeclared indexes found: {', '.join(report['unexpected'])}")
+    return report
+
+
+# ============ DATA MIGRATIONS ============
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    apply: Callable[[Any], Awaitable[None]]
+
+
+MIGRATIONS: List[Migration] = []
+
+MIGRATION_LOCK_ID = "lock"
+# A lock not renewed for this long belongs to a dead worker; it is renewed after every migration
+MIGRATION_LOCK_TTL = timedelta(minutes=30)
+# Seconds between attempts while another worker holds the lock
+MIGRATION_LOCK_POLL = 5.0
+
+
+def migration(version: int, name: str):
+    """Register a data migration; versions run once each, in ascending order"""
+    def register(fn: Callable[[Any], Awaitable[None]]):
+        if any(m.version == version for m in MIGRATIONS):
+            raise ValueError(f"Duplicate migration version {version}")
+        MIGRATIONS.append(Migration(version, name, fn))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+    return register
+
+
+async def _acquire_migration_lock(history, token: str):
+    """Wait until this worker holds the migration lock, stealing it from a dead holder"""
+    waiting = False
+    while True:
+        now = datetime.utcnow()
+        try:
+            await history.insert_one({"_id": MIGRATION_LOCK_ID, "token": token, "acquired_at": now})
+            return
+        except DuplicateKeyError:
+            stolen = await history.find_one_and_update(
+                {"_id": MIGRATION_LOCK_ID, "acquired_at": {"$lt": now - MIGRATION_LOCK_TTL}},
+                {"$set": {"token": token, "acquired_at": now}}
+            )
+            if stolen is not None:
+                logger.warning("Took over a stale migration lock")
+                return
+        if not waiting:
+            logger.info("Migrations are running in another worker, waiting for them to finish")
+            waiting = True
+        await asyncio.sleep(MIGRATION_LOCK_POLL)
+
+
+async def run_migrations(db) -> List[str]:
+    """Apply pending migrations, holding a lock so only one worker runs them.
+
+    Workers that find the lock taken wait for the holder to finish rather
+    than going on to build indexes over data it has not migrated yet; by
+    the time they get the lock there is usually nothing left to apply.
+    """
+    history = db.schema_migrations
+    token = uuid.uuid4().hex
+    await _acquire_migration_lock(history, token)
+
+    applied = []
+    try:
+        done = {doc["_id"] async for doc in history.find({"_id": {"$type": "int"}}, {"_id": 1})}
+        for m in MIGRATIONS:
+            if m.version in done:
+                continue
+            logger.info(f"Applying migration {m.version}: {m.name}")
+            await m.apply(db)
+            await history.insert_one({"_id": m.version, "name": m.name, "applied_at": datetime.utcnow()})
+            applied.append(f"{m.version}:{m.name}")
+            # Renew the lock so a long series of migrations is not taken for a dead worker
+            renewed = await history.update_one({"_id": MIGRATION_LOCK_ID, "token": token},
+                                               {"$set": {"acquired_at": datetime.utcnow()}})
+            if renewed.matched_count == 0:
+                raise RuntimeError("Lost the migration lock to another worker")
+    finally:
+        await history.delete_one({"_id": MIGRATION_LOCK_ID, "token": token})
+    return applied
+
+
+async def bootstrap_database(db) -> Dict[str, Any]:
+    """Run pending migrations, then bring indexes in line with the declarations.
+
+    Migrations go first so they can clean up data (such as duplicates) that
+    would stop a declared unique index from being built. If one fails, the
+    other indexes are still built and the unique ones are deferred to the
+    next run; the error is returned in the report.
+    """
+    try:
+        migrations_applied, migration_error = await run_migrations(db), None
+    except Exception as e:
+        logger.error(f"Error running migrations: {str(e)}")
+        migrations_applied, migration_error = [], str(e)
+    report = await ensure_indexes(db, include_unique=migration_error is None)
+    report["migrations_applied"] = migrations_applied
+    report["migration_error"] = migration_error
+    return report
+
+
+async def applied_migrations(db) -> List[Dict[str, Any]]:
+    return await db.schema_migrations.find({"_id": {"$type": "int"}}).sort("_id", ASCENDING).to_list(None)
+
+
+async def schema_requirements_met(db, migrations: Iterable[int], indexes: Dict[str, Iterable[str]]) -> bool:
+    """Whether the given migrations have been applied and the named indexes exist"""
+    versions = set(migrations)
+    if await db.schema_migrations.count_documents({"_id": {"$in": list(versions)}}) < len(versions):
+        return False
+    for collection_name, names in indexes.items():
+        existing = await db[collection_name].index_information()
+        if any(name not in existing for name in names):
+            return False
+    return True
+
+
+@migration(1, "backfill_repair_session_updated_at")
+async def backfill_repair_session_updated_at(db):
+    """Sessions without updated_at fall out of the (user_id, updated_at) index order"""
+    await db.repair_sessions.update_many(
+        {"updated_at": {"$exists": False}},
+        [{"$set": {"updated_at": {"$ifNull": ["$timestamp", "$$NOW"]}}}]
+    )
+
+
+@migration(2, "dedupe_repair_sessions")
+async def dedupe_repair_sessions(db):
+    """Saves used to insert a new session each time; keep the latest per (user_id, repair_id)"""
+    duplicates = db.repair_sessions.aggregate([
+        {"$sort": {"updated_at": -1, "_id": -1}},
+        {"$group": {"_id": {"user_id": "$user_id", "repair_id": "$repair_id"},
+                    "ids": {"$push": "$_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+
+    affected_users = set()
+    async for group in duplicates:
+        await db.repair_sessions.delete_many({"_id": {"$in": group["ids"][1:]}})
+        affected_users.add(group["_id"].get("user_id"))
+
+    # Their insight rollups counted the duplicates; drop them to be rebuilt on next read
+    if affected_users:
+        await db.user_insights.delete_many({"user_id": {"$in": list(affected_users)}})
+
+
+@migration(3, "extract_inline_post_images")
+async def extract_inline_post_images(db):
+    """Move base64 images embedded in community posts into the image store"""
+    from image_store import ImageStore
+
+    # Indexes are normally built after migrations; put() looks images up by digest
+    await db["images.files"].create_indexes(REQUIRED_INDEXES["images.files"])
+    store = ImageStore(db)
+    try:
+        posts = db.community_posts.find(
+            {"$or": [{"before_image": {"$type": "string"}}, {"after_image": {"$type": "string"}}]},
+            {"before_image": 1, "after_image": 1}
+        )
+        async for post in posts:
+            changes, removed = {}, {}
+            for field in ("before_image", "after_image"):
+                if isinstance(post.get(field), str) and post[field]:
+                    changes[f"{field}_ref"] = await store.put_base64(post[field])
+                    removed[field] = ""
+            if changes:
+                await db.community_posts.update_one({"_id": post["_id"]}, {"$set": changes, "$unset": removed})
+    finally:
+        store.shutdown()
+
+
+@migration(4, "backfill_post_hot_scores")
+async def backfill_post_hot_scores(db):
+    """Posts need a score to appear in the hot feed at all"""
+    await db.community_posts.update_many({"score": {"$exists": False}}, [SET_HOT_SCORE])
+
+
+@migration(5, "backfill_post_report_counters")
+async def backfill_post_report_counters(db):
+    """Count existing reports onto their posts so they show up in the moderation queue.
+
+    Posts over the auto-hide threshold are not hidden retroactively; the
+    queue puts them first for a moderator instead.
+    """
+    counts = db.reports.aggregate([
+        {"$group": {
+            "_id": "$post_id",
+            "report_count": {"$sum": 1},
+            "pending_reports": {"$sum": {"$cond": [{"$eq": ["$status", "pending"]}, 1, 0]}},
+            "last_reported_at": {"$max": "$timestamp"},
+        }},
+    ], allowDiskUse=True)
+    async for c in counts:
+        await db.community_posts.update_one(
+            {"id": c["_id"]},
+            {"$set": {"report_count": c["report_count"], "pending_reports": c["pending_reports"],
+                      "last_reported_at": c["last_reported_at"]}}
+        )
+    # Reports now weigh on the hot score
+    await db.community_posts.update_many({"report_count": {"$gt": 0}}, [SET_HOT_SCORE])
+
+
+# Badges of the old total_xp engine that have an equivalent achievement
+LEGACY_BADGE_ACHIEVEMENTS = {"first_repair": "first_repair", "speed_demon": "speed_demon",
+                             "diy_enthusiast": "five_repairs", "master_fixer": "ten_repairs"}
+LEGACY_PROFILE_FIELDS = ("total_xp", "level", "badges_earned", "stats", "last_activity_date", "last_repair_date")
+
+
+@migration(6, "unify_gamification_profiles")
+async def unify_gamification_profiles(db):
+    """Merge duplicate profiles and convert both legacy shapes to the single engine's.
+
+    Profiles came from two engines: one kept total_xp with stats and badges,
+    the other xp with ISO date strings. Each engine's awards only ever went
+    to its own field, and the current engine adds to xp, so a profile's XP
+    is the sum of the two. Both created profiles with find_one/insert_one,
+    so a user could end up with several; the one with the most XP is kept
+    and the XP of the others is added to it.
+    """
+    from gamification import ACHIEVEMENTS, day_number
+
+    profiles = db.gamification_profiles
+    duplicates = profiles.aggregate([
+        {"$addFields": {"_xp": {"$add": [{"$ifNull": ["$xp", 0]}, {"$ifNull": ["$total_xp", 0]}]}}},
+        {"$sort": {"_xp": -1, "_id": 1}},
+        {"$group": {"_id": "$user_id", "ids": {"$push": "$_id"}, "xp": {"$push": "$_xp"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True)
+    async for group in duplicates:
+        kept = group["ids"][0]
+        for duplicate_id, xp in zip(group["ids"][1:], group["xp"][1:]):
+            # merged_from makes the add happen once even if the run is interrupted before the delete
+            await profiles.update_one(
+                {"_id": kept, "merged_from": {"$ne": duplicate_id}},
+                {"$inc": {"xp": xp}, "$push": {"merged_from": duplicate_id}}
+            )
+            await profiles.delete_one({"_id": duplicate_id})
+    await profiles.update_many({"merged_from": {"$exists": True}}, {"$unset": {"merged_from": ""}})
+
+    achievements_by_id = {a["id"]: a for a in ACHIEVEMENTS}
+    legacy = profiles.find({"$or": [
+        {"total_xp": {"$exists": True}},
+        {"last_repair_date": {"$exists": True}},
+        {"updated_at": {"$type": "string"}},
+    ]})
+    async for profile in legacy:
+        stats = profile.get("stats") or {}
+        achievements = list(profile.get("achievements") or [])
+        held = {a.get("id") for a in achievements}
+        for badge in profile.get("badges_earned") or []:
+            achievement_id = LEGACY_BADGE_ACHIEVEMENTS.get(badge)
+            if achievement_id and achievement_id not in held:
+                achievements.append(achievements_by_id[achievement_id])
+                held.add(achievement_id)
+
+        changes = {
+            "xp": (profile.get("xp") or 0) + (profile.get("total_xp") or 0),
+            "total_steps_completed": max(profile.get("total_steps_completed", 0), stats.get("steps_completed", 0)),
+            "total_repairs_completed": max(profile.get("total_repairs_completed", 0), stats.get("completed_repairs", 0)),
+            "current_streak": profile.get("current_streak", 0),
+            "longest_streak": profile.get("longest_streak", 0),
+            "achievements": achievements,
+        }
+        last_repair = profile.get("last_repair_date") or profile.get("last_activity_date")
+        if isinstance(last_repair, str):
+            last_repair = datetime.fromisoformat(last_repair)
+        if last_repair:
+            changes["last_repair_day"] = day_number(last_repair)
+        # Sync compares updated_at against datetimes
+        for field in ("created_at", "updated_at"):
+            value = profile.get(field)
+            changes[field] = datetime.fromisoformat(value) if isinstance(value, str) else value or datetime.utcnow()
+
+        await profiles.update_one(
+            {"_id": profile["_id"]},
+            {"$set": changes, "$unset": {field: "" for field in LEGACY_PROFILE_FIELDS}}
+        )
+
+
+@migration(7, "backfill_xp_events")
+async def backfill_xp_events(db):
+    """Move each profile's completed_steps array into the xp_events ledger.
+
+    The events are dated at migration time and marked backfilled, since the
+    work was done at some unknown earlier time and must not count toward a
+    current week or month; their keys keep deduping repeats after
+    compaction like any other event's.
+    """
+    from pymongo.errors import BulkWriteError
+    from xp_ledger import STEP_EVENT, xp_event
+    from gamification import STEP_XP
+
+    # Indexes are normally built after migrations; the unique one is needed now to dedupe
+    await db.xp_events.create_indexes(REQUIRED_INDEXES["xp_events"])
+
+    now = datetime.utcnow()
+    profiles = db.gamification_profiles.find({"completed_steps": {"$exists": True}}, {"user_id": 1, "completed_steps": 1})
+    async for profile in profiles:
+        events = []
+        for step_key in profile.get("completed_steps") or []:
+            repair_id, _, step_number = str(step_key).rpartition("_")
+            if repair_id and step_number.lstrip("-").isdigit():
+                events.append(xp_event(profile["user_id"], STEP_EVENT, repair_id, int(step_number), STEP_XP, now,
+                                       backfilled=True))
+        if events:
+            try:
+                await db.xp_events.insert_many(events, ordered=False)
+            except BulkWriteError:
+                pass  # Already recorded by a previous, interrupted run
+        await db.gamification_profiles.update_one({"_id": profile["_id"]}, {"$unset": {"completed_steps": ""}})
+
+
+@migration(8, "backfill_post_updated_at")
+async def backfill_post_updated_at(db):
+    """Sync selects posts by updated_at; older posts were last changed at most when last reported"""
+    await db.community_posts.update_many(
+        {"updated_at": {"$exists": False}},
+        [{"$set": {"updated_at": {"$max": ["$timestamp", {"$ifNull": ["$last_reported_at", "$timestamp"]}]}}}]
+    )
+
+
+@migration(9, "split_legacy_post_likes")
+async def split_legacy_post_likes(db):
+    """Keep likes counted before post_likes existed, which have no rows to recount.
+
+    Likes used to be plain increments. Each post's legacy_likes is what its
+    counter holds beyond its post_likes rows, and the like recount only
+    touches posts that have the field, adding it to the rows it counts.
+    """
+    counts = db.post_likes.aggregate([{"$group": {"_id": "$post_id", "count": {"$sum": 1}}}], allowDiskUse=True)
+    async for row in counts:
+        await db.community_posts.update_one(
+            {"id": row["_id"], "legacy_likes": {"$exists": False}},
+            [{"$set": {"legacy_likes": {"$max": [{"$subtract": [{"$ifNull": ["$likes", 0]}, row["count"]]}, 0]}}}]
+        )
+    await db.community_posts.update_many(
+        {"legacy_likes": {"$exists": False}},
+        [{"$set": {"legacy_likes": {"$ifNull": ["$likes", 0]}}}]
+    )
+
+
+@migration(10, "mark_backfilled_xp_events")
+async def mark_backfilled_xp_events(db):
+    """Flag events written by migration 7 before it marked them backfilled.
+
+    Gamification stays unavailable until migration 7 is applied, so every
+    event recorded before then came from the backfill.
+    """
+    backfill = await db.schema_migrations.find_one({"_id": 7})
+    if backfill is None:
+        return
+    await db.xp_events.update_many(
+        {"created_at": {"$lte": backfill["applied_at"]}, "backfilled": {"$exists": False}},
+        {"$set": {"backfilled": True}}
+    )
+
+
+# What the gamification routes need before serving: profiles in the unified
+# shape, and the unique indexes that dedupe profiles and ledger events
+GAMIFICATION_MIGRATIONS = (6, 7, 10)
+GAMIFICATION_INDEXES = {
+    "gamification_profiles": ("user_id_unique",),
+    "xp_events": ("user_repair_kind_step_unique",),
+}
@@ -0,0 +1,179 @@
+"""
+FixIntel AI - Load-Aware Degradation of Optional Enrichments
+Company: RentMouse
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from periodic import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+# Each level disables one more optional enrichment
+NORMAL = 0
+SKIP_DIAGRAMS = 1
+CACHED_VIDEOS_ONLY = 2
+FALLBACK_PARTS_SEARCH = 3
+
+LEVEL_NAMES = {
+    NORMAL: "normal",
+    SKIP_DIAGRAMS: "skip_diagrams",
+    CACHED_VIDEOS_ONLY: "cached_videos_only",
+    FALLBACK_PARTS_SEARCH: "fallback_parts_search",
+}
+
+
+def _level_for(value: float, thresholds: Tuple[float, float, float]) -> int:
+    level = NORMAL
+    for i, threshold in enumerate(thresholds):
+        if value >= threshold:
+            level = i + 1
+    return level
+
+
+class DegradationController:
+    """Picks a degradation level from event-loop lag, in-flight requests and upstream errors.
+
+    The level rises as soon as any signal crosses a threshold and only steps
+    back down one level at a time after the signals have stayed lower for
+    the cooldown period, so it does not flap during a spike.
+    """
+
+    def __init__(self,
+                 lag_thresholds: Tuple[float, float, float] = (0.1, 0.25, 0.5),
+                 depth_thresholds: Tuple[float, float, float] = (25, 50, 100),
+                 error_rate_thresholds: Tuple[float, float, float] = (0.2, 0.35, 0.5),
+                 error_window_seconds: float = 60.0,
+                 min_error_samples: int = 10,
+                 sample_interval: float = 0.5,
+                 cooldown_seconds: float = 30.0,
+                 forced_level: Optional[int] = None):
+        self.lag_thresholds = lag_thresholds
+        self.depth_thresholds = depth_thresholds
+        self.error_rate_thresholds = error_rate_thresholds
+        self.error_window_seconds = error_window_seconds
+        self.min_error_samples = min_error_samples
+        self.sample_interval = sample_interval
+        self.cooldown_seconds = cooldown_seconds
+        self.forced_level = forced_level
+
+        self.level = forced_level if forced_level is not None else NORMAL
+        self.loop_lag = 0.0  # seconds, exponentially weighted
+        self.in_flight = 0
+        self._upstream: Deque[Tuple[float, bool]] = deque()
+        self._lowered_since: Optional[float] = None
+        self._last_sample: Optional[float] = None
+        self._periodic = PeriodicTask("degradation monitor", self._sample, sample_interval, run_first=True)
+
+    @classmethod
+    def from_env(cls) -> "DegradationController":
+        forced = os.environ.get("DEGRADATION_LEVEL")
+        if not forced:
+            return cls()
+        return cls(forced_level=max(NORMAL, min(FALLBACK_PARTS_SEARCH, int(forced))))
+
+    # ---- signals ----
+
+    def request_started(self):
+        self.in_flight += 1
+
+    def request_finished(self):
+        self.in_flight -= 1
+
+    def record_upstream(self, ok: bool):
+        now = time.monotonic()
+        self._upstream.append((now, ok))
+        self._trim_upstream(now)
+
+    def _trim_upstream(self, now: float):
+        cutoff = now - self.error_window_seconds
+        while self._upstream and self._upstream[0][0] < cutoff:
+            self._upstream.popleft()
+
+    def upstream_error_rate(self) -> float:
+        self._trim_upstream(time.monotonic())
+        if len(self._upstream) < self.min_error_samples:
+            return 0.0
+        errors = sum(1 for _, ok in self._upstream if not ok)
+        return errors / len(self._upstream)
+
+    # ---- level selection ----
+
+    def _update_level(self):
+        if self.forced_level is not None:
+            self.level = self.forced_level
+            return
+
+        target = max(
+            _level_for(self.loop_lag, self.lag_thresholds),
+            _level_for(self.in_flight, self.depth_thresholds),
+            _level_for(self.upstream_error_rate(), self.error_rate_thresholds),
+        )
+        now = time.monotonic()
+        if target > self.level:
+            logger.warning(f"Degrading to {LEVEL_NAMES[target]} (lag={self.loop_lag:.3f}s, "
+                           f"in_flight={self.in_flight}, error_rate={self.upstream_error_rate():.2f})")
+            self.level = target
+            self._lowered_since = None
+        elif target < self.level:
+            if self._lowered_since is None:
+                self._lowered_since = now
+            elif now - self._lowered_since >= self.cooldown_seconds:
+                self.level -= 1
+                self._lowered_since = now if target < self.level else None
+                logger.info(f"Recovering to {LEVEL_NAMES[self.level]}")
+        else:
+            self._lowered_since = None
+
+    async def _sample(self):
+        # Lag is how much later than one interval after the last sample this one ran
+        now = asyncio.get_running_loop().time()
+        if self._last_sample is not None:
+            lag = max(0.0, now - self._last_sample - self.sample_interval)
+            self.loop_lag = 0.8 * self.loop_lag + 0.2 * lag
+        self._last_sample = now
+        self._update_level()
+
+    def start(self):
+        self._periodic.start()
+
+    async def stop(self):
+        await self._periodic.stop()
+
+    # ---- what is disabled ----
+
+    @property
+    def skip_diagrams(self) -> bool:
+        return self.level >= SKIP_DIAGRAMS
+
+    @property
+    def cached_videos_only(self) -> bool:
+        return self.level >= CACHED_VIDEOS_ONLY
+
+    @property
+    def fallback_parts_search(self) -> bool:
+        return self.level >= FALLBACK_PARTS_SEARCH
+
+    def flags(self) -> Dict[str, bool]:
+        """Which optional enrichments are currently degraded"""
+        return {
+            "diagrams": self.skip_diagrams,
+            "videos": self.cached_videos_only,
+            "parts_search": self.fallback_parts_search,
+        }
+
+    def status(self) -> Dict[str, object]:
+        return {
+            "level": self.level,
+            "mode": LEVEL_NAMES[self.level],
+            "forced": self.forced_level is not None,
+            "loop_lag_ms": round(self.loop_lag * 1000, 1),
+            "in_flight": self.in_flight,
+            "upstream_error_rate": round(self.upstream_error_rate(), 3),
+            "degraded": self.flags(),
+        }
@@ -0,0 +1,94 @@
+"""
+FixIntel AI - ETags and Conditional GET
+Company: RentMouse
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Clients may keep a copy but must revalidate it before every use
+REVALIDATE = "no-cache"
+
+
+def serialize_json(payload: Any) -> bytes:
+    """Encode a payload exactly as FastAPI's JSONResponse would"""
+    return json.dumps(
+        jsonable_encoder(payload),
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":"),
+    ).encode("utf-8")
+
+
+def content_etag(body: bytes) -> str:
+    """Strong ETag derived from the exact response bytes"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def version_etag(*parts: Any) -> str:
+    """Strong ETag derived from whatever versions the response is built from.
+
+    Cheaper than hashing the body when the inputs carry a version counter
+    or last-modified time, since the body need not be built to compare.
+    """
+    raw = json.dumps(jsonable_encoder(parts), separators=(",", ":"))
+    return '"v' + hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for tag in header.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str, cache_control: str = REVALIDATE,
+                 headers: Optional[Dict[str, str]] = None) -> Response:
+    """Bodiless 304; headers a client needs to page on, such as X-Next-Cursor, are kept"""
+    return Response(status_code=304, headers={**(headers or {}), "ETag": etag, "Cache-Control": cache_control})
+
+
+def json_with_etag(request: Request, body: bytes, etag: str, cache_control: str = REVALIDATE,
+                   headers: Optional[Dict[str, str]] = None) -> Response:
+    """304 when the client already has this version, otherwise the serialized body"""
+    if etag_matches(request, etag):
+        return not_modified(etag, cache_control, headers)
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={**(headers or {}), "ETag": etag, "Cache-Control": cache_control},
+    )
+
+
+def conditional_json(request: Request, payload: Any, cache_control: str = REVALIDATE,
+                     headers: Optional[Dict[str, str]] = None) -> Response:
+    """Serialize payload and answer with a content-hash ETag"""
+    body = serialize_json(payload)
+    return json_with_etag(request, body, content_etag(body), cache_control, headers)
+
+
+class StaticJSON:
+    """A response that never changes while the process runs, serialized and hashed once"""
+
+    def __init__(self, payload: Any, cache_control: str = "public, max-age=3600"):
+        self.body = serialize_json(payload)
+        self.etag = content_etag(self.body)
+        self.cache_control = cache_control
+
+    def respond(self, request: Request) -> Response:
+        return json_with_etag(request, self.body, self.etag, self.cache_control)
@@ -0,0 +1,81 @@
+"""
+FixIntel AI - Hot Ranking for the Community Feed
+Company: RentMouse
+"""
+
+import logging
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict
+
+from periodic import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+# Seconds of age worth one order of magnitude of likes (the classic Reddit constant)
+HOT_TIME_SCALE = 45000
+HOT_EPOCH = datetime(2024, 1, 1)
+
+# Score lost per report; two reports cost about as much as 12.5 hours of age
+REPORT_PENALTY = 0.5
+
+# Posts older than this cannot climb back onto the hot pages, so refreshes skip them
+HOT_REFRESH_WINDOW = timedelta(days=14)
+
+
+def hot_score(likes: int, created_at: datetime, report_count: int = 0) -> float:
+    """Score for sort=hot; newer posts need exponentially fewer likes to rank equally.
+
+    The age term grows with creation time rather than shrinking with age, so
+    a stored score never has to be rewritten just because time passed.
+    """
+    order = math.log10(max(likes, 1))
+    age_term = (created_at - HOT_EPOCH).total_seconds() / HOT_TIME_SCALE
+    return order + age_term - REPORT_PENALTY * report_count
+
+
+def hot_score_expression() -> Dict[str, Any]:
+    """hot_score as an aggregation expression over a post document, for pipeline updates"""
+    return {"$subtract": [
+        {"$add": [
+            {"$log10": {"$max": [{"$ifNull": ["$likes", 0]}, 1]}},
+            {"$divide": [{"$subtract": ["$timestamp", HOT_EPOCH]}, HOT_TIME_SCALE * 1000]},
+        ]},
+        {"$multiply": [REPORT_PENALTY, {"$ifNull": ["$report_count", 0]}]},
+    ]}
+
+
+SET_HOT_SCORE = {"$set": {"score": hot_score_expression()}}
+
+
+class HotScoreRefresher:
+    """Periodically re-applies the hot formula to recent posts.
+
+    Likes and reports update the score in the same write, so this only
+    catches posts written some other way (older clients, manual fixes, a
+    changed formula) before they can sit on the hot pages with a wrong score.
+    """
+
+    def __init__(self, posts, interval: float = 900.0):
+        self.posts = posts
+        self.interval = interval
+        self._periodic = PeriodicTask("hot score refresher", self._refresh_pass, interval)
+
+    async def refresh(self) -> int:
+        since = datetime.utcnow() - HOT_REFRESH_WINDOW
+        result = await self.posts.update_many(
+            {"timestamp": {"$gte": since}},
+            [SET_HOT_SCORE]
+        )
+        return result.modified_count
+
+    async def _refresh_pass(self):
+        corrected = await self.refresh()
+        if corrected:
+            logger.info(f"Corrected hot score of {corrected} post(s)")
+
+    def start(self):
+        self._periodic.start()
+
+    async def stop(self):
+        await self._periodic.stop()
@@ -3,205 +3,425 @@ FixIntel AI - Gamification System
 Company: RentMouse
 """
 
-from datetime import datetime, timedelta
-from typing import Dict, List, Any
-
-# XP Rewards
-XP_REWARDS = {
-    "complete_step": 10,
-    "complete_easy_repair": 50,
-    "complete_medium_repair": 100,
-    "complete_hard_repair": 200,
-    "daily_login": 5,
-    "share_repair": 20,
-    "first_repair_bonus": 30,
-    "speed_bonus": 50,  # Complete repair in under 1 hour
-    "perfect_completion": 25,  # 100% of steps completed
-}
-
-# Level Thresholds
-LEVEL_THRESHOLDS = [
-    {"level": 1, "min_xp": 0, "title": "Rookie Fixer"},
-    {"level": 2, "min_xp": 100, "title": "Apprentice"},
-    {"level": 3, "min_xp": 300, "title": "Handyman"},
-    {"level": 4, "min_xp": 600, "title": "Expert Technician"},
-    {"level": 5, "min_xp": 1000, "title": "Master Craftsman"},
-    {"level": 6, "min_xp": 1500, "title": "Repair Legend"},
-    {"level": 7, "min_xp": 2500, "title": "Grandmaster"},
+import asyncio
+import logging
+import uuid
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from periodic import PeriodicTask
+from xp_ledger import ACHIEVEMENT_EVENT, REPAIR_EVENT, STEP_EVENT, xp_event
+
+logger = logging.getLogger(__name__)
+
+# Rank definitions
+RANKS = [
+    {"name": "Novice Fixer", "min_xp": 0, "badge": "🔰", "color": "#9CA3AF"},
+    {"name": "Apprentice", "min_xp": 100, "badge": "🔧", "color": "#60A5FA"},
+    {"name": "Handyman", "min_xp": 300, "badge": "🛠️", "color": "#34D399"},
+    {"name": "Skilled Repairer", "min_xp": 600, "badge": "⚙️", "color": "#FBBF24"},
+    {"name": "Expert Technician", "min_xp": 1000, "badge": "🏆", "color": "#F97316"},
+    {"name": "Master Craftsman", "min_xp": 2000, "badge": "👑", "color": "#A855F7"},
+    {"name": "Repair Legend", "min_xp": 5000, "badge": "⭐", "color": "#EF4444"},
 ]
 
-# Badge Definitions
-BADGES = {
-    "first_repair": {
-        "id": "first_repair",
-        "name": "First Fix",
-        "description": "Complete your first repair",
-        "icon": "trophy",
-        "criteria": lambda stats: stats.get("total_repairs", 0) >= 1
-    },
-    "speed_demon": {
-        "id": "speed_demon",
-        "name": "Speed Demon",
-        "description": "Complete a repair in under 1 hour",
-        "icon": "flash",
-        "criteria": lambda stats: stats.get("fastest_repair_minutes", 999) < 60
-    },
-    "night_owl": {
-        "id": "night_owl",
-        "name": "Night Owl",
-        "description": "Complete a repair after 10 PM",
-        "icon": "moon",
-        "criteria": lambda stats: stats.get("late_night_repairs", 0) >= 1
-    },
-    "early_bird": {
-        "id": "early_bird",
-        "name": "Early Bird",
-        "description": "Complete a repair before 8 AM",
-        "icon": "sunny",
-        "criteria": lambda stats: stats.get("early_morning_repairs", 0) >= 1
-    },
-    "streak_master": {
-        "id": "streak_master",
-        "name": "Streak Master",
-        "description": "Maintain a 7-day activity streak",
-        "icon": "flame",
-        "criteria": lambda stats: stats.get("longest_streak", 0) >= 7
-    },
-    "perfectionist": {
-        "id": "perfectionist",
-        "name": "Perfectionist",
-        "description": "100% completion rate on 5+ repairs",
-        "icon": "star",
-        "criteria": lambda stats: (stats.get("completed_repairs", 0) >= 5 and 
-                                  stats.get("completion_rate", 0) == 100)
-    },
-    "tool_collector": {
-        "id": "tool_collector",
-        "name": "Tool Collector",
-        "description": "Use 20+ different tools across repairs",
-        "icon": "construct",
-        "criteria": lambda stats: len(stats.get("unique_tools", [])) >= 20
-    },
-    "diy_enthusiast": {
-        "id": "diy_enthusiast",
-        "name": "DIY Enthusiast",
-        "description": "Complete 5 repairs",
-        "icon": "hammer",
-        "criteria": lambda stats: stats.get("completed_repairs", 0) >= 5
-    },
-    "master_fixer": {
-        "id": "master_fixer",
-        "name": "Master Fixer",
-        "description": "Complete 10 repairs",
-        "icon": "medal",
-        "criteria": lambda stats: stats.get("completed_repairs", 0) >= 10
-    },
-    "budget_saver": {
-        "id": "budget_saver",
-        "name": "Budget Saver",
-        "description": "Save over $100",
-        "icon": "cash",
-        "criteria": lambda stats: stats.get("money_saved", 0) >= 100
-    },
-    "hard_mode": {
-        "id": "hard_mode",
-        "name": "Hard Mode",
-        "description": "Complete 3 hard difficulty repairs",
-        "icon": "warning",
-        "criteria": lambda stats: stats.get("hard_repairs_completed", 0) >= 3
-    },
-}
-
-
-def calculate_level(total_xp: int) -> Dict[str, Any]:
-    """Calculate user level based on total XP"""
-    current_level = LEVEL_THRESHOLDS[0]
-    next_level = LEVEL_THRESHOLDS[1] if len(LEVEL_THRESHOLDS) > 1 else None
-    
-    for i, threshold in enumerate(LEVEL_THRESHOLDS):
-        if total_xp >= threshold["min_xp"]:
-            current_level = threshold
-            next_level = LEVEL_THRESHOLDS[i + 1] if i + 1 < len(LEVEL_THRESHOLDS) else None
-    
-    xp_in_current_level = total_xp - current_level["min_xp"]
-    xp_for_next_level = (next_level["min_xp"] - current_level["min_xp"]) if next_level else 0
-    progress_percentage = (xp_in_current_level / xp_for_next_level * 100) if xp_for_next_level > 0 else 100
-    
-    return {
-        "level": current_level["level"],
-        "title": current_level["title"],
-        "current_xp": total_xp,
-        "xp_in_level": xp_in_current_level,
-        "xp_for_next_level": xp_for_next_level,
-        "progress_percentage": round(progress_percentage, 1),
-        "next_level_title": next_level["title"] if next_level else "Max Level"
-    }
+# Achievement definitions; xp is awarded on top of the repair that earns it
+ACHIEVEMENTS = [
+    {"id": "first_repair", "name": "First Fix", "description": "Complete your first repair", "xp": 50, "badge": "🎉"},
+    {"id": "five_repairs", "name": "Getting Handy", "description": "Complete 5 repairs", "xp": 100, "badge": "✋"},
+    {"id": "ten_repairs", "name": "Repair Enthusiast", "description": "Complete 10 repairs", "xp": 200, "badge": "🔥"},
+    {"id": "twenty_five_repairs", "name": "Fix-It Pro", "description": "Complete 25 repairs", "xp": 500, "badge": "💪"},
+    {"id": "fifty_repairs", "name": "Repair Master", "description": "Complete 50 repairs", "xp": 1000, "badge": "🏅"},
+    {"id": "first_electronics", "name": "Tech Savvy", "description": "Repair an electronic device", "xp": 75, "badge": "📱"},
+    {"id": "first_appliance", "name": "Appliance Whisperer", "description": "Repair a home appliance", "xp": 75, "badge": "🏠"},
+    {"id": "first_auto", "name": "Grease Monkey", "description": "Complete an automotive repair", "xp": 75, "badge": "🚗"},
+    {"id": "streak_3", "name": "On a Roll", "description": "Complete repairs 3 days in a row", "xp": 100, "badge": "📅"},
+    {"id": "streak_7", "name": "Week Warrior", "description": "Complete repairs 7 days in a row", "xp": 250, "badge": "🗓️"},
+    {"id": "speed_demon", "name": "Speed Demon", "description": "Complete a repair in under 30 minutes", "xp": 75, "badge": "⚡"},
+    {"id": "perfectionist", "name": "Perfectionist", "description": "Complete all steps in a repair", "xp": 50, "badge": "✨"},
+]
+
+# XP rewards
+STEP_XP = 10
+REPAIR_XP = 50
+MEDIUM_REPAIR_BONUS = 25  # 5+ steps
+COMPLEX_REPAIR_BONUS = 50  # 10+ steps
+SPEED_BONUS = 25
+SPEED_MINUTES = 30
+
+# Repair counts that unlock an achievement
+REPAIR_COUNT_ACHIEVEMENTS = [(1, "first_repair"), (5, "five_repairs"), (10, "ten_repairs"),
+                             (25, "twenty_five_repairs"), (50, "fifty_repairs")]
+STREAK_ACHIEVEMENTS = [(3, "streak_3"), (7, "streak_7")]
+CATEGORY_ACHIEVEMENTS = {"electronics": "first_electronics", "appliance": "first_appliance",
+                         "automotive": "first_auto"}
+
+# Item type keywords per repair category, checked in order; anything else is "other"
+CATEGORY_KEYWORDS = [
+    ("electronics", ["phone", "tablet", "computer", "laptop", "tv", "electronic"]),
+    ("automotive", ["car", "truck", "auto", "vehicle", "motorcycle"]),
+    ("appliance", ["washer", "dryer", "refrigerator", "dishwasher", "oven", "appliance"]),
+    ("furniture", ["furniture", "chair", "table", "desk"]),
+]
+
+# Most events one /gamification/events call can carry; each repair adds a few pipeline stages
+MAX_XP_EVENT_BATCH = 100
+
+DUPLICATE_KEY = 11000
+
+# Ids of the most recent award batches applied to a profile, so a batch retried
+# by the reconciler after its first attempt did apply is not applied twice
+APPLIED_BATCH_HISTORY = 50
+
+# Events still unapplied this long after being recorded belong to a failed award
+UNAPPLIED_GRACE = timedelta(minutes=2)
+
+# Bookkeeping that is never returned with a profile
+PROFILE_PROJECTION = {"_id": 0, "last_award": 0, "applied_batches": 0}
+
+_EPOCH = date(1970, 1, 1)
 
 
-def check_new_badges(stats: Dict[str, Any], current_badges: List[str]) -> List[Dict[str, Any]]:
-    """Check which new badges the user has earned"""
-    new_badges = []
-    
-    for badge_id, badge_def in BADGES.items():
-        if badge_id not in current_badges and badge_def["criteria"](stats):
-            new_badges.append({
-                "id": badge_id,
-                "name": badge_def["name"],
-                "description": badge_def["description"],
-                "icon": badge_def["icon"]
-            })
-    
-    return new_badges
-
-
-def calculate_streak(last_activity_date: datetime, current_streak: int) -> int:
-    """Calculate current streak based on last activity"""
-    if not last_activity_date:
-        return 1
-    
-    now = datetime.utcnow()
-    days_since_activity = (now - last_activity_date).days
-    
-    if days_since_activity == 0:
-        # Same day, streak continues
-        return current_streak
-    elif days_since_activity == 1:
-        # Next day, increment streak
-        return current_streak + 1
-    else:
-        # Streak broken
-        return 1
-
-
-def calculate_xp_reward(action: str, details: Dict[str, Any] = None) -> Dict[str, Any]:
-    """Calculate XP reward for an action"""
-    base_xp = XP_REWARDS.get(action, 0)
-    bonus_xp = 0
-    bonus_reasons = []
-    
-    if details:
-        # Speed bonus
-        if action.startswith("complete_") and action.endswith("_repair"):
-            time_taken = details.get("time_taken_minutes", 0)
-            if time_taken < 60:
-                bonus_xp += XP_REWARDS["speed_bonus"]
-                bonus_reasons.append("Speed Demon! (under 1 hour)")
-        
-        # Perfect completion bonus
-        if details.get("completion_percentage", 0) == 100:
-            bonus_xp += XP_REWARDS["perfect_completion"]
-            bonus_reasons.append("Perfect Completion!")
-        
-        # First repair bonus
-        if details.get("is_first_repair", False):
-            bonus_xp += XP_REWARDS["first_repair_bonus"]
-            bonus_reasons.append("First Repair Bonus!")
-    
-    total_xp = base_xp + bonus_xp
-    
+def get_rank_for_xp(xp: int) -> dict:
+    """Get the rank for a given XP amount"""
+    current_rank = RANKS[0]
+    for rank in RANKS:
+        if xp >= rank["min_xp"]:
+            current_rank = rank
+    return current_rank
+
+
+def get_next_rank(xp: int) -> Optional[dict]:
+    """Get the next rank and XP needed"""
+    for rank in RANKS:
+        if xp < rank["min_xp"]:
+            return {"rank": rank, "xp_needed": rank["min_xp"] - xp}
+    return None  # Max rank reached
+
+
+def day_number(moment: datetime) -> int:
+    """Days since the epoch (UTC); streaks compare these so the update can do the arithmetic"""
+    return (moment.date() - _EPOCH).days
+
+
+def repair_category(item_type: str) -> str:
+    item_type = (item_type or "").lower()
+    for category, keywords in CATEGORY_KEYWORDS:
+        if any(word in item_type for word in keywords):
+            return category
+    return "other"
+
+
+def repair_xp(total_steps: int, time_taken_minutes: int) -> int:
+    """XP for a repair before achievement bonuses"""
+    xp = REPAIR_XP
+    if total_steps >= 10:
+        xp += COMPLEX_REPAIR_BONUS
+    elif total_steps >= 5:
+        xp += MEDIUM_REPAIR_BONUS
+    if 0 < time_taken_minutes < SPEED_MINUTES:
+        xp += SPEED_BONUS
+    return xp
+
+
+def profile_response(user_id: str, profile: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    profile = profile or {}
+    xp = profile.get("xp", 0)
     return {
-        "base_xp": base_xp,
-        "bonus_xp": bonus_xp,
-        "total_xp": total_xp,
-        "bonus_reasons": bonus_reasons
+        "user_id": user_id,
+        "xp": xp,
+        "rank": get_rank_for_xp(xp),
+        "next_rank": get_next_rank(xp),
+        "total_repairs_completed": profile.get("total_repairs_completed", 0),
+        "total_steps_completed": profile.get("total_steps_completed", 0),
+        "achievements": profile.get("achievements", []),
+        "current_streak": profile.get("current_streak", 0),
+        "longest_streak": profile.get("longest_streak", 0),
+        "repairs_by_category": profile.get("repairs_by_category", {}),
+        "all_ranks": RANKS,
+        "all_achievements": ACHIEVEMENTS,
     }
+
+
+def _rank_change(previous_xp: int, xp: int) -> Dict[str, Any]:
+    old_rank, new_rank = get_rank_for_xp(previous_xp), get_rank_for_xp(xp)
+    ranked_up = old_rank["name"] != new_rank["name"]
+    return {"ranked_up": ranked_up, "new_rank": new_rank if ranked_up else None}
+
+
+def _repair_stages(event: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Stages applying one completed repair on top of the running award"""
+    category = repair_category(event.get("item_type"))
+    day = day_number(event["occurred_at"])
+    count = "$total_repairs_completed"
+    streak = "$current_streak"
+
+    # Each candidate evaluates to its id when the condition holds; static ones are decided here
+    candidates: List[Any] = [{"$cond": [{"$gte": [count, n]}, aid, None]} for n, aid in REPAIR_COUNT_ACHIEVEMENTS]
+    candidates += [{"$cond": [{"$gte": [streak, n]}, aid, None]} for n, aid in STREAK_ACHIEVEMENTS]
+    if category in CATEGORY_ACHIEVEMENTS:
+        candidates.append(CATEGORY_ACHIEVEMENTS[category])
+    if 0 < event.get("time_taken_minutes", 0) < SPEED_MINUTES:
+        candidates.append("speed_demon")
+
+    return [
+        {"$set": {
+            "total_repairs_completed": {"$add": [{"$ifNull": [count, 0]}, 1]},
+            f"repairs_by_category.{category}": {"$add": [{"$ifNull": [f"$repairs_by_category.{category}", 0]}, 1]},
+            "current_streak": {"$switch": {
+                "branches": [
+                    # Same day (or an older offline completion) doesn't increase the streak
+                    {"case": {"$gte": ["$last_repair_day", day]}, "then": {"$max": [{"$ifNull": [streak, 0]}, 1]}},
+                    {"case": {"$eq": ["$last_repair_day", day - 1]}, "then": {"$add": [{"$ifNull": [streak, 0]}, 1]}},
+                ],
+                "default": 1,
+            }},
+            "last_repair_day": {"$max": ["$last_repair_day", day]},
+        }},
+        {"$set": {
+            "longest_streak": {"$max": [{"$ifNull": ["$longest_streak", 0]}, streak]},
+            "_earned": {"$filter": {
+                "input": candidates,
+                "cond": {"$and": [{"$ne": ["$$this", None]}, {"$not": [{"$in": ["$$this", "$achievements.id"]}]}]},
+            }},
+        }},
+        {"$set": {"_gained": {"$filter": {
+            "input": {"$literal": ACHIEVEMENTS},
+            "cond": {"$in": ["$$this.id", "$_earned"]},
+        }}}},
+        {"$set": {"_gained_xp": {"$add": [event["xp"], {"$sum": "$_gained.xp"}]}}},
+        {"$set": {
+            "xp": {"$add": ["$xp", "$_gained_xp"]},
+            "_xp_earned": {"$add": ["$_xp_earned", "$_gained_xp"]},
+            "achievements": {"$concatArrays": ["$achievements", "$_gained"]},
+            "_new_achievements": {"$concatArrays": ["$_new_achievements", "$_gained"]},
+        }},
+    ]
+
+
+def award_pipeline(events: List[Dict[str, Any]], now: datetime, batch: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Update pipeline that applies a set of new XP events to a profile in one write.
+
+    Counters, categories, streak, achievements and XP are all derived from
+    the stored profile inside the update, so concurrent awards each see the
+    other's result instead of overwriting it. Repairs are applied in the
+    order they happened. The combined award is left in last_award for the
+    caller to read back, and batch is added to applied_batches.
+    """
+    steps = [e for e in events if e["kind"] == STEP_EVENT]
+    repairs = sorted((e for e in events if e["kind"] == REPAIR_EVENT), key=lambda e: e["occurred_at"])
+    step_xp = sum(e["xp"] for e in steps)
+
+    stages = [{"$set": {
+        "_previous_xp": {"$ifNull": ["$xp", 0]},
+        "_xp_earned": step_xp,
+        "_new_achievements": [],
+        "xp": {"$add": [{"$ifNull": ["$xp", 0]}, step_xp]},
+        "total_steps_completed": {"$add": [{"$ifNull": ["$total_steps_completed", 0]}, len(steps)]},
+        "achievements": {"$ifNull": ["$achievements", []]},
+        "created_at": {"$ifNull": ["$created_at", now]},
+    }}]
+    if batch is not None:
+        stages[0]["$set"]["applied_batches"] = {"$slice": [
+            {"$concatArrays": [{"$ifNull": ["$applied_batches", []]}, [batch]]}, -APPLIED_BATCH_HISTORY
+        ]}
+    for repair in repairs:
+        stages += _repair_stages(repair)
+    stages += [
+        {"$set": {
+            "last_award": {
+                "xp_earned": "$_xp_earned",
+                "previous_xp": "$_previous_xp",
+                "new_achievements": "$_new_achievements",
+                "at": now,
+            },
+            "updated_at": now,
+        }},
+        {"$unset": ["_previous_xp", "_xp_earned", "_new_achievements", "_earned", "_gained", "_gained_xp"]},
+    ]
+    return stages
+
+
+def step_event(user_id: str, repair_id: str, step_number: int, now: datetime,
+               occurred_at: Optional[datetime] = None) -> Dict[str, Any]:
+    return xp_event(user_id, STEP_EVENT, repair_id, step_number, STEP_XP, now, occurred_at)
+
+
+def repair_event(user_id: str, repair_id: str, item_type: str, total_steps: int, time_taken_minutes: int,
+                 now: datetime, occurred_at: Optional[datetime] = None) -> Dict[str, Any]:
+    return xp_event(user_id, REPAIR_EVENT, repair_id, None, repair_xp(total_steps, time_taken_minutes),
+                    now, occurred_at, item_type=item_type, total_steps=total_steps,
+                    time_taken_minutes=time_taken_minutes)
+
+
+class GamificationEngine:
+    """Applies XP events to gamification profiles.
+
+    Events are first appended to the xp_events ledger, whose unique index
+    on (user_id, repair_id, kind, step_number) rejects repeats. Whatever is
+    new is then applied to the profile with a single find_one_and_update
+    pipeline, however many events arrived together, so concurrent taps and
+    offline bursts from the same user never lose each other's XP.
+
+    Events are recorded with applied false and a batch id, and flagged
+    applied once the profile update succeeds. If an award fails in between,
+    its events stay in the ledger and a background reconciler applies them
+    later. The profile update is skipped for a batch already in its
+    applied_batches, so the reconciler can retry any unflagged batch safely.
+    """
+
+    def __init__(self, profiles, events, reconcile_interval: float = 60.0, reconcile_batch_size: int = 100):
+        self.profiles = profiles
+        self.events = events
+        self.reconcile_batch_size = reconcile_batch_size
+        self._listeners: List[Callable[[str, Dict[str, Any], List[Dict[str, Any]]], Any]] = []
+        self._periodic = PeriodicTask("XP reconciler", self._reconcile_pass, reconcile_interval)
+
+    def add_listener(self, listener: Callable[[str, Dict[str, Any], List[Dict[str, Any]]], Any]):
+        """Call listener(user_id, profile, new_events) after each award, such as to update leaderboards.
+
+        new_events includes achievement bonuses, so their xp adds up to the award.
+        Coroutine listeners are awaited.
+        """
+        self._listeners.append(listener)
+
+    async def get_profile(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self.profiles.find_one({"user_id": user_id}, PROFILE_PROJECTION)
+
+    async def _update_profile(self, user_id: str, batch: str, pipeline: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Apply an award pipeline once per batch; None if the batch was already applied"""
+        query = {"user_id": user_id, "applied_batches": {"$ne": batch}}
+        options = {"projection": {"_id": 0, "applied_batches": 0}, "return_document": ReturnDocument.AFTER}
+        try:
+            return await self.profiles.find_one_and_update(query, pipeline, upsert=True, **options)
+        except DuplicateKeyError:
+            # Another request created the profile first, or the batch was applied already
+            return await self.profiles.find_one_and_update(query, pipeline, **options)
+
+    async def _record(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Append events to the ledger; returns those not already recorded"""
+        if not events:
+            return []
+        try:
+            await self.events.insert_many(events, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            failed = {error["index"] for error in errors}
+            if any(error["code"] != DUPLICATE_KEY for error in errors):
+                # Whatever was recorded stays unapplied for the reconciler
+                raise
+            return [event for i, event in enumerate(events) if i not in failed]
+        return events
+
+    async def apply_events(self, user_id: str, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Record and apply events; the award covers only the ones not seen before"""
+        batch = uuid.uuid4().hex
+        for event in events:
+            event.update(applied=False, batch=batch)
+        recorded = await self._record(events)
+        if not recorded:
+            return {"recorded": [], "profile": await self.get_profile(user_id), "award": None}
+        return await self._apply(user_id, batch, recorded)
+
+    async def _apply(self, user_id: str, batch: str, recorded: List[Dict[str, Any]]) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        profile = await self._update_profile(user_id, batch, award_pipeline(recorded, now, batch))
+        await self.events.update_many({"_id": {"$in": [event["_id"] for event in recorded]}},
+                                      {"$set": {"applied": True}})
+        for event in recorded:
+            event["applied"] = True
+        if profile is None:
+            # An earlier attempt applied the batch but failed before flagging its events
+            return {"recorded": recorded, "profile": await self.get_profile(user_id), "award": None}
+
+        award = profile.pop("last_award")
+        bonuses = [xp_event(user_id, ACHIEVEMENT_EVENT, a["id"], None, a["xp"], now, batch=batch)
+                   for a in award["new_achievements"]]
+        # Achievement bonuses go in the ledger too, once per user like the achievements themselves;
+        # their XP is already in the profile, so they are recorded as applied
+        bonuses = await self._record(bonuses)
+
+        for listener in self._listeners:
+            try:
+                result = listener(user_id, profile, recorded + bonuses)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logger.error(f"Error notifying XP listener: {str(e)}")
+        return {"recorded": recorded, "profile": profile, "award": award}
+
+    async def reconcile(self, grace: timedelta = UNAPPLIED_GRACE) -> int:
+        """Apply events left unapplied by failed awards; returns how many were applied"""
+        cutoff = datetime.utcnow() - grace
+        batches = await self.events.aggregate([
+            {"$match": {"applied": False, "created_at": {"$lt": cutoff}}},
+            {"$group": {"_id": {"user_id": "$user_id", "batch": "$batch"}}},
+            {"$limit": self.reconcile_batch_size},
+        ]).to_list(self.reconcile_batch_size)
+
+        applied = 0
+        for group in batches:
+            user_id, batch = group["_id"]["user_id"], group["_id"]["batch"]
+            events = await self.events.find({"user_id": user_id, "batch": batch, "applied": False}).to_list(None)
+            if events:
+                await self._apply(user_id, batch, events)
+                applied += len(events)
+        return applied
+
+    async def _reconcile_pass(self):
+        applied = await self.reconcile()
+        if applied:
+            logger.warning(f"Applied {applied} XP event(s) left over from failed awards")
+
+    def start(self):
+        self._periodic.start()
+
+    async def stop(self):
+        await self._periodic.stop()
+
+    async def complete_step(self, user_id: str, repair_id: str, step_number: int) -> Dict[str, Any]:
+        result = await self.apply_events(user_id, [step_event(user_id, repair_id, step_number, datetime.utcnow())])
+        if not result["recorded"]:
+            return {"message": "Step already completed", "xp_earned": 0}
+
+        profile, award = result["profile"], result["award"]
+        return {
+            "xp_earned": award["xp_earned"],
+            "total_xp": profile["xp"],
+            "total_steps_completed": profile["total_steps_completed"],
+            **_rank_change(award["previous_xp"], profile["xp"]),
+        }
+
+    async def complete_repair(self, user_id: str, repair_id: str, item_type: str,
+                              total_steps: int, time_taken_minutes: int) -> Dict[str, Any]:
+        event = repair_event(user_id, repair_id, item_type, total_steps, time_taken_minutes, datetime.utcnow())
+        result = await self.apply_events(user_id, [event])
+        if not result["recorded"]:
+            return {"message": "Repair already completed", "xp_earned": 0, "new_achievements": [], "ranked_up": False}
+
+        profile, award = result["profile"], result["award"]
+        return {
+            "xp_earned": award["xp_earned"],
+            "total_xp": profile["xp"],
+            "total_repairs_completed": profile["total_repairs_completed"],
+            "current_streak": profile["current_streak"],
+            "new_achievements": award["new_achievements"],
+            **_rank_change(award["previous_xp"], profile["xp"]),
+            "current_rank": get_rank_for_xp(profile["xp"]),
+        }
+
+    async def complete_batch(self, user_id: str, events: List[Dict[str, Any]]) -> Dict[str, Any]:
+        result = await self.apply_events(user_id, events)
+        award = result["award"] or {"xp_earned": 0, "new_achievements": []}
+        previous_xp = award.get("previous_xp", (result["profile"] or {}).get("xp", 0))
+        return {
+            "recorded": len(result["recorded"]),
+            "duplicates": len(events) - len(result["recorded"]),
+            "xp_earned": award["xp_earned"],
+            "new_achievements": award["new_achievements"],
+            **_rank_change(previous_xp, (result["profile"] or {}).get("xp", 0)),
+            "profile": profile_response(user_id, result["profile"]),
+        }
@@ -0,0 +1,180 @@
+"""
+FixIntel AI - Idempotency Keys
+Company: RentMouse
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+# How long stored responses can be replayed (TTL index on created_at)
+IDEMPOTENCY_TTL_SECONDS = 24 * 3600
+
+# A claim not renewed for this long belongs to a dead worker and may be taken over;
+# running requests renew theirs every third of it
+CLAIM_LEASE_SECONDS = 300
+
+# Tries at storing a finished response before leaving the claim in progress
+COMPLETE_ATTEMPTS = 3
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a request with a different payload"""
+
+
+class IdempotencyTimeout(Exception):
+    """The original request holding the key did not finish in time"""
+
+
+def payload_fingerprint(payload: Any) -> str:
+    raw = json.dumps(jsonable_encoder(payload), sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """Stores responses by Idempotency-Key so retried POSTs replay instead of re-running.
+
+    Records live in a Mongo collection with a TTL index on created_at. The
+    first request for a key claims it with an insert; duplicates either get
+    the stored response or wait for the in-flight one to complete. A claim
+    is a lease renewed while the work runs, so one left behind by a dead
+    worker is taken over once it goes stale instead of blocking the key.
+    """
+
+    def __init__(self, collection, wait_timeout: float = 120.0, poll_interval: float = 0.25,
+                 lease_seconds: float = CLAIM_LEASE_SECONDS):
+        self.collection = collection
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+
+    async def execute(self, key: str, scope: str, payload: Any,
+                      handler: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run handler once per key; returns (response, replayed)"""
+        record_id = f"{scope}:{key}"
+        fingerprint = payload_fingerprint(payload)
+
+        while True:
+            # Same worker: wait on the in-flight future instead of polling Mongo
+            inflight = self._inflight.get(record_id)
+            if inflight is not None:
+                inflight_fingerprint, future = inflight
+                if inflight_fingerprint != fingerprint:
+                    raise IdempotencyConflict(f"Idempotency-Key {key} was used with a different request")
+                try:
+                    return await asyncio.shield(future), True
+                except Exception:
+                    continue
+
+            token = uuid.uuid4().hex
+            now = datetime.utcnow()
+            try:
+                await self.collection.insert_one({
+                    "_id": record_id,
+                    "fingerprint": fingerprint,
+                    "status": "in_progress",
+                    "token": token,
+                    "claimed_at": now,
+                    "created_at": now,
+                })
+            except DuplicateKeyError:
+                record = await self._wait_for_completion(record_id, fingerprint, token)
+                if record is None:
+                    # The original attempt failed and released the key; claim it ourselves
+                    continue
+                if record["fingerprint"] != fingerprint:
+                    raise IdempotencyConflict(f"Idempotency-Key {key} was used with a different request")
+                if record.get("status") == "completed":
+                    return record["response"], True
+                # We took over a claim whose holder stopped renewing it
+
+            return await self._run(record_id, fingerprint, token, handler), False
+
+    async def _run(self, record_id: str, fingerprint: str, token: str,
+                   handler: Callable[[], Awaitable[Any]]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[record_id] = (fingerprint, future)
+        renewal = asyncio.ensure_future(self._renew(record_id, token))
+        try:
+            try:
+                result = await handler()
+            except BaseException as e:
+                # Release the key so a retry can do the work, then wake local waiters
+                self._inflight.pop(record_id, None)
+                await asyncio.shield(self.collection.delete_one(
+                    {"_id": record_id, "token": token, "status": "in_progress"}
+                ))
+                future.set_exception(e if isinstance(e, Exception) else RuntimeError("Request cancelled"))
+                future.exception()  # Mark as retrieved when nobody is waiting
+                raise
+
+            # The work is done; from here on the claim is never released, or a retry would redo it
+            response = jsonable_encoder(result)
+            future.set_result(response)
+            await asyncio.shield(self._complete(record_id, response))
+            return result
+        finally:
+            renewal.cancel()
+            self._inflight.pop(record_id, None)
+
+    async def _complete(self, record_id: str, response: Any):
+        for attempt in range(COMPLETE_ATTEMPTS):
+            try:
+                await self.collection.update_one(
+                    {"_id": record_id, "status": "in_progress"},
+                    {"$set": {"status": "completed", "response": response, "completed_at": datetime.utcnow()}}
+                )
+                return
+            except Exception as e:
+                logger.error(f"Error storing response for {record_id} (attempt {attempt + 1}): {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _renew(self, record_id: str, token: str):
+        """Keep the claim's lease fresh for as long as the work runs"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                await self.collection.update_one({"_id": record_id, "token": token, "status": "in_progress"},
+                                                 {"$set": {"claimed_at": datetime.utcnow()}})
+            except Exception as e:
+                logger.error(f"Error renewing idempotency claim {record_id}: {str(e)}")
+
+    def _lease_expired(self, record: Dict[str, Any]) -> bool:
+        claimed_at = record.get("claimed_at") or record.get("created_at")
+        return claimed_at is None or datetime.utcnow() - claimed_at > timedelta(seconds=self.lease_seconds)
+
+    async def _wait_for_completion(self, record_id: str, fingerprint: str, token: str):
+        """Poll until the record completes; None if it was released.
+
+        A record whose lease went stale is taken over with token and
+        returned still in progress, for the caller to run the work itself.
+        """
+        deadline = asyncio.get_running_loop().time() + self.wait_timeout
+        while True:
+            record = await self.collection.find_one({"_id": record_id})
+            if record is None or record.get("status") == "completed" or record["fingerprint"] != fingerprint:
+                return record
+            if self._lease_expired(record):
+                taken = await self.collection.find_one_and_update(
+                    {"_id": record_id, "status": "in_progress", "token": record.get("token")},
+                    {"$set": {"token": token, "claimed_at": datetime.utcnow()}},
+                    return_document=ReturnDocument.AFTER
+                )
+                if taken is not None:
+                    logger.warning(f"Took over stale idempotency claim {record_id}")
+                    return taken
+                continue
+            if asyncio.get_running_loop().time() >= deadline:
+                raise IdempotencyTimeout(f"Request {record_id} is still in progress")
+            await asyncio.sleep(self.poll_interval)
@@ -0,0 +1,211 @@
+"""
+FixIntel AI - Content-Addressed Image Store
+Company: RentMouse
+"""
+
+import asyncio
+import base64
+import hashlib
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from gridfs.errors import NoFile
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from pymongo.errors import DuplicateKeyError
+
+try:
+    from PIL import Image
+except ImportError:  # Renditions are skipped without Pillow; only the original is stored
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels of each rendition; "full" is capped so huge uploads are not served as-is
+RENDITIONS: Dict[str, int] = {
+    "thumb": 160,
+    "feed": 640,
+    "full": 1600,
+}
+JPEG_QUALITY = 82
+
+# Blobs are immutable under their digest, so clients and CDNs may keep them forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# A digest claimed this long ago and still pending belongs to a put() that died
+DIGEST_CLAIM_TIMEOUT = timedelta(minutes=5)
+# Seconds between checks while another put() stores the same image
+DIGEST_POLL_INTERVAL = 0.2
+
+
+class ImageNotFound(Exception):
+    pass
+
+
+def decode_base64_image(data: str) -> bytes:
+    """Accept plain base64 or a data: URI"""
+    if data.startswith("data:") and "," in data:
+        data = data.split(",", 1)[1]
+    return base64.b64decode(data)
+
+
+def _sniff_content_type(raw: bytes) -> str:
+    if raw.startswith(b"\x89PNG"):
+        return "image/png"
+    if raw[:4] == b"RIFF" and raw[8:12] == b"WEBP":
+        return "image/webp"
+    return "image/jpeg"
+
+
+def render_variants(raw: bytes) -> Tuple[Dict[str, bytes], Optional[Tuple[int, int]]]:
+    """Resize an image into every rendition (CPU bound, runs in the worker pool).
+
+    Returns the encoded renditions and the original size. Without Pillow,
+    or for bytes Pillow cannot decode, the original is the only rendition.
+    """
+    if Image is None:
+        return {"full": raw}, None
+    try:
+        with Image.open(io.BytesIO(raw)) as original:
+            original.load()
+            size = original.size
+            source = original.convert("RGB")
+    except Exception as e:
+        logger.warning(f"Could not decode image for renditions: {str(e)}")
+        return {"full": raw}, None
+
+    variants = {}
+    for name, edge in RENDITIONS.items():
+        image = source.copy()
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        variants[name] = buffer.getvalue()
+    return variants, size
+
+
+class ImageStore:
+    """Stores images in GridFS keyed by the sha256 of the original bytes.
+
+    Each image is kept as a set of renditions named "<digest>/<rendition>".
+    Posting the same image twice stores it once: the first put() claims the
+    digest by inserting it into <bucket>.digests, whose _id is the digest,
+    and marks it complete once every rendition is written. Concurrent puts
+    of the same image wait for that, and only complete entries are reused.
+    Documents keep only the reference returned by put().
+    """
+
+    def __init__(self, db, bucket_name: str = "images", workers: Optional[int] = None):
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name)
+        self.files = db[f"{bucket_name}.files"]
+        self.digests = db[f"{bucket_name}.digests"]
+        self._pool = ThreadPoolExecutor(max_workers=workers or min(4, os.cpu_count() or 1),
+                                        thread_name_prefix="image-renditions")
+
+    async def _claim(self, digest: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Renditions of the completed digest, or None once this call holds the claim to store it"""
+        while True:
+            entry = await self.digests.find_one({"_id": digest})
+            if entry is None:
+                try:
+                    await self.digests.insert_one({"_id": digest, "status": "pending", "claimed_at": datetime.utcnow()})
+                    return None
+                except DuplicateKeyError:
+                    continue
+            if entry["status"] == "complete":
+                return entry["renditions"]
+            if datetime.utcnow() - entry["claimed_at"] > DIGEST_CLAIM_TIMEOUT:
+                taken = await self.digests.find_one_and_update(
+                    {"_id": digest, "status": "pending", "claimed_at": entry["claimed_at"]},
+                    {"$set": {"claimed_at": datetime.utcnow()}}
+                )
+                if taken is not None:
+                    return None
+                continue
+            await asyncio.sleep(DIGEST_POLL_INTERVAL)
+
+    async def put(self, raw: bytes) -> Dict[str, Any]:
+        digest = hashlib.sha256(raw).hexdigest()
+        renditions = await self._claim(digest)
+        if renditions is not None:
+            return self._reference(digest, renditions)
+
+        try:
+            stored = await self._existing(digest)
+            if stored is None:
+                stored = await self._store(digest, raw)
+            await self.digests.update_one(
+                {"_id": digest},
+                {"$set": {"status": "complete", "renditions": stored, "completed_at": datetime.utcnow()}}
+            )
+        except BaseException:
+            # Release the claim so the next put() of this image can store it
+            await asyncio.shield(self.digests.delete_one({"_id": digest, "status": "pending"}))
+            raise
+        return self._reference(digest, stored)
+
+    async def _existing(self, digest: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """Renditions already in GridFS without a complete claim: stored before claims, or by a put() that died.
+
+        "full" is always written last, so a set that has it is complete;
+        anything less is removed to be stored again.
+        """
+        files = await self.files.find({"metadata.digest": digest}, {"metadata": 1}).to_list(None)
+        renditions = {f["metadata"]["rendition"]: f["metadata"] for f in files}
+        if "full" in renditions:
+            return renditions
+        for f in files:
+            await self.bucket.delete(f["_id"])
+        return None
+
+    async def _store(self, digest: str, raw: bytes) -> Dict[str, Dict[str, Any]]:
+        loop = asyncio.get_running_loop()
+        variants, size = await loop.run_in_executor(self._pool, render_variants, raw)
+
+        stored = {}
+        for name in sorted(variants, key=lambda n: n == "full"):
+            data = variants[name]
+            metadata = {
+                "digest": digest,
+                "rendition": name,
+                "content_type": _sniff_content_type(data),
+                "size": size,
+            }
+            await self.bucket.upload_from_stream(f"{digest}/{name}", data, metadata=metadata)
+            stored[name] = metadata
+        return stored
+
+    async def put_base64(self, data: str) -> Dict[str, Any]:
+        return await self.put(decode_base64_image(data))
+
+    def _reference(self, digest: str, stored: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        size = next((m.get("size") for m in stored.values() if m.get("size")), None)
+        return {
+            "digest": digest,
+            "renditions": sorted(stored),
+            "width": size[0] if size else None,
+            "height": size[1] if size else None,
+        }
+
+    async def open(self, digest: str, rendition: str) -> Tuple[Dict[str, Any], AsyncIterator[bytes]]:
+        """Metadata and a chunk iterator for one rendition, falling back to the original"""
+        for name in (rendition, "full"):
+            try:
+                stream = await self.bucket.open_download_stream_by_name(f"{digest}/{name}")
+            except NoFile:
+                continue
+            return stream.metadata or {}, self._chunks(stream)
+        raise ImageNotFound(f"{digest}/{rendition}")
+
+    async def _chunks(self, stream) -> AsyncIterator[bytes]:
+        while True:
+            chunk = await stream.readchunk()
+            if not chunk:
+                break
+            yield chunk
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
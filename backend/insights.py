@@ -0,0 +1,315 @@
+"""
+FixIntel AI - Repair History Insights
+Company: RentMouse
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from periodic import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+# Window used for the "recent_streak" count
+RECENT_WINDOW_DAYS = 30
+
+EMPTY_INSIGHTS = {
+    "total_repairs": 0,
+    "money_saved": 0,
+    "time_invested": 0,
+    "completion_rate": 0,
+    "most_common_repairs": [],
+    "recent_streak": 0,
+    "achievements": []
+}
+
+COUNTER_FIELDS = ("total_repairs", "completed_repairs", "money_saved", "time_invested")
+COUNTER_MAPS = ("item_types", "activity_days")
+
+# Attempts at writing a recomputed rollup before giving up to the next pass
+STORE_ATTEMPTS = 3
+
+
+def _field_key(value: str) -> str:
+    """Item types become field names, which may not contain '.' or start with '$'"""
+    return value.replace(".", "．").replace("$", "＄")
+
+
+def _field_label(key: str) -> str:
+    return key.replace("．", ".").replace("＄", "$")
+
+
+def _day(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d")
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def rollup_pipeline(user_id: str, recent_since: datetime) -> List[Dict[str, Any]]:
+    """Aggregation computing all insight counters for a user in one pass.
+
+    Only the handful of fields the counters need are projected, so the
+    embedded repair_data blobs never leave the storage engine.
+    """
+    return [
+        {"$match": {"user_id": user_id}},
+        {"$project": {
+            "status": 1,
+            "updated_at": 1,
+            "item_type": {"$ifNull": ["$item_type", "Unknown"]},
+            "typical_cost": "$cost_estimate.typical",
+            "total_time": "$time_estimate.total",
+        }},
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "total_repairs": {"$sum": 1},
+                    "completed_repairs": {"$sum": {"$cond": [{"$eq": ["$status", "completed"]}, 1, 0]}},
+                    "money_saved": {"$sum": "$typical_cost"},
+                    "time_invested": {"$sum": "$total_time"},
+                }},
+            ],
+            "item_types": [
+                # first_seen keeps ties in the order the types first appeared
+                {"$group": {"_id": "$item_type", "count": {"$sum": 1}, "first_seen": {"$min": {"$toDate": "$_id"}}}},
+            ],
+            "activity_days": [
+                {"$match": {"updated_at": {"$gte": recent_since}}},
+                {"$group": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$updated_at"}}, "count": {"$sum": 1}}},
+            ],
+        }},
+    ]
+
+
+def build_insights(total_repairs: int, completed_repairs: int, money_saved: float, time_invested: float,
+                   most_common_repairs: List[Dict[str, Any]], recent_streak: int) -> Dict[str, Any]:
+    """Shape insight counters into the /repair-insights response"""
+    completion_rate = (completed_repairs / total_repairs * 100) if total_repairs > 0 else 0
+
+    achievements = []
+    if total_repairs >= 1:
+        achievements.append({"title": "First Fix", "description": "Completed your first repair", "icon": "trophy"})
+    if total_repairs >= 5:
+        achievements.append({"title": "DIY Enthusiast", "description": "Completed 5 repairs", "icon": "star"})
+    if total_repairs >= 10:
+        achievements.append({"title": "Master Fixer", "description": "Completed 10 repairs", "icon": "medal"})
+    if money_saved >= 100:
+        achievements.append({"title": "Penny Saver", "description": "Saved over $100", "icon": "cash"})
+    if money_saved >= 500:
+        achievements.append({"title": "Budget Hero", "description": "Saved over $500", "icon": "trending-up"})
+
+    return {
+        "total_repairs": total_repairs,
+        "completed_repairs": completed_repairs,
+        "money_saved": round(money_saved, 2),
+        "time_invested": round(time_invested, 0),  # in minutes
+        "completion_rate": round(completion_rate, 1),
+        "most_common_repairs": most_common_repairs,
+        "recent_streak": recent_streak,
+        "achievements": achievements,
+        "currency": "USD"
+    }
+
+
+def insights_from_rollup(rollup: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the /repair-insights response from a user_insights document"""
+    if not rollup.get("total_repairs"):
+        return dict(EMPTY_INSIGHTS)
+
+    first_seen = rollup.get("item_first_seen", {})
+    item_types = [(key, count) for key, count in rollup.get("item_types", {}).items() if count > 0]
+    item_types.sort(key=lambda t: (-t[1], first_seen.get(t[0], datetime.max)))
+    most_common_repairs = [{"type": _field_label(key), "count": count} for key, count in item_types[:3]]
+
+    # Day-granular window: counts sessions last updated on any of the past 30 days
+    cutoff = _day(datetime.utcnow() - timedelta(days=RECENT_WINDOW_DAYS))
+    recent = sum(count for day, count in rollup.get("activity_days", {}).items() if day >= cutoff)
+
+    return build_insights(
+        total_repairs=rollup["total_repairs"],
+        completed_repairs=rollup.get("completed_repairs", 0),
+        money_saved=rollup.get("money_saved", 0),
+        time_invested=rollup.get("time_invested", 0),
+        most_common_repairs=most_common_repairs,
+        recent_streak=recent,
+    )
+
+
+def session_contribution(session: Optional[Dict[str, Any]]) -> Dict[str, float]:
+    """The counters a single repair session adds to its owner's rollup"""
+    if not session:
+        return {}
+    contribution = {
+        "total_repairs": 1,
+        "completed_repairs": 1 if session.get("status") == "completed" else 0,
+        f"item_types.{_field_key(session.get('item_type') or 'Unknown')}": 1,
+    }
+    typical = _number((session.get("cost_estimate") or {}).get("typical"))
+    if typical:
+        contribution["money_saved"] = typical
+    total = _number((session.get("time_estimate") or {}).get("total"))
+    if total:
+        contribution["time_invested"] = total
+    if isinstance(session.get("updated_at"), datetime):
+        contribution[f"activity_days.{_day(session['updated_at'])}"] = 1
+    return contribution
+
+
+class InsightsRollup:
+    """Maintains one user_insights document per user so /repair-insights is a point read.
+
+    Session writes apply their delta with $inc/$min; a background reconciler
+    recomputes the oldest-checked rollups from repair_sessions to repair any
+    drift (missed deltas, concurrent first builds, expired activity days).
+    """
+
+    def __init__(self, sessions, rollups, reconcile_interval: float = 600.0, reconcile_batch_size: int = 100):
+        self.sessions = sessions
+        self.rollups = rollups
+        self.reconcile_interval = reconcile_interval
+        self.reconcile_batch_size = reconcile_batch_size
+        self._periodic = PeriodicTask("insights reconciler", self.reconcile_batch, reconcile_interval)
+
+    async def compute(self, user_id: str) -> Dict[str, Any]:
+        """Recompute a user's rollup document from their sessions"""
+        now = datetime.utcnow()
+        recent_since = now - timedelta(days=RECENT_WINDOW_DAYS + 1)
+        results = await self.sessions.aggregate(rollup_pipeline(user_id, recent_since)).to_list(1)
+        facets = results[0] if results else {}
+        totals = facets.get("totals") or [{}]
+
+        rollup = {"user_id": user_id, "updated_at": now, "reconciled_at": now}
+        for field in COUNTER_FIELDS:
+            rollup[field] = totals[0].get(field) or 0
+        rollup["item_types"] = {_field_key(t["_id"]): t["count"] for t in facets.get("item_types", [])}
+        rollup["item_first_seen"] = {_field_key(t["_id"]): t["first_seen"] for t in facets.get("item_types", [])}
+        rollup["activity_days"] = {d["_id"]: d["count"] for d in facets.get("activity_days", [])}
+        return rollup
+
+    @staticmethod
+    def difference(current: Dict[str, Any], rollup: Dict[str, Any]) -> Dict[str, Any]:
+        """Update moving a stored rollup to a recomputed one.
+
+        Counters are moved with $inc rather than overwritten, and version is
+        bumped instead of reset, so the ETag of a changed rollup always moves.
+        """
+        inc: Dict[str, Any] = {}
+        unset: Dict[str, str] = {}
+        for field in COUNTER_FIELDS:
+            change = (rollup.get(field) or 0) - (_number(current.get(field)) or 0)
+            if change:
+                inc[field] = change
+        for field in COUNTER_MAPS:
+            stored, fresh = current.get(field) or {}, rollup.get(field) or {}
+            for key in set(stored) | set(fresh):
+                if key not in fresh:
+                    # Expired activity days and item types with no sessions left
+                    unset[f"{field}.{key}"] = ""
+                elif fresh[key] != stored.get(key):
+                    inc[f"{field}.{key}"] = fresh[key] - (_number(stored.get(key)) or 0)
+
+        stored_first_seen = current.get("item_first_seen") or {}
+        first_seen = {f"item_first_seen.{key}": moment for key, moment in rollup["item_first_seen"].items()
+                      if stored_first_seen.get(key) != moment}
+        unset.update({f"item_first_seen.{key}": "" for key in stored_first_seen
+                      if key not in rollup["item_first_seen"]})
+
+        update: Dict[str, Any] = {"$set": {"reconciled_at": rollup["reconciled_at"], **first_seen}}
+        if inc or unset:
+            inc["version"] = 1
+            update["$inc"] = inc
+            update["$set"]["updated_at"] = rollup["updated_at"]
+        if unset:
+            update["$unset"] = unset
+        return update
+
+    async def store(self, user_id: str, rollup: Dict[str, Any]) -> bool:
+        """Write a recomputed rollup; returns whether the stored one had drifted.
+
+        The write is guarded on the version it was diffed against. A session
+        delta landing in between bumps the version, and the rollup is then
+        recomputed so that delta is neither lost nor counted twice.
+        """
+        for attempt in range(STORE_ATTEMPTS):
+            if attempt:
+                rollup = await self.compute(user_id)
+            current = await self.rollups.find_one({"user_id": user_id})
+            if current is None:
+                try:
+                    await self.rollups.insert_one({**rollup, "version": 1})
+                    return False
+                except DuplicateKeyError:
+                    continue
+            update = self.difference(current, rollup)
+            result = await self.rollups.update_one({"user_id": user_id, "version": current.get("version")}, update)
+            if result.matched_count:
+                return "$inc" in update
+        logger.warning(f"Gave up reconciling insights rollup for {user_id} after concurrent updates")
+        return False
+
+    async def rebuild(self, user_id: str) -> Dict[str, Any]:
+        rollup = await self.compute(user_id)
+        await self.store(user_id, rollup)
+        return await self.rollups.find_one({"user_id": user_id}) or rollup
+
+    async def get(self, user_id: str) -> Dict[str, Any]:
+        rollup = await self.rollups.find_one({"user_id": user_id})
+        if rollup is None:
+            # First read for this user: build the rollup from history once
+            rollup = await self.rebuild(user_id)
+        return rollup
+
+    async def get_insights(self, user_id: str) -> Dict[str, Any]:
+        return insights_from_rollup(await self.get(user_id))
+
+    async def apply_change(self, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]):
+        """Apply the difference between a session's old and new state to its owner's rollup"""
+        user_id = (new or old or {}).get("user_id")
+        if not user_id:
+            return
+        before, after = session_contribution(old), session_contribution(new)
+        delta = {}
+        for field in set(before) | set(after):
+            change = after.get(field, 0) - before.get(field, 0)
+            if change:
+                delta[field] = change
+        if not delta:
+            return
+
+        now = datetime.utcnow()
+        first_seen = {f"item_first_seen.{field.split('.', 1)[1]}": now
+                      for field, change in delta.items() if field.startswith("item_types.") and change > 0}
+        # version and updated_at together identify this state of the rollup for ETags
+        update = {"$inc": {**delta, "version": 1}, "$set": {"updated_at": now}}
+        if first_seen:
+            update["$min"] = first_seen
+        # No upsert: a user without a rollup gets one built from history on first read
+        await self.rollups.update_one({"user_id": user_id}, update)
+
+    async def reset(self, user_id: str):
+        await self.rollups.delete_one({"user_id": user_id})
+
+    async def reconcile_batch(self) -> int:
+        """Recompute the least recently reconciled rollups; returns how many drifted"""
+        drifted = 0
+        stale = self.rollups.find({}, {"user_id": 1}).sort("reconciled_at", 1).limit(self.reconcile_batch_size)
+        async for doc in stale:
+            if await self.store(doc["user_id"], await self.compute(doc["user_id"])):
+                drifted += 1
+        if drifted:
+            logger.warning(f"Repaired drift in {drifted} user insights rollup(s)")
+        return drifted
+
+    def start(self):
+        self._periodic.start()
+
+    async def stop(self):
+        await self._periodic.stop()
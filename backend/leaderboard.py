@@ -0,0 +1,551 @@
+"""
+FixIntel AI - In-Memory Leaderboard Index
+Company: RentMouse
+"""
+
+import logging
+import random
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from periodic import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+# Writes from other workers are read back by polling updated_at; the overlap
+# absorbs clock skew between workers and is harmless because updates are idempotent
+CATCH_UP_OVERLAP = timedelta(seconds=30)
+
+# Entries per snapshot document, well under Mongo's 16MB document limit
+SNAPSHOT_CHUNK_SIZE = 20000
+
+# Competition windows, and how long a finished period's buckets are kept (TTL on expires_at)
+WINDOW_RETENTION = {"week": timedelta(weeks=8), "month": timedelta(days=400)}
+ALL_TIME = "all_time"
+
+# A bucket is only reconciled against the ledger once its user's newest event
+# and the bucket itself are this old, so no award is still between the two
+RECONCILE_SETTLE = timedelta(minutes=1)
+
+MAX_LEADERBOARD_LIMIT = 100
+MAX_AROUND_RADIUS = 25
+
+_MAX_LEVEL = 32
+_BRANCHING = 0.25
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, levels: int):
+        self.key = key
+        self.next: List[Optional["_Node"]] = [None] * levels
+        # width[i]: how many positions next[i] is ahead of this node
+        self.width: List[int] = [0] * levels
+
+
+class IndexableSkipList:
+    """Sorted keys with O(log n) insert, remove, rank and access by index.
+
+    Each link records how many positions it skips, so the position of a
+    key, or the key at a position, is found on the same descent as a search.
+    """
+
+    def __init__(self):
+        self._head = _Node(None, _MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+        self._random = random.Random()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < _MAX_LEVEL and self._random.random() < _BRANCHING:
+            level += 1
+        return level
+
+    def _predecessors(self, key) -> Tuple[List[_Node], List[int]]:
+        """Last node before key on each level, and its position (head is 0)"""
+        update: List[_Node] = [self._head] * _MAX_LEVEL
+        positions = [0] * _MAX_LEVEL
+        node, position = self._head, 0
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and node.next[i].key < key:
+                position += node.width[i]
+                node = node.next[i]
+            update[i], positions[i] = node, position
+        return update, positions
+
+    def insert(self, key):
+        update, positions = self._predecessors(key)
+        new_position = positions[0] + 1
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                update[i], positions[i] = self._head, 0
+            self._level = level
+
+        node = _Node(key, level)
+        for i in range(level):
+            before = update[i]
+            node.next[i] = before.next[i]
+            if node.next[i] is not None:
+                node.width[i] = before.width[i] + positions[i] + 1 - new_position
+            before.next[i] = node
+            before.width[i] = new_position - positions[i]
+        # Links passing over the new node now skip one more position
+        for i in range(level, self._level):
+            if update[i].next[i] is not None:
+                update[i].width[i] += 1
+        self._size += 1
+
+    def remove(self, key):
+        update, _ = self._predecessors(key)
+        target = update[0].next[0]
+        if target is None or target.key != key:
+            raise KeyError(key)
+
+        for i in range(self._level):
+            before = update[i]
+            if before.next[i] is target:
+                before.next[i] = target.next[i]
+                if target.next[i] is not None:
+                    before.width[i] += target.width[i] - 1
+            elif before.next[i] is not None:
+                before.width[i] -= 1
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+
+    def count_less(self, key) -> int:
+        """Number of keys strictly less than key"""
+        _, positions = self._predecessors(key)
+        return positions[0]
+
+    def _node_at(self, index: int) -> _Node:
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        target = index + 1
+        node, position = self._head, 0
+        for i in reversed(range(self._level)):
+            while node.next[i] is not None and position + node.width[i] <= target:
+                position += node.width[i]
+                node = node.next[i]
+        return node
+
+    def __getitem__(self, index: int):
+        return self._node_at(index).key
+
+    def islice(self, start: int, count: int) -> Iterator:
+        """Up to count keys from position start, in order"""
+        if count <= 0 or start >= self._size:
+            return
+        node: Optional[_Node] = self._node_at(max(start, 0))
+        while node is not None and count > 0:
+            yield node.key
+            node = node.next[0]
+            count -= 1
+
+
+class Leaderboard:
+    """Users ordered by XP (highest first, ties by user_id).
+
+    Places are competition style: users with equal XP share a place, and
+    the next place skips accordingly (1, 2, 2, 4).
+    """
+
+    def __init__(self):
+        self._order = IndexableSkipList()
+        self._xp: Dict[str, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._xp)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._xp
+
+    def update(self, user_id: str, xp: int) -> bool:
+        """Set a user's XP; False if it was already that"""
+        old = self._xp.get(user_id)
+        if old == xp:
+            return False
+        if old is not None:
+            self._order.remove((-old, user_id))
+        self._order.insert((-xp, user_id))
+        self._xp[user_id] = xp
+        return True
+
+    def remove(self, user_id: str):
+        old = self._xp.pop(user_id, None)
+        if old is not None:
+            self._order.remove((-old, user_id))
+
+    def xp(self, user_id: str) -> Optional[int]:
+        return self._xp.get(user_id)
+
+    def place(self, user_id: str) -> Optional[int]:
+        xp = self._xp.get(user_id)
+        if xp is None:
+            return None
+        # "" sorts before every user_id, so this counts users with strictly more XP
+        return self._order.count_less((-xp, "")) + 1
+
+    def _entries(self, start: int, count: int) -> List[Dict[str, Any]]:
+        entries: List[Dict[str, Any]] = []
+        for index, (neg_xp, user_id) in enumerate(self._order.islice(start, count), start):
+            xp = -neg_xp
+            if entries and entries[-1]["xp"] == xp:
+                place = entries[-1]["place"]
+            elif entries:
+                # Everyone before this user has more XP
+                place = index + 1
+            else:
+                place = self._order.count_less((neg_xp, "")) + 1
+            entries.append({"user_id": user_id, "xp": xp, "place": place})
+        return entries
+
+    def top(self, limit: int) -> List[Dict[str, Any]]:
+        return self._entries(0, limit)
+
+    def around(self, user_id: str, radius: int) -> List[Dict[str, Any]]:
+        """The user plus up to radius users on either side of them"""
+        xp = self._xp.get(user_id)
+        if xp is None:
+            return []
+        index = self._order.count_less((-xp, user_id))
+        start = max(index - radius, 0)
+        return self._entries(start, index - start + radius + 1)
+
+    def items(self) -> Iterator[Tuple[str, int]]:
+        for neg_xp, user_id in self._order.islice(0, len(self._order)):
+            yield user_id, -neg_xp
+
+
+class LeaderboardService:
+    """Keeps an all-time Leaderboard in memory and in step with gamification_profiles.
+
+    Awards made by this worker are applied as they happen. Awards made by
+    other workers are picked up by polling profiles by updated_at. Workers
+    warm-start from the latest snapshot in leaderboard_snapshots and only
+    catch up from when it was taken, instead of reading every profile.
+    """
+
+    def __init__(self, profiles, snapshots, board: str = "all_time",
+                 poll_interval: float = 5.0, snapshot_interval: float = 300.0):
+        self.profiles = profiles
+        self.snapshots = snapshots
+        self.board = board
+        self.poll_interval = poll_interval
+        self.snapshot_interval = snapshot_interval
+        self.leaderboard = Leaderboard()
+        self.ready = False
+        self._watermark: Optional[datetime] = None
+        self._dirty = False
+        self._last_snapshot: Optional[datetime] = None
+        self._periodic = PeriodicTask(f"leaderboard {board}", self._tick, poll_interval, run_first=True)
+
+    def apply(self, user_id: str, xp: int):
+        if self.leaderboard.update(user_id, xp):
+            self._dirty = True
+
+    async def _load_snapshot(self) -> bool:
+        header = await self.snapshots.find_one({"_id": self.board})
+        if header is None:
+            return False
+        chunks = await self.snapshots.find(
+            {"board": self.board, "generation": header["generation"]}
+        ).sort("chunk", 1).to_list(None)
+        if len(chunks) != header["chunks"]:
+            logger.warning(f"Leaderboard snapshot {self.board} is incomplete, rebuilding")
+            return False
+        for chunk in chunks:
+            for user_id, xp in chunk["entries"]:
+                self.leaderboard.update(user_id, xp)
+        self._watermark = header["taken_at"]
+        return True
+
+    async def _rebuild(self):
+        # Taken before reading so writes during the scan are caught up afterwards
+        self._watermark = datetime.utcnow()
+        async for profile in self.profiles.find({}, {"_id": 0, "user_id": 1, "xp": 1}):
+            self.leaderboard.update(profile["user_id"], profile.get("xp", 0))
+        self._dirty = True
+
+    async def load(self):
+        self.leaderboard = Leaderboard()
+        if not await self._load_snapshot():
+            self.leaderboard = Leaderboard()
+            await self._rebuild()
+        await self.catch_up()
+        self.ready = True
+        logger.info(f"Leaderboard {self.board} loaded with {len(self.leaderboard)} user(s)")
+
+    async def catch_up(self) -> int:
+        """Apply profiles changed since the watermark; returns how many moved"""
+        now = datetime.utcnow()
+        since = self._watermark - CATCH_UP_OVERLAP
+        changed = 0
+        async for profile in self.profiles.find({"updated_at": {"$gte": since}}, {"_id": 0, "user_id": 1, "xp": 1}):
+            if self.leaderboard.update(profile["user_id"], profile.get("xp", 0)):
+                changed += 1
+        if changed:
+            self._dirty = True
+        self._watermark = now
+        return changed
+
+    async def save_snapshot(self) -> bool:
+        """Write the board in chunks, then point the header at them.
+
+        The header only moves forward in time, so a slower worker finishing
+        an older snapshot cannot replace a newer one. The header is read
+        first so a worker that is behind skips writing chunks at all.
+        """
+        if not self._dirty:
+            return False
+        taken_at = self._watermark - CATCH_UP_OVERLAP
+        header = await self.snapshots.find_one({"_id": self.board}, {"taken_at": 1})
+        if header is not None and header["taken_at"] >= taken_at:
+            return False
+        self._dirty = False
+        generation = uuid.uuid4().hex
+        entries = [[user_id, xp] for user_id, xp in self.leaderboard.items()]
+        chunks = [entries[i:i + SNAPSHOT_CHUNK_SIZE] for i in range(0, len(entries), SNAPSHOT_CHUNK_SIZE)]
+        if chunks:
+            await self.snapshots.insert_many([
+                {"board": self.board, "generation": generation, "chunk": n, "entries": chunk, "taken_at": taken_at}
+                for n, chunk in enumerate(chunks)
+            ])
+        try:
+            await self.snapshots.update_one(
+                {"_id": self.board, "taken_at": {"$lt": taken_at}},
+                {"$set": {"generation": generation, "chunks": len(chunks), "size": len(entries), "taken_at": taken_at}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # A newer snapshot is already in place
+            await self.snapshots.delete_many({"board": self.board, "generation": generation})
+            return False
+        await self.snapshots.delete_many({"board": self.board, "generation": {"$ne": generation},
+                                          "taken_at": {"$lt": taken_at}})
+        return True
+
+    async def _tick(self):
+        if not self.ready:
+            # Retried every poll until it succeeds
+            await self.load()
+            self._last_snapshot = datetime.utcnow()
+            return
+        await self.catch_up()
+        if (datetime.utcnow() - self._last_snapshot).total_seconds() >= self.snapshot_interval:
+            self._last_snapshot = datetime.utcnow()
+            await self.save_snapshot()
+
+    def start(self):
+        self._periodic.start()
+
+    async def stop(self):
+        await self._periodic.stop()
+
+
+def period_key(window: str, moment: datetime) -> str:
+    """ISO week ("2026-W42") or calendar month ("2026-10") containing moment"""
+    if window == "week":
+        year, week, _ = moment.isocalendar()
+        return f"{year}-W{week:02d}"
+    if window == "month":
+        return f"{moment.year}-{moment.month:02d}"
+    raise ValueError(f"Unknown leaderboard window: {window}")
+
+
+def period_start(window: str, moment: datetime) -> datetime:
+    start = datetime(moment.year, moment.month, moment.day)
+    if window == "week":
+        return start - timedelta(days=start.weekday())
+    if window == "month":
+        return datetime(moment.year, moment.month, 1)
+    raise ValueError(f"Unknown leaderboard window: {window}")
+
+
+def period_end(window: str, moment: datetime) -> datetime:
+    start = datetime(moment.year, moment.month, moment.day)
+    if window == "week":
+        return start + timedelta(days=7 - start.weekday())
+    if window == "month":
+        return datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1)
+    raise ValueError(f"Unknown leaderboard window: {window}")
+
+
+def places(rows: List[Dict[str, Any]], first_place: int = 1) -> List[Dict[str, Any]]:
+    """Competition places for rows already sorted by xp descending"""
+    for i, row in enumerate(rows):
+        row["place"] = rows[i - 1]["place"] if i and rows[i - 1]["xp"] == row["xp"] else first_place + i
+    return rows
+
+
+class WindowedLeaderboards:
+    """Weekly and monthly leaderboards built from per-period XP buckets.
+
+    Each award adds its events' XP to one xp_buckets document per (window,
+    period, user), bucketed by when the work was done. The buckets of the
+    current periods are mirrored into in-memory Leaderboards, kept in step
+    across workers by polling updated_at, so windowed top-N and places cost
+    the same as all-time ones. Earlier periods are read from the (window,
+    period, xp) index, and buckets expire by TTL once their retention ends.
+
+    Bucket increments are made after the award, so one lost with a failed
+    request or worker is repaired by a periodic reconcile that re-sums the
+    current periods from the xp_events ledger.
+    """
+
+    def __init__(self, buckets, events, poll_interval: float = 5.0, reconcile_interval: float = 600.0):
+        self.buckets = buckets
+        self.events = events
+        self.poll_interval = poll_interval
+        self.ready = False
+        self._boards: Dict[str, Leaderboard] = {}
+        self._periods: Dict[str, str] = {}
+        self._watermark: Optional[datetime] = None
+        self._periodic = PeriodicTask("windowed leaderboards", self.refresh, poll_interval, run_first=True)
+        self._reconciler = PeriodicTask("windowed leaderboard reconcile", self._reconcile_pass, reconcile_interval)
+
+    def current(self, window: str) -> Optional[Tuple[str, Leaderboard]]:
+        """(period, board) of the window's current period once loaded"""
+        if window not in self._boards:
+            return None
+        return self._periods[window], self._boards[window]
+
+    async def _add(self, window: str, period: str, user_id: str, xp: int, expires_at: datetime,
+                   now: datetime) -> int:
+        key = {"window": window, "period": period, "user_id": user_id}
+        update = {"$inc": {"xp": xp}, "$set": {"updated_at": now}, "$setOnInsert": {"expires_at": expires_at}}
+        options = {"projection": {"_id": 0, "xp": 1}, "return_document": ReturnDocument.AFTER}
+        try:
+            bucket = await self.buckets.find_one_and_update(key, update, upsert=True, **options)
+        except DuplicateKeyError:
+            # Another request created the bucket first
+            bucket = await self.buckets.find_one_and_update(key, update, **options)
+        return bucket["xp"]
+
+    async def record(self, user_id: str, events: List[Dict[str, Any]]):
+        """Add new XP events to the buckets of the periods they happened in"""
+        totals: Dict[Tuple[str, str], int] = {}
+        ends: Dict[Tuple[str, str], datetime] = {}
+        for event in events:
+            if not event.get("xp"):
+                continue
+            for window, retention in WINDOW_RETENTION.items():
+                bucket = (window, period_key(window, event["occurred_at"]))
+                totals[bucket] = totals.get(bucket, 0) + event["xp"]
+                ends[bucket] = period_end(window, event["occurred_at"]) + retention
+
+        now = datetime.utcnow()
+        for (window, period), xp in totals.items():
+            total = await self._add(window, period, user_id, xp, ends[(window, period)], now)
+            if self._periods.get(window) == period:
+                self._boards[window].update(user_id, total)
+
+    async def _load_window(self, window: str, period: str):
+        board = Leaderboard()
+        async for bucket in self.buckets.find({"window": window, "period": period}, {"_id": 0, "user_id": 1, "xp": 1}):
+            board.update(bucket["user_id"], bucket["xp"])
+        self._boards[window], self._periods[window] = board, period
+
+    async def refresh(self):
+        """Roll boards over to new periods and apply other workers' bucket updates"""
+        # Taken before reading so writes made during the reads are caught up next time
+        now = datetime.utcnow()
+        since = self._watermark - CATCH_UP_OVERLAP if self._watermark else None
+        for window in WINDOW_RETENTION:
+            period = period_key(window, now)
+            if since is None or self._periods.get(window) != period:
+                await self._load_window(window, period)
+                continue
+            changed = self.buckets.find(
+                {"window": window, "period": period, "updated_at": {"$gte": since}},
+                {"_id": 0, "user_id": 1, "xp": 1}
+            )
+            async for bucket in changed:
+                self._boards[window].update(bucket["user_id"], bucket["xp"])
+        self._watermark = now
+        self.ready = True
+
+    async def _ledger_totals(self, window: str, now: datetime) -> List[Dict[str, Any]]:
+        """XP per user from applied events of the window's current period.
+
+        Backfilled events carry the date they were migrated, not when the
+        work was done, so they never count toward a period.
+        """
+        return await self.events.aggregate([
+            {"$match": {"occurred_at": {"$gte": period_start(window, now), "$lt": period_end(window, now)},
+                        "applied": {"$ne": False}, "compacted": {"$ne": True}, "backfilled": {"$ne": True}}},
+            {"$group": {"_id": "$user_id", "xp": {"$sum": "$xp"}, "last_created": {"$max": "$created_at"}}},
+        ]).to_list(None)
+
+    async def _set_bucket(self, window: str, period: str, user_id: str, xp: int, expires_at: datetime,
+                          settled: datetime, now: datetime) -> bool:
+        key = {"window": window, "period": period, "user_id": user_id}
+        result = await self.buckets.update_one(
+            {**key, "xp": {"$ne": xp}, "updated_at": {"$lt": settled}},
+            {"$set": {"xp": xp, "updated_at": now}}
+        )
+        if result.modified_count:
+            return True
+        if xp and not await self.buckets.count_documents(key, limit=1):
+            try:
+                await self.buckets.insert_one({**key, "xp": xp, "updated_at": now, "expires_at": expires_at})
+                return True
+            except DuplicateKeyError:
+                pass  # Created by an award since; the next pass checks it
+        return False
+
+    async def reconcile(self) -> int:
+        """Reset current-period buckets that disagree with the ledger; returns how many were wrong"""
+        now = datetime.utcnow()
+        settled = now - RECONCILE_SETTLE
+        corrected = 0
+        for window, retention in WINDOW_RETENTION.items():
+            period = period_key(window, now)
+            expires_at = period_end(window, now) + retention
+            totals: Dict[str, Optional[int]] = {}
+            for row in await self._ledger_totals(window, now):
+                # Recent awards may not have reached their bucket yet; the next pass checks them
+                settling = row["last_created"] is not None and row["last_created"] >= settled
+                totals[row["_id"]] = None if settling else row["xp"]
+            board = self._boards.get(window) if self._periods.get(window) == period else None
+            # Buckets with no ledger XP behind them at all are reset too
+            users = set(totals) | ({user_id for user_id, _ in board.items()} if board else set())
+            for user_id in users:
+                xp = totals.get(user_id, 0)
+                if xp is None:
+                    continue
+                if await self._set_bucket(window, period, user_id, xp, expires_at, settled, now):
+                    corrected += 1
+                    if board is not None:
+                        board.update(user_id, xp)
+        return corrected
+
+    async def _reconcile_pass(self):
+        corrected = await self.reconcile()
+        if corrected:
+            logger.warning(f"Corrected {corrected} windowed leaderboard bucket(s) from the XP ledger")
+
+    async def top_from_index(self, window: str, period: str, limit: int) -> List[Dict[str, Any]]:
+        """Top of a past period, read through the (window, period, xp) index"""
+        rows = await self.buckets.find(
+            {"window": window, "period": period}, {"_id": 0, "user_id": 1, "xp": 1}
+        ).sort("xp", -1).limit(limit).to_list(limit)
+        return places(rows)
+
+    def start(self):
+        self._periodic.start()
+        self._reconciler.start()
+
+    async def stop(self):
+        await self._reconciler.stop()
+        await self._periodic.stop()
@@ -0,0 +1,148 @@
+"""
+FixIntel AI - Deduplicated, Write-Buffered Likes
+Company: RentMouse
+"""
+
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from feed_ranking import SET_HOT_SCORE
+from periodic import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+# A post is only recounted once its newest like is this old, so no worker can
+# still be holding an unflushed delta for it
+RECOUNT_SETTLE = timedelta(minutes=1)
+
+# How far back the first recount after a restart looks, covering likes whose
+# deltas were lost with a worker that died before flushing them
+RECOUNT_LOOKBACK = timedelta(hours=1)
+
+
+class LikeBuffer:
+    """Records each (post, user) like once and batches the post counter updates.
+
+    The like itself is a small insert into post_likes, whose unique index
+    rejects repeats. The hot path, the post document's likes and score, is
+    only written when the buffer flushes, once per post per interval however
+    many likes arrived. Reads add the pending deltas so counts are exact on
+    this worker; other workers catch up within one flush interval.
+
+    Deltas only live in memory, so a recount periodically sets the counter of
+    every recently liked post to its number of post_likes rows plus the
+    legacy_likes counted before rows were kept, repairing likes lost with a
+    worker that died before flushing. Posts without legacy_likes have not
+    been migrated yet and are left alone.
+    """
+
+    def __init__(self, likes, posts, flush_interval: float = 2.0, max_pending: int = 1000,
+                 recount_interval: float = 300.0):
+        self.likes = likes
+        self.posts = posts
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[str, int] = defaultdict(int)
+        self._lock = asyncio.Lock()
+        self._recounted_through: Optional[datetime] = None
+        self._periodic = PeriodicTask("like buffer flush", self.flush, flush_interval, on_stop=self.flush)
+        self._recounter = PeriodicTask("like recount", self._recount_pass, recount_interval)
+
+    async def like(self, post_id: str, user_id: str) -> bool:
+        """Record a like; False if this user already liked the post"""
+        try:
+            await self.likes.insert_one({"post_id": post_id, "user_id": user_id, "created_at": datetime.utcnow()})
+        except DuplicateKeyError:
+            return False
+        self._pending[post_id] += 1
+        if len(self._pending) >= self.max_pending:
+            self._periodic.trigger()
+        return True
+
+    def pending(self, post_id: str) -> int:
+        return self._pending.get(post_id, 0)
+
+    def merge_pending(self, posts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Add likes not yet flushed to the counts of posts read from Mongo"""
+        for post in posts:
+            delta = self._pending.get(post.get("id"), 0)
+            if delta:
+                post["likes"] = post.get("likes", 0) + delta
+        return posts
+
+    async def flush(self):
+        async with self._lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, defaultdict(int)
+            post_ids = list(batch)
+            now = datetime.utcnow()
+            operations = [
+                UpdateOne(
+                    {"id": post_id},
+                    [{"$set": {"likes": {"$add": [{"$ifNull": ["$likes", 0]}, delta]}, "updated_at": now}},
+                     SET_HOT_SCORE]
+                )
+                for post_id, delta in batch.items()
+            ]
+            try:
+                await self.posts.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # Unordered: everything but the reported failures was applied
+                for error in e.details.get("writeErrors", []):
+                    self._pending[post_ids[error["index"]]] += batch[post_ids[error["index"]]]
+                logger.error(f"Error flushing likes for some posts: {str(e)}")
+            except Exception as e:
+                # Keep the deltas for the next flush rather than losing likes
+                for post_id, delta in batch.items():
+                    self._pending[post_id] += delta
+                logger.error(f"Error flushing likes: {str(e)}")
+
+    async def recount(self) -> int:
+        """Reset the counters of posts liked since the last recount; returns how many were wrong"""
+        now = datetime.utcnow()
+        settled = now - RECOUNT_SETTLE
+        since = self._recounted_through or now - RECOUNT_LOOKBACK
+        dirty = await self.likes.aggregate([
+            {"$match": {"created_at": {"$gte": since}}},
+            {"$group": {"_id": "$post_id", "last_liked": {"$max": "$created_at"}}},
+        ]).to_list(None)
+
+        corrected = 0
+        recounted_through = settled
+        for post in dirty:
+            # Still settling; its newest like falls in the next pass's window
+            if post["last_liked"] >= settled:
+                continue
+            if post["_id"] in self._pending:
+                # Its likes may all be older than settled, so the next pass starts early enough to see them
+                recounted_through = min(recounted_through, post["last_liked"])
+                continue
+            count = await self.likes.count_documents({"post_id": post["_id"]})
+            total = {"$add": ["$legacy_likes", count]}
+            result = await self.posts.update_one(
+                {"id": post["_id"], "legacy_likes": {"$exists": True}, "$expr": {"$ne": ["$likes", total]}},
+                [{"$set": {"likes": total, "updated_at": datetime.utcnow()}}, SET_HOT_SCORE]
+            )
+            corrected += result.modified_count
+        self._recounted_through = recounted_through
+        return corrected
+
+    async def _recount_pass(self):
+        corrected = await self.recount()
+        if corrected:
+            logger.warning(f"Corrected like count of {corrected} post(s)")
+
+    def start(self):
+        self._periodic.start()
+        self._recounter.start()
+
+    async def stop(self):
+        await self._recounter.stop()
+        await self._periodic.stop()
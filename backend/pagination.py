@@ -0,0 +1,59 @@
+"""
+FixIntel AI - Keyset Pagination Cursors
+Company: RentMouse
+"""
+
+import base64
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import json_util
+
+# Hard cap on any page size a client can ask for
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    """The cursor was not produced by encode_cursor or does not match the sort"""
+
+
+def encode_cursor(values: Dict[str, Any]) -> str:
+    """Opaque, URL-safe cursor holding the sort-key values of the last item on a page"""
+    raw = json_util.dumps(values).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: List[Tuple[str, int]]) -> Dict[str, Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json_util.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(values, dict) or set(values) != {field for field, _ in sort}:
+        raise InvalidCursor("Cursor does not match this listing")
+    return values
+
+
+def keyset_filter(sort: List[Tuple[str, int]], cursor: Optional[str]) -> Dict[str, Any]:
+    """Filter selecting the items strictly after the cursor in the given sort order.
+
+    For [(a, -1), (b, -1)] this is a < va OR (a == va AND b < vb), which an
+    index on the same keys answers with a single range scan.
+    """
+    if not cursor:
+        return {}
+    values = decode_cursor(cursor, sort)
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        branch = {f: values[f] for f, _ in sort[:i]}
+        branch[field] = {"$lt" if direction < 0 else "$gt": values[field]}
+        branches.append(branch)
+    return {"$or": branches}
+
+
+def split_page(items: List[Dict[str, Any]], sort: List[Tuple[str, int]],
+               limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Split a limit + 1 fetch into the page and the cursor for the next one (None on the last page)"""
+    if len(items) <= limit:
+        return items, None
+    page = items[:limit]
+    return page, encode_cursor({field: page[-1].get(field) for field, _ in sort})
@@ -0,0 +1,73 @@
+"""
+FixIntel AI - Periodic Background Tasks
+Company: RentMouse
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class PeriodicTask:
+    """Runs a coroutine function every interval seconds on the event loop.
+
+    Errors are logged and the loop carries on, so one bad pass never stops a
+    background job. trigger() runs the next pass immediately instead of
+    spawning an untracked task. stop() is always awaited: it cancels the
+    loop, waits for it to unwind and then runs on_stop, such as a final
+    flush, so shutdown never races a pass still in flight.
+    """
+
+    def __init__(self, name: str, func: Callable[[], Awaitable[Any]], interval: float,
+                 run_first: bool = False, on_stop: Optional[Callable[[], Awaitable[Any]]] = None):
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.run_first = run_first
+        self.on_stop = on_stop
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def _sleep(self):
+        try:
+            await asyncio.wait_for(self._wake.wait(), self.interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wake.clear()
+
+    async def _run(self):
+        if not self.run_first:
+            await self._sleep()
+        while True:
+            try:
+                await self.func()
+            except Exception as e:
+                logger.error(f"Error in {self.name}: {str(e)}")
+            await self._sleep()
+
+    def trigger(self):
+        """Run the next pass now rather than at the end of the interval"""
+        if self._wake is not None:
+            self._wake.set()
+
+    def start(self):
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        if self.on_stop is not None:
+            await self.on_stop()
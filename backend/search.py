@@ -0,0 +1,99 @@
+"""
+FixIntel AI - Full-Text Search over Community Posts and Repairs
+Company: RentMouse
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import TEXT, IndexModel
+
+# Field weights for each collection's text index; a title hit outranks a tips hit
+POST_TEXT_WEIGHTS = {"title": 10, "item_type": 5, "description": 3, "tips": 1}
+REPAIR_TEXT_WEIGHTS = {"item_type": 10, "damage_description": 5, "detected_issues": 3}
+
+POST_TEXT_INDEX = IndexModel(
+    [(field, TEXT) for field in POST_TEXT_WEIGHTS],
+    name="post_text", weights=POST_TEXT_WEIGHTS, default_language="english"
+)
+REPAIR_TEXT_INDEX = IndexModel(
+    [(field, TEXT) for field in REPAIR_TEXT_WEIGHTS],
+    name="repair_text", weights=REPAIR_TEXT_WEIGHTS, default_language="english"
+)
+
+# What a hit returns from each collection; images and full analyses stay out
+POST_RESULT_FIELDS = ["id", "title", "description", "item_type", "tips", "user_name", "likes",
+                      "timestamp", "before_image_ref"]
+REPAIR_RESULT_FIELDS = ["repair_id", "item_type", "damage_description", "detected_issues",
+                        "repair_difficulty", "estimated_time", "timestamp"]
+
+SEARCH_SCOPES = ("posts", "repairs")
+MAX_SEARCH_LIMIT = 50
+SNIPPET_WIDTH = 160
+
+_WORD = re.compile(r"[\w']+")
+_SUFFIXES = ("ing", "es", "ed", "s")
+
+
+def query_terms(query: str) -> List[str]:
+    """Words of a $text query worth highlighting (negated words are skipped)"""
+    terms = []
+    for raw in query.split():
+        if raw.startswith("-"):
+            continue
+        terms.extend(w.lower() for w in _WORD.findall(raw) if len(w) > 1)
+    return terms
+
+
+def _stem(term: str) -> str:
+    """Crude suffix strip so 'bearings' highlights 'bearing' as the text index matched it"""
+    for suffix in _SUFFIXES:
+        if term.endswith(suffix) and len(term) - len(suffix) >= 3:
+            return term[:-len(suffix)]
+    return term
+
+
+def highlight(text: Optional[str], terms: List[str], width: int = SNIPPET_WIDTH) -> Optional[Dict[str, Any]]:
+    """Snippet of text around the first matching term, with [start, end) offsets of every match"""
+    if not text or not terms:
+        return None
+    pattern = re.compile(r"\b(?:" + "|".join(re.escape(_stem(t)) for t in terms) + r")\w*", re.IGNORECASE)
+    first = pattern.search(text)
+    if first is None:
+        return None
+
+    start = max(0, first.start() - width // 3)
+    end = min(len(text), start + width)
+    snippet = text[start:end]
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(text) else ""
+    offsets = [[m.start() + len(prefix), m.end() + len(prefix)] for m in pattern.finditer(snippet)]
+    return {"text": prefix + snippet + suffix, "highlights": offsets}
+
+
+def _snippets(doc: Dict[str, Any], fields: List[str], terms: List[str]) -> Dict[str, Any]:
+    snippets = {}
+    for field in fields:
+        value = doc.get(field)
+        if isinstance(value, list):
+            value = "; ".join(str(v) for v in value)
+        match = highlight(value, terms)
+        if match:
+            snippets[field] = match
+    return snippets
+
+
+async def text_search(collection, query: str, weights: Dict[str, int], result_fields: List[str],
+                      limit: int, offset: int, filters: Optional[Dict[str, Any]] = None) -> Tuple[List[Dict[str, Any]], bool]:
+    """Run a $text query sorted by relevance; returns (hits, has_more)"""
+    projection = {field: 1 for field in result_fields}
+    # Named apart from the posts' hot score field so relevance never shadows it
+    projection.update({"_id": 0, "text_score": {"$meta": "textScore"}})
+    cursor = collection.find({"$text": {"$search": query}, **(filters or {})}, projection) \
+        .sort([("text_score", {"$meta": "textScore"})]).skip(offset).limit(limit + 1)
+    docs = await cursor.to_list(limit + 1)
+
+    terms = query_terms(query)
+    for doc in docs[:limit]:
+        doc["snippets"] = _snippets(doc, list(weights), terms)
+    return docs[:limit], len(docs) > limit
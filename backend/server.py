@@ -1,16 +1,45 @@
-from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Header, Query
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, JSONResponse, StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, DeleteOne, UpdateOne, UpdateMany
+from pymongo.errors import DuplicateKeyError, BulkWriteError
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Optional, Dict, Any
 import uuid
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 import base64
 import google.generativeai as genai
+from usage import UsageTracker, set_usage_context, set_usage_user, gemini_token_counts, usage_rollup
+from cancellation import ClientDisconnected, run_until_disconnect, CLIENT_CLOSED_REQUEST
+from result_cache import TTLCache, cache_key
+from idempotency import IdempotencyStore, IdempotencyConflict, IdempotencyTimeout
+from degradation import DegradationController
+from db_bootstrap import (bootstrap_database, applied_migrations, schema_requirements_met,
+                          GAMIFICATION_MIGRATIONS, GAMIFICATION_INDEXES)
+from insights import InsightsRollup, insights_from_rollup
+from sync import (record_tombstones, tombstones_since, needs_full_resync, naive_utc, page_since,
+                  SESSION_SYNC_SORT, POST_SYNC_SORT)
+from batch import BatchRequest, BatchError, BatchExecutor, validate_batch, collect_batch, stream_batch
+from etag import StaticJSON, conditional_json, etag_matches, json_with_etag, not_modified, serialize_json, version_etag
+from image_store import ImageStore, ImageNotFound, RENDITIONS, IMMUTABLE_CACHE_CONTROL, decode_base64_image
+from spam_detection import SpamDetector
+from feed_ranking import HotScoreRefresher, SET_HOT_SCORE, hot_score
+from like_buffer import LikeBuffer
+from gamification import (GamificationEngine, PROFILE_PROJECTION, MAX_XP_EVENT_BATCH, get_rank_for_xp,
+                          profile_response, step_event, repair_event)
+from xp_ledger import XpLedgerCompactor, STEP_EVENT, REPAIR_EVENT
+from leaderboard import (LeaderboardService, WindowedLeaderboards, ALL_TIME, WINDOW_RETENTION,
+                         MAX_LEADERBOARD_LIMIT, MAX_AROUND_RADIUS, period_key, places)
+from search import (SEARCH_SCOPES, MAX_SEARCH_LIMIT, POST_TEXT_WEIGHTS, REPAIR_TEXT_WEIGHTS,
+                    POST_RESULT_FIELDS, REPAIR_RESULT_FIELDS, text_search)
+from pagination import MAX_PAGE_SIZE, InvalidCursor, keyset_filter, split_page
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -27,15 +56,55 @@ genai.configure(api_key=GOOGLE_API_KEY)
 # OpenAI API Key for image generation (optional)
 OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
 
+# Pending reports after which a post is hidden from the feed until a moderator reviews it
+REPORT_AUTO_HIDE_THRESHOLD = int(os.environ.get('REPORT_AUTO_HIDE_THRESHOLD', '5'))
+
+# What happens to near-duplicates of recent posts: "flag" queues them for moderation, "reject" refuses them
+SPAM_DUPLICATE_ACTION = os.environ.get('SPAM_DUPLICATE_ACTION', 'flag')
+
+GEMINI_MODEL = 'gemini-2.0-flash'
+IMAGE_MODEL = 'gpt-image-1'
+
+# Model usage accounting (token counts, latency, cost per endpoint and user)
+usage_tracker = UsageTracker(db.usage)
+
+# Turns off optional enrichments (diagrams, videos, parts search) under load
+degradation = DegradationController.from_env()
+
+def record_gemini_usage(response, started: float, error: bool = False):
+    """Record token counts and latency of a Gemini call"""
+    degradation.record_upstream(not error)
+    input_tokens, output_tokens = gemini_token_counts(response) if response is not None else (0, 0)
+    usage_tracker.record(
+        GEMINI_MODEL,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        latency_ms=(time.perf_counter() - started) * 1000,
+        error=error
+    )
+
+def record_image_usage(images: int, started: float, error: bool = False):
+    """Record an image generation call"""
+    degradation.record_upstream(not error)
+    usage_tracker.record(
+        IMAGE_MODEL,
+        images=images,
+        latency_ms=(time.perf_counter() - started) * 1000,
+        error=error
+    )
+
 # Helper function to call Gemini API
 async def call_gemini(prompt: str, system_message: str = "") -> str:
     """Call Google Gemini API with a text prompt"""
+    started = time.perf_counter()
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = genai.GenerativeModel(GEMINI_MODEL)
         full_prompt = f"{system_message}\n\n{prompt}" if system_message else prompt
-        response = model.generate_content(full_prompt)
+        response = await model.generate_content_async(full_prompt)
+        record_gemini_usage(response, started)
         return response.text
     except Exception as e:
+        record_gemini_usage(None, started, error=True)
         logger.error(f"Gemini API error: {str(e)}")
         raise
 
@@ -43,10 +112,85 @@ async def call_gemini(prompt: str, system_message: str = "") -> str:
 app = FastAPI()
 api_router = APIRouter(prefix="/api")
 
+# Dispatches /api/batch sub-requests back into this app in-process
+batch_executor = BatchExecutor(app)
+
+# Step details are shared across users, so work finished after a disconnect is kept here
+step_details_cache = TTLCache(max_entries=64, ttl_seconds=24 * 3600)
+
+# Tutorial videos found per search, served alone when degraded
+videos_cache = TTLCache(max_entries=1024, ttl_seconds=24 * 3600)
+
+# Responses of expensive POSTs keyed by the client's Idempotency-Key header
+idempotency_store = IdempotencyStore(db.idempotency_keys)
+
+# Community post images, stored once per content hash with resized renditions
+image_store = ImageStore(db)
+
+# Applies XP events to gamification profiles atomically, recording each in the xp_events ledger
+gamification_engine = GamificationEngine(db.gamification_profiles, db.xp_events)
+
+# All-time leaderboard held in memory, updated on each award and by polling other workers' awards
+leaderboard_service = LeaderboardService(db.gamification_profiles, db.leaderboard_snapshots)
+gamification_engine.add_listener(lambda user_id, profile, events: leaderboard_service.apply(user_id, profile["xp"]))
+
+# Weekly and monthly leaderboards from per-period XP buckets
+windowed_leaderboards = WindowedLeaderboards(db.xp_buckets, db.xp_events)
+gamification_engine.add_listener(lambda user_id, profile, events: windowed_leaderboards.record(user_id, events))
+
+# Folds expired XP events into per-user snapshots
+xp_ledger_compactor = XpLedgerCompactor(db.xp_events, db.xp_snapshots)
+
+# Fingerprints of recent posts for near-duplicate detection
+spam_detector = SpamDetector(db.post_fingerprints)
+
+# Re-applies the hot ranking formula to recent posts
+hot_score_refresher = HotScoreRefresher(db.community_posts)
+
+# One like per user per post; post counters are written in batches
+like_buffer = LikeBuffer(db.post_likes, db.community_posts)
+
+# Per-user insight counters, maintained incrementally as sessions change
+insights_rollup = InsightsRollup(db.repair_sessions, db.user_insights)
+
+async def run_idempotent(idempotency_key: Optional[str], scope: str, payload: Any, handler):
+    """Run handler at most once per Idempotency-Key, replaying the stored response for retries"""
+    if not idempotency_key:
+        return await handler()
+    try:
+        response, replayed = await idempotency_store.execute(idempotency_key, scope, payload, handler)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except IdempotencyTimeout as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if replayed:
+        return JSONResponse(content=response, headers={"Idempotent-Replayed": "true"})
+    return response
+
+@app.exception_handler(ClientDisconnected)
+async def client_disconnected_handler(request: Request, exc: ClientDisconnected):
+    # Nobody is listening; close out the request without a body
+    return Response(status_code=CLIENT_CLOSED_REQUEST)
+
 # Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+@app.middleware("http")
+async def attribute_model_usage(request: Request, call_next):
+    """Tag model calls made while serving this request with its endpoint and user"""
+    set_usage_context(request.url.path, request.query_params.get("user_id"))
+    return await call_next(request)
+
+@app.middleware("http")
+async def track_in_flight_requests(request: Request, call_next):
+    """Feed the number of in-flight requests to the degradation controller"""
+    degradation.request_started()
+    try:
+        return await call_next(request)
+    finally:
+        degradation.request_finished()
+
 # ============ MODELS ============
 
 class RepairAnalysisRequest(BaseModel):
@@ -55,6 +199,7 @@ class RepairAnalysisRequest(BaseModel):
     language: str = "en"
     skill_level: Optional[str] = "diy"  # beginner, diy, pro
     model_number: Optional[str] = None  # PR #5: Model number for better accuracy
+    user_id: Optional[str] = None  # Attributes model usage
 
 class CostEstimate(BaseModel):
     low: float
@@ -102,12 +247,15 @@ class RepairAnalysisResponse(BaseModel):
     diagnostic_questions: Optional[List[Any]] = []  # Can be strings or ClarifyingQuestion dicts
     clarifying_questions: Optional[List[Any]] = []  # Can be strings or ClarifyingQuestion dicts
     detected_issues: Optional[List[str]] = []
+    # Optional enrichments skipped because the server was under load
+    degraded: Optional[Dict[str, bool]] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
 
 class TroubleshootQuestion(BaseModel):
     repair_id: str
     question: str
     user_answer: str
+    user_id: Optional[str] = None  # Attributes model usage
 
 class SaveRepairSession(BaseModel):
     repair_id: str
@@ -118,13 +266,21 @@ class SaveRepairSession(BaseModel):
     status: Optional[str] = "saved"  # saved, in_progress, completed
     repair_data: Optional[Dict[str, Any]] = None  # Full repair analysis data
 
+class RepairSessionPatch(BaseModel):
+    progress_percentage: Optional[int] = None
+    status: Optional[str] = None  # saved, in_progress, completed
+    notes: Optional[str] = None
+    completed_steps: Optional[List[int]] = None  # Indices of completed steps
+
 class CommunityPost(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     title: str
     description: str
     item_type: str
-    before_image: str  # base64
-    after_image: Optional[str] = None  # base64
+    before_image: Optional[str] = None  # base64 on upload, moved to the image store when posted
+    after_image: Optional[str] = None  # base64 on upload, moved to the image store when posted
+    before_image_ref: Optional[Dict[str, Any]] = None  # Set by the server, see ImageStore.put
+    after_image_ref: Optional[Dict[str, Any]] = None
     repair_steps_used: List[str]
     tips: Optional[str] = None
     user_name: str = "Anonymous"
@@ -136,6 +292,7 @@ class ReportRequest(BaseModel):
     reason: str  # inappropriate, spam, dangerous, misleading, other
     details: Optional[str] = None
     reporter_name: Optional[str] = "Anonymous"
+    reporter_id: Optional[str] = None  # User id; repeat reports from the same reporter are ignored
 
 class Report(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -143,6 +300,7 @@ class Report(BaseModel):
     reason: str
     details: Optional[str] = None
     reporter_name: str = "Anonymous"
+    reporter_id: Optional[str] = None
     timestamp: datetime = Field(default_factory=datetime.utcnow)
     status: str = "pending"  # pending, reviewed, resolved
 
@@ -150,27 +308,48 @@ class ModeratePostRequest(BaseModel):
     action: str  # delete, approve, ignore
     admin_notes: Optional[str] = None
 
-# Gamification Models
-class GamificationProfile(BaseModel):
-    user_id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    total_xp: int = 0
-    level: int = 1
-    current_streak: int = 0
-    longest_streak: int = 0
-    last_activity_date: Optional[datetime] = None
-    badges_earned: List[str] = []
-    stats: Dict[str, Any] = {}
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+class BulkModerationItem(ModeratePostRequest):
+    post_id: str
 
+class BulkModerationRequest(BaseModel):
+    actions: List[BulkModerationItem]
+
+# Gamification Models
 class CompleteStepRequest(BaseModel):
+    user_id: str = "default_user"
     repair_id: str
     step_number: int
 
 class CompleteRepairRequest(BaseModel):
+    user_id: str = "default_user"
+    repair_id: str
+    item_type: str = ""
+    total_steps: int = 0
+    time_taken_minutes: int = 0
+
+class XpEventItem(BaseModel):
+    kind: str  # step, repair
     repair_id: str
-    difficulty: str  # easy, medium, hard
-    time_taken_minutes: int
+    step_number: Optional[int] = None  # Required for steps
+    item_type: str = ""
+    total_steps: int = 0
+    time_taken_minutes: int = 0
+    occurred_at: Optional[datetime] = None  # When it was done on the device, possibly offline
+
+class XpEventBatch(BaseModel):
+    user_id: str = "default_user"
+    events: List[XpEventItem]
+
+class SyncMutation(BaseModel):
+    op: str  # save_session, update_session, delete_session, complete_step, complete_repair
+    client_id: Optional[str] = None  # Unique per queued mutation, replays safely on retry
+    data: Dict[str, Any] = {}
+
+class SyncRequest(BaseModel):
+    user_id: str = "default_user"
+    since: Optional[datetime] = None  # server_time returned by the previous sync
+    mutations: List[SyncMutation] = []
+    cursors: Dict[str, str] = {}  # Returned with has_more, to fetch the next page of each listing
 
 class FeedbackRequest(BaseModel):
     repair_id: str
@@ -506,7 +685,7 @@ GOOD (specific): "Did the screen crack from a single drop, or has it been develo
 """
         
         # Use Google Gemini directly instead of LlmChat
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        model = genai.GenerativeModel(GEMINI_MODEL)
         
         # Decode and prepare the image
         image_data = base64.b64decode(image_base64)
@@ -518,7 +697,13 @@ GOOD (specific): "Did the screen crack from a single drop, or has it been develo
         }
         
         # Send the request
-        response = model.generate_content([prompt, image_part])
+        started = time.perf_counter()
+        try:
+            response = await model.generate_content_async([prompt, image_part])
+        except Exception:
+            record_gemini_usage(None, started, error=True)
+            raise
+        record_gemini_usage(response, started)
         
         # Parse JSON response
         import json
@@ -565,11 +750,17 @@ The infographic should be informative, visually appealing, and easy to understan
         
         logger.info(f"Generating repair infographic for {item_type}")
         
-        images = await image_gen.generate_images(
-            prompt=prompt,
-            model="gpt-image-1",
-            number_of_images=1
-        )
+        started = time.perf_counter()
+        try:
+            images = await image_gen.generate_images(
+                prompt=prompt,
+                model=IMAGE_MODEL,
+                number_of_images=1
+            )
+        except Exception:
+            record_image_usage(0, started, error=True)
+            raise
+        record_image_usage(len(images or []), started)
         
         if images and len(images) > 0:
             # Convert bytes to base64 string
@@ -586,71 +777,90 @@ The infographic should be informative, visually appealing, and easy to understan
 # ============ ENDPOINTS ============
 
 @api_router.post("/analyze-repair", response_model=RepairAnalysisResponse)
-async def analyze_repair(request: RepairAnalysisRequest):
+async def analyze_repair(request: RepairAnalysisRequest, http_request: Request,
+                         idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     """Analyze a broken item and provide repair instructions"""
+    set_usage_user(request.user_id)
     try:
-        # Analyze the image with skill level, model number, and MIME type
-        analysis = await analyze_broken_item(
-            request.image_base64, 
-            request.language,
-            request.skill_level,
-            request.model_number,
-            request.image_mime_type
+        # Cancel the vision call, diagram and insert if the client goes away
+        return await run_idempotent(
+            idempotency_key,
+            "analyze-repair",
+            request.dict(),
+            lambda: run_until_disconnect(http_request, run_repair_analysis(request))
         )
         
-        # Generate repair ID
-        repair_id = str(uuid.uuid4())
-        
-        # Generate diagram (optional, can be slow)
+    except (ClientDisconnected, HTTPException):
+        raise
+    except Exception as e:
+        logger.error(f"Error in analyze_repair: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def run_repair_analysis(request: RepairAnalysisRequest) -> RepairAnalysisResponse:
+    """Run the vision analysis, diagram generation and persistence for a repair"""
+    # Analyze the image with skill level, model number, and MIME type
+    analysis = await analyze_broken_item(
+        request.image_base64, 
+        request.language,
+        request.skill_level,
+        request.model_number,
+        request.image_mime_type
+    )
+    
+    # Generate repair ID
+    repair_id = str(uuid.uuid4())
+    
+    # Generate diagram (optional, can be slow, skipped under load)
+    degraded = degradation.flags()
+    diagram_base64 = None
+    if not degraded["diagrams"]:
         diagram_base64 = await generate_repair_diagram(
             analysis.get('item_type', 'item'),
             analysis.get('repair_steps', [])
         )
-        
-        # Create response
-        # Handle estimated_time which could be string or dict
-        estimated_time = analysis.get('estimated_time', 'Unknown')
-        if isinstance(estimated_time, dict):
-            total = estimated_time.get('total', 0)
-            unit = estimated_time.get('unit', 'minutes')
-            estimated_time = f"{total} {unit}"
-        
-        response = RepairAnalysisResponse(
-            repair_id=repair_id,
-            item_type=analysis.get('item_type', 'Unknown'),
-            damage_description=analysis.get('damage_description', ''),
-            repair_difficulty=analysis.get('repair_difficulty', 'medium'),
-            estimated_time=estimated_time,
-            repair_steps=analysis.get('repair_steps', []),
-            tools_needed=analysis.get('tools_needed', []),
-            parts_needed=analysis.get('parts_needed', []),
-            safety_tips=analysis.get('safety_tips', []),
-            risk_level=analysis.get('risk_level', 'low'),
-            confidence_score=analysis.get('confidence_score', 85),
-            stop_and_call_pro=analysis.get('stop_and_call_pro', False),
-            assumptions=analysis.get('assumptions', []),
-            cost_estimate=analysis.get('cost_estimate'),
-            time_estimate=analysis.get('time_estimate'),
-            diagram_base64=diagram_base64,
-            model_number=request.model_number,  # PR #5
-            no_visible_damage=analysis.get('no_visible_damage', False),
-            diagnostic_questions=analysis.get('diagnostic_questions', []),
-            clarifying_questions=analysis.get('clarifying_questions', []),
-            detected_issues=analysis.get('detected_issues', [])
-        )
-        
-        # Save to database
-        await db.repairs.insert_one(response.dict())
-        
-        return response
-        
-    except Exception as e:
-        logger.error(f"Error in analyze_repair: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    
+    # Create response
+    # Handle estimated_time which could be string or dict
+    estimated_time = analysis.get('estimated_time', 'Unknown')
+    if isinstance(estimated_time, dict):
+        total = estimated_time.get('total', 0)
+        unit = estimated_time.get('unit', 'minutes')
+        estimated_time = f"{total} {unit}"
+    
+    response = RepairAnalysisResponse(
+        repair_id=repair_id,
+        item_type=analysis.get('item_type', 'Unknown'),
+        damage_description=analysis.get('damage_description', ''),
+        repair_difficulty=analysis.get('repair_difficulty', 'medium'),
+        estimated_time=estimated_time,
+        repair_steps=analysis.get('repair_steps', []),
+        tools_needed=analysis.get('tools_needed', []),
+        parts_needed=analysis.get('parts_needed', []),
+        safety_tips=analysis.get('safety_tips', []),
+        risk_level=analysis.get('risk_level', 'low'),
+        confidence_score=analysis.get('confidence_score', 85),
+        stop_and_call_pro=analysis.get('stop_and_call_pro', False),
+        assumptions=analysis.get('assumptions', []),
+        cost_estimate=analysis.get('cost_estimate'),
+        time_estimate=analysis.get('time_estimate'),
+        diagram_base64=diagram_base64,
+        model_number=request.model_number,  # PR #5
+        no_visible_damage=analysis.get('no_visible_damage', False),
+        diagnostic_questions=analysis.get('diagnostic_questions', []),
+        clarifying_questions=analysis.get('clarifying_questions', []),
+        detected_issues=analysis.get('detected_issues', []),
+        degraded=degraded
+    )
+    
+    # Save to database
+    await db.repairs.insert_one(response.dict())
+    
+    return response
 
 @api_router.post("/refine-diagnosis")
 async def refine_diagnosis(request: Dict[str, Any]):
     """Refine diagnosis based on user answers to diagnostic questions"""
+    set_usage_user(request.get('user_id'))
     try:
         item_type = request.get('item_type', '')
         initial_analysis = request.get('initial_analysis', {})
@@ -731,6 +941,7 @@ Format your response as JSON with these exact keys:
 @api_router.post("/troubleshoot")
 async def troubleshoot(question: TroubleshootQuestion):
     """Interactive troubleshooting based on user responses"""
+    set_usage_user(question.user_id)
     try:
         # Get repair details
         repair = await db.repairs.find_one({"repair_id": question.repair_id})
@@ -755,42 +966,139 @@ User Answer: {question.user_answer}"""
         logger.error(f"Error in troubleshooting: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def upsert_repair_session(key: Dict[str, str], changes: Dict[str, Any], new_id: Optional[str] = None):
+    """Apply changes to the session identified by (user_id, repair_id); returns (before, after).
+
+    With new_id the session is created if missing, otherwise before is None
+    when there is no such session. repair_data is excluded from before/after
+    so progress updates never read the analysis blob back.
+    """
+    changes = {**changes, 'updated_at': datetime.utcnow()}
+    update: Dict[str, Any] = {"$set": changes}
+    if new_id:
+        update["$setOnInsert"] = {"id": new_id, "created_at": changes['updated_at']}
+
+    for attempt in range(2):
+        try:
+            before = await db.repair_sessions.find_one_and_update(
+                key, update, projection={"repair_data": 0},
+                upsert=bool(new_id), return_document=ReturnDocument.BEFORE
+            )
+            break
+        except DuplicateKeyError:
+            # A concurrent save inserted the session first; retry as an update
+            if attempt:
+                raise
+
+    if before is None and not new_id:
+        return None, None
+    after = {**(before or {**key, "id": new_id, "created_at": changes['updated_at']}), **changes}
+    after.pop('repair_data', None)
+    await insights_rollup.apply_change(before, after)
+    return before, after
+
 @api_router.post("/save-repair-session")
 async def save_repair_session(session: SaveRepairSession):
     """Save repair session for progress tracking"""
     try:
-        session_dict = session.dict()
-        session_dict['id'] = str(uuid.uuid4())
-        session_dict['updated_at'] = datetime.utcnow()
-        
-        result = await db.repair_sessions.insert_one(session_dict)
-        return {"session_id": session_dict['id'], "message": "Session saved successfully"}
+        key = {"user_id": session.user_id, "repair_id": session.repair_id}
+        # Progress saves may omit the analysis; keep the stored copy then
+        changes = session.dict(exclude={"user_id", "repair_id", "repair_data"})
+        if session.repair_data is not None:
+            changes['repair_data'] = session.repair_data
+
+        _, saved = await upsert_repair_session(key, changes, new_id=str(uuid.uuid4()))
+        return {"session_id": saved['id'], "message": "Session saved successfully"}
         
     except Exception as e:
         logger.error(f"Error saving session: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.patch("/repair-sessions/{repair_id}")
+async def update_repair_session(repair_id: str, patch: RepairSessionPatch, user_id: str = "default_user"):
+    """Partially update a saved session's progress without resending repair_data"""
+    try:
+        changes = patch.dict(exclude_unset=True)
+        if not changes:
+            raise HTTPException(status_code=400, detail="No fields to update")
+
+        _, updated = await upsert_repair_session({"user_id": user_id, "repair_id": repair_id}, changes)
+        if updated is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        updated.pop('_id', None)
+        return updated
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error updating session: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Newest first; _id breaks ties between sessions saved in the same millisecond
+SESSION_SORT = [("updated_at", -1), ("_id", -1)]
+
+# What the progress list renders; the analysis itself is fetched per session
+SESSION_SUMMARY_PROJECTION = {
+    "id": 1, "repair_id": 1, "user_id": 1, "title": 1, "notes": 1, "status": 1,
+    "progress_percentage": 1, "completed_steps": 1, "created_at": 1, "updated_at": 1,
+    "item_type": "$repair_data.item_type",
+    "damage_description": "$repair_data.damage_description",
+}
+
 @api_router.get("/repair-sessions")
-async def get_repair_sessions(user_id: str = "default_user"):
-    """Get repair sessions for a specific user"""
+async def get_repair_sessions(request: Request, user_id: str = "default_user",
+                              limit: int = Query(MAX_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+                              cursor: Optional[str] = None, fields: Optional[str] = None):
+    """Get repair sessions for a specific user, newest first.
+
+    The body stays a plain list; when more sessions remain, the cursor for
+    the next page is returned in the X-Next-Cursor header. fields=summary
+    leaves out repair_data.
+    """
     try:
         # Filter by user_id to only show that user's repairs
-        sessions = await db.repair_sessions.find({"user_id": user_id}).sort("updated_at", -1).to_list(100)
+        query = {"user_id": user_id, **keyset_filter(SESSION_SORT, cursor)}
+        projection = SESSION_SUMMARY_PROJECTION if fields == "summary" else None
+        sessions = await db.repair_sessions.find(query, projection).sort(SESSION_SORT).to_list(limit + 1)
+        sessions, next_page = split_page(sessions, SESSION_SORT, limit)
         for session in sessions:
             session['_id'] = str(session['_id'])
-        return sessions
+        return conditional_json(request, sessions, headers={"X-Next-Cursor": next_page} if next_page else None)
         
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching sessions: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/repair-sessions/{repair_id}")
+async def get_repair_session(repair_id: str, user_id: str = "default_user"):
+    """Get one saved session including its full repair_data"""
+    try:
+        session = await db.repair_sessions.find_one({"user_id": user_id, "repair_id": repair_id})
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        session['_id'] = str(session['_id'])
+        return session
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching session: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.delete("/repair-sessions/{session_id}")
-async def delete_repair_session(session_id: str):
-    """Delete a specific repair session"""
+async def delete_repair_session(session_id: str, user_id: Optional[str] = None):
+    """Delete a specific repair session, only if it is user_id's when given"""
     try:
-        result = await db.repair_sessions.delete_one({"repair_id": session_id})
-        if result.deleted_count == 0:
+        query = {"repair_id": session_id}
+        if user_id is not None:
+            query["user_id"] = user_id
+        deleted = await db.repair_sessions.find_one_and_delete(query)
+        if deleted is None:
             raise HTTPException(status_code=404, detail="Session not found")
+        await insights_rollup.apply_change(deleted, None)
+        await record_tombstones(db.tombstones, "repair_session", [session_id], deleted.get("user_id"))
         return {"message": "Session deleted successfully"}
         
     except HTTPException:
@@ -803,7 +1111,10 @@ async def delete_repair_session(session_id: str):
 async def delete_all_repair_sessions(user_id: str = "default_user"):
     """Delete all repair sessions for a specific user"""
     try:
+        repair_ids = await db.repair_sessions.distinct("repair_id", {"user_id": user_id})
         result = await db.repair_sessions.delete_many({"user_id": user_id})
+        await insights_rollup.reset(user_id)
+        await record_tombstones(db.tombstones, "repair_session", repair_ids, user_id)
         return {"message": f"Deleted {result.deleted_count} session(s)"}
         
     except Exception as e:
@@ -812,146 +1123,229 @@ async def delete_all_repair_sessions(user_id: str = "default_user"):
 
 # PR #8: Repair History & Insights
 @api_router.get("/repair-insights")
-async def get_repair_insights(user_id: str = "default_user"):
+async def get_repair_insights(request: Request, user_id: str = "default_user"):
     """Get aggregated insights from repair history for a specific user"""
     try:
-        # Get repair sessions for this specific user
-        sessions = await db.repair_sessions.find({"user_id": user_id}).to_list(1000)
-        
-        if not sessions:
-            return {
-                "total_repairs": 0,
-                "money_saved": 0,
-                "time_invested": 0,
-                "completion_rate": 0,
-                "most_common_repairs": [],
-                "recent_streak": 0,
-                "achievements": []
-            }
-        
-        # Calculate statistics
-        total_repairs = len(sessions)
-        completed_repairs = sum(1 for s in sessions if s.get('status') == 'completed')
-        money_saved = 0
-        time_invested = 0
-        repair_types = {}
-        
-        for session in sessions:
-            # Money saved (use typical cost from cost_estimate)
-            if session.get('cost_estimate') and session.get('cost_estimate', {}).get('typical'):
-                money_saved += session['cost_estimate']['typical']
-            
-            # Time invested (use total from time_estimate)
-            if session.get('time_estimate') and session.get('time_estimate', {}).get('total'):
-                time_invested += session['time_estimate']['total']
-            
-            # Track repair types
-            item_type = session.get('item_type', 'Unknown')
-            repair_types[item_type] = repair_types.get(item_type, 0) + 1
-        
-        # Most common repairs (top 3)
-        most_common = sorted(repair_types.items(), key=lambda x: x[1], reverse=True)[:3]
-        most_common_repairs = [{"type": k, "count": v} for k, v in most_common]
-        
-        # Completion rate
-        completion_rate = (completed_repairs / total_repairs * 100) if total_repairs > 0 else 0
-        
-        # Recent streak (repairs in last 30 days)
-        from datetime import datetime, timedelta
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        recent_streak = sum(1 for s in sessions 
-                          if s.get('updated_at') and s['updated_at'] > thirty_days_ago)
-        
-        # Achievements
-        achievements = []
-        if total_repairs >= 1:
-            achievements.append({"title": "First Fix", "description": "Completed your first repair", "icon": "trophy"})
-        if total_repairs >= 5:
-            achievements.append({"title": "DIY Enthusiast", "description": "Completed 5 repairs", "icon": "star"})
-        if total_repairs >= 10:
-            achievements.append({"title": "Master Fixer", "description": "Completed 10 repairs", "icon": "medal"})
-        if money_saved >= 100:
-            achievements.append({"title": "Penny Saver", "description": "Saved over $100", "icon": "cash"})
-        if money_saved >= 500:
-            achievements.append({"title": "Budget Hero", "description": "Saved over $500", "icon": "trending-up"})
-        
-        return {
-            "total_repairs": total_repairs,
-            "completed_repairs": completed_repairs,
-            "money_saved": round(money_saved, 2),
-            "time_invested": round(time_invested, 0),  # in minutes
-            "completion_rate": round(completion_rate, 1),
-            "most_common_repairs": most_common_repairs,
-            "recent_streak": recent_streak,
-            "achievements": achievements,
-            "currency": "USD"
-        }
+        # Point read of the user's rollup, built from history on first access
+        rollup = await insights_rollup.get(user_id)
+        # The recent window moves daily even when the rollup does not
+        etag = version_etag("insights", user_id, rollup.get("updated_at"), rollup.get("version", 0),
+                            datetime.utcnow().date())
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return json_with_etag(request, serialize_json(insights_from_rollup(rollup)), etag)
         
     except Exception as e:
         logger.error(f"Error fetching insights: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.post("/community/post", response_model=CommunityPost)
-async def create_community_post(post: CommunityPost):
+async def create_community_post(post: CommunityPost, idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     """Create a community post to share repair success"""
     try:
-        post_dict = post.dict()
-        await db.community_posts.insert_one(post_dict)
-        return post
+        if not post.before_image:
+            raise HTTPException(status_code=400, detail="A before image is required")
         
+        async def insert_post():
+            try:
+                before_raw = decode_base64_image(post.before_image)
+                after_raw = decode_base64_image(post.after_image) if post.after_image else None
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Images must be base64 encoded")
+            
+            # Catch spam waves of slight variants before anything is stored. Every near-copy
+            # counts, the author's own included; resubmits are answered by the Idempotency-Key
+            fingerprint = await spam_detector.fingerprint(post.title, post.description, post.tips, before_raw)
+            duplicates = await spam_detector.find_duplicates(fingerprint)
+            if duplicates and SPAM_DUPLICATE_ACTION == "reject":
+                raise HTTPException(status_code=409, detail="This post looks like a duplicate of a recent post")
+            
+            # Posts keep only references; the bytes live in the image store
+            post.before_image_ref = await image_store.put(before_raw)
+            post.after_image_ref = await image_store.put(after_raw) if after_raw else None
+            post.before_image = post.after_image = None
+            
+            doc = {**post.dict(), "legacy_likes": 0, "score": hot_score(post.likes, post.timestamp),
+                   "updated_at": post.timestamp}
+            if duplicates:
+                # Flagged posts stay visible but enter the moderation queue as if reported once
+                doc.update({
+                    "duplicate_of": duplicates,
+                    "report_count": 1,
+                    "pending_reports": 1,
+                    "last_reported_at": post.timestamp,
+                    "score": hot_score(post.likes, post.timestamp, report_count=1),
+                })
+            await db.community_posts.insert_one(doc)
+            await spam_detector.record(post.id, fingerprint)
+            
+            if duplicates:
+                report = Report(
+                    post_id=post.id,
+                    reason="spam",
+                    details="Near-duplicate of " + ", ".join(d["post_id"] for d in duplicates),
+                    reporter_name="Duplicate detection"
+                )
+                await db.reports.insert_one({**report.dict(), "reporter_key": "system:duplicate"})
+                logger.info(f"Post {post.id} flagged as a near-duplicate of {len(duplicates)} post(s)")
+            return post
+        
+        # id and timestamp are generated server-side, so they differ between retries
+        return await run_idempotent(
+            idempotency_key,
+            "community-post",
+            post.dict(exclude={"id", "timestamp"}),
+            insert_post
+        )
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating post: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Inline base64 images predate the image store and are never sent in listings
+POST_LISTING_PROJECTION = {"before_image": 0, "after_image": 0}
+
+# Newest first, or by precomputed hot score; id breaks ties so a page
+# boundary never skips or repeats a post
+FEED_SORT = [("timestamp", -1), ("id", -1)]
+FEED_SORTS = {
+    "new": FEED_SORT,
+    "hot": [("score", -1), ("id", -1)],
+}
+FEED_MAX_PAGE_SIZE = 50
+
 @api_router.get("/community/posts")
-async def get_community_posts(limit: int = 50):
-    """Get community posts"""
+async def get_community_posts(request: Request, limit: int = Query(FEED_MAX_PAGE_SIZE, ge=1),
+                              cursor: Optional[str] = None, sort: str = "new"):
+    """Get community posts, newest first or with sort=hot by hot score.
+
+    Larger limits are clamped to FEED_MAX_PAGE_SIZE. When more posts remain,
+    pass the X-Next-Cursor response header back as cursor for the next page.
+    """
     try:
-        posts = await db.community_posts.find().sort("timestamp", -1).limit(limit).to_list(limit)
+        if sort not in FEED_SORTS:
+            raise HTTPException(status_code=400, detail="Invalid sort. Use: new or hot")
+        feed_sort = FEED_SORTS[sort]
+        limit = min(limit, FEED_MAX_PAGE_SIZE)
+        query = {"hidden": {"$ne": True}, **keyset_filter(feed_sort, cursor)}
+        posts = await db.community_posts.find(query, POST_LISTING_PROJECTION).sort(feed_sort).to_list(limit + 1)
+        posts, next_page = split_page(posts, feed_sort, limit)
+        like_buffer.merge_pending(posts)
         for post in posts:
             post['_id'] = str(post['_id'])
-        return posts
+        return conditional_json(request, posts, headers={"X-Next-Cursor": next_page} if next_page else None)
         
+    except HTTPException:
+        raise
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching posts: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/images/{digest}/{rendition}")
+async def get_image(digest: str, rendition: str, request: Request):
+    """Stream an image rendition (thumb, feed or full) from the image store"""
+    if rendition not in RENDITIONS:
+        raise HTTPException(status_code=404, detail="Unknown rendition")
+    # Content is addressed by digest, so the ETag never has to be computed from the bytes
+    etag = f'"{digest}-{rendition}"'
+    if etag_matches(request, etag):
+        return not_modified(etag, IMMUTABLE_CACHE_CONTROL)
+    try:
+        metadata, chunks = await image_store.open(digest, rendition)
+    except ImageNotFound:
+        raise HTTPException(status_code=404, detail="Image not found")
+    return StreamingResponse(
+        chunks,
+        media_type=metadata.get("content_type", "image/jpeg"),
+        headers={"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL},
+    )
+
 @api_router.post("/community/like/{post_id}")
-async def like_post(post_id: str):
-    """Like a community post"""
+async def like_post(post_id: str, user_id: str):
+    """Like a community post, once per user"""
     try:
-        result = await db.community_posts.update_one(
-            {"id": post_id},
-            {"$inc": {"likes": 1}}
-        )
-        if result.modified_count == 0:
+        post = await db.community_posts.find_one({"id": post_id}, {"likes": 1})
+        if not post:
             raise HTTPException(status_code=404, detail="Post not found")
-        return {"message": "Post liked"}
         
+        # The counter and hot score are updated when the like buffer flushes
+        liked = await like_buffer.like(post_id, user_id)
+        return {
+            "message": "Post liked" if liked else "Post already liked",
+            "liked": liked,
+            "likes": post.get("likes", 0) + like_buffer.pending(post_id),
+        }
+        
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error liking post: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 # PR #6: Community Moderation Endpoints
+def reporter_key(report: ReportRequest) -> Optional[str]:
+    """Who filed a report, for dedupe; anonymous reports cannot be told apart"""
+    if report.reporter_id:
+        return f"user:{report.reporter_id}"
+    if report.reporter_name and report.reporter_name != "Anonymous":
+        return f"name:{report.reporter_name}"
+    return None
+
+def count_report_update(now: datetime) -> List[Dict[str, Any]]:
+    """Pipeline update recording one more report on a post, hiding it at the threshold"""
+    pending = {"$add": [{"$ifNull": ["$pending_reports", 0]}, 1]}
+    return [
+        {"$set": {
+            "report_count": {"$add": [{"$ifNull": ["$report_count", 0]}, 1]},
+            "pending_reports": pending,
+            "last_reported_at": now,
+            "hidden": {"$or": [{"$eq": ["$hidden", True]}, {"$gte": [pending, REPORT_AUTO_HIDE_THRESHOLD]}]},
+            "updated_at": now,
+        }},
+        # Reports also weigh on the hot score
+        SET_HOT_SCORE,
+    ]
+
 @api_router.post("/community/report", response_model=Report)
 async def report_post(report: ReportRequest):
     """Report a community post"""
     try:
-        # Check if post exists
-        post = await db.community_posts.find_one({"id": report.post_id})
-        if not post:
-            raise HTTPException(status_code=404, detail="Post not found")
-        
         # Create report
         report_obj = Report(
             post_id=report.post_id,
             reason=report.reason,
             details=report.details,
-            reporter_name=report.reporter_name or "Anonymous"
+            reporter_name=report.reporter_name or "Anonymous",
+            reporter_id=report.reporter_id
         )
+        key = reporter_key(report)
+        
+        # The partial unique index on (post_id, reporter_key) drops repeat reports
+        try:
+            await db.reports.insert_one({**report_obj.dict(), "reporter_key": key})
+        except DuplicateKeyError:
+            existing = await db.reports.find_one({"post_id": report.post_id, "reporter_key": key})
+            return Report(**existing)
+        
+        # Count the report on the post in the same write that checks it exists
+        post = await db.community_posts.find_one_and_update(
+            {"id": report.post_id},
+            count_report_update(report_obj.timestamp),
+            projection={"hidden": 1, "pending_reports": 1},
+            return_document=ReturnDocument.AFTER
+        )
+        if not post:
+            await db.reports.delete_one({"id": report_obj.id})
+            raise HTTPException(status_code=404, detail="Post not found")
         
-        await db.reports.insert_one(report_obj.dict())
         logger.info(f"Post {report.post_id} reported for: {report.reason}")
+        if post.get("hidden") and post.get("pending_reports") == REPORT_AUTO_HIDE_THRESHOLD:
+            logger.warning(f"Post {report.post_id} auto-hidden after {REPORT_AUTO_HIDE_THRESHOLD} reports")
+            await record_tombstones(db.tombstones, "community_post", [report.post_id])
         
         return report_obj
         
@@ -973,42 +1367,86 @@ async def get_reports(status: Optional[str] = "pending"):
         logger.error(f"Error fetching reports: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Most reported first, then most recently reported
+MODERATION_QUEUE_SORT = [("pending_reports", -1), ("last_reported_at", -1), ("id", -1)]
+MODERATION_QUEUE_PROJECTION = {
+    "_id": 0, "id": 1, "title": 1, "description": 1, "item_type": 1, "user_name": 1, "timestamp": 1,
+    "before_image_ref": 1, "report_count": 1, "pending_reports": 1, "last_reported_at": 1, "hidden": 1,
+}
+
+@api_router.get("/community/moderation-queue")
+async def get_moderation_queue(request: Request, limit: int = Query(25, ge=1, le=MAX_PAGE_SIZE),
+                               cursor: Optional[str] = None):
+    """Posts with unreviewed reports, most reported first (admin endpoint).
+
+    Served from the partial moderation_queue index; each post carries its
+    pending report count broken down by reason. Pass X-Next-Cursor back
+    as cursor for the next page.
+    """
+    try:
+        query = {"pending_reports": {"$gt": 0}, **keyset_filter(MODERATION_QUEUE_SORT, cursor)}
+        posts = await db.community_posts.find(query, MODERATION_QUEUE_PROJECTION) \
+            .sort(MODERATION_QUEUE_SORT).to_list(limit + 1)
+        posts, next_page = split_page(posts, MODERATION_QUEUE_SORT, limit)
+
+        reasons = await db.reports.aggregate([
+            {"$match": {"post_id": {"$in": [p["id"] for p in posts]}, "status": "pending"}},
+            {"$group": {"_id": {"post_id": "$post_id", "reason": "$reason"}, "count": {"$sum": 1}}},
+        ]).to_list(None)
+        by_post: Dict[str, Dict[str, int]] = {}
+        for r in reasons:
+            by_post.setdefault(r["_id"]["post_id"], {})[r["_id"]["reason"]] = r["count"]
+        for post in posts:
+            post["report_reasons"] = by_post.get(post["id"], {})
+
+        return conditional_json(request, {"queue": posts},
+                                headers={"X-Next-Cursor": next_page} if next_page else None)
+        
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching moderation queue: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+MODERATION_ACTIONS = ("delete", "approve", "ignore")
+MAX_BULK_MODERATION = 500
+
+def moderation_operations(post_id: str, action: str):
+    """The write on the post and the write on its reports that carry out one moderation action"""
+    now = datetime.utcnow()
+    if action == "delete":
+        return DeleteOne({"id": post_id}), UpdateMany({"post_id": post_id}, {"$set": {"status": "resolved"}})
+    if action == "approve":
+        # Keep the post, visible again if it was auto-hidden, and drop the report penalty from its score
+        return (UpdateOne({"id": post_id}, [{"$set": {"report_count": 0, "pending_reports": 0, "hidden": False,
+                                                      "updated_at": now}}, SET_HOT_SCORE]),
+                UpdateMany({"post_id": post_id}, {"$set": {"status": "reviewed"}}))
+    if action == "ignore":
+        # No action on the post beyond clearing its queue entry
+        return (UpdateOne({"id": post_id}, {"$set": {"pending_reports": 0, "updated_at": now}}),
+                UpdateMany({"post_id": post_id}, {"$set": {"status": "reviewed"}}))
+    raise ValueError(action)
+
 @api_router.put("/community/moderate/{post_id}")
 async def moderate_post(post_id: str, moderation: ModeratePostRequest):
     """Moderate a reported post (admin endpoint)"""
     try:
+        if moderation.action not in MODERATION_ACTIONS:
+            raise HTTPException(status_code=400, detail="Invalid action. Use: delete, approve, or ignore")
+        post_op, reports_op = moderation_operations(post_id, moderation.action)
+        
+        result = await db.community_posts.bulk_write([post_op])
         if moderation.action == "delete":
-            # Delete the post
-            result = await db.community_posts.delete_one({"id": post_id})
             if result.deleted_count == 0:
                 raise HTTPException(status_code=404, detail="Post not found")
-            
-            # Update all reports for this post
-            await db.reports.update_many(
-                {"post_id": post_id},
-                {"$set": {"status": "resolved"}}
-            )
-            
-            return {"message": "Post deleted successfully"}
-            
-        elif moderation.action == "approve":
-            # Mark reports as reviewed but keep post
-            await db.reports.update_many(
-                {"post_id": post_id},
-                {"$set": {"status": "reviewed"}}
-            )
-            return {"message": "Post approved, reports marked as reviewed"}
-            
-        elif moderation.action == "ignore":
-            # Just mark as reviewed, no action on post
-            await db.reports.update_many(
-                {"post_id": post_id},
-                {"$set": {"status": "reviewed"}}
-            )
-            return {"message": "Reports ignored"}
-            
-        else:
-            raise HTTPException(status_code=400, detail="Invalid action. Use: delete, approve, or ignore")
+            await record_tombstones(db.tombstones, "community_post", [post_id])
+        await db.reports.bulk_write([reports_op])
+        
+        return {
+            "delete": {"message": "Post deleted successfully"},
+            "approve": {"message": "Post approved, reports marked as reviewed"},
+            "ignore": {"message": "Reports ignored"},
+        }[moderation.action]
         
     except HTTPException:
         raise
@@ -1016,280 +1454,153 @@ async def moderate_post(post_id: str, moderation: ModeratePostRequest):
         logger.error(f"Error moderating post: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.get("/community/guidelines")
-async def get_community_guidelines():
-    """Get community guidelines"""
-    guidelines = {
-        "title": "Community Guidelines",
-        "introduction": "FixIntel AI is a community of repair enthusiasts helping each other. Please follow these guidelines to keep our community safe, helpful, and respectful.",
-        "rules": [
-            {
-                "title": "Be Respectful",
-                "description": "Treat all community members with respect. No harassment, hate speech, or personal attacks."
-            },
-            {
-                "title": "Share Real Repairs",
-                "description": "Only post genuine repair experiences with actual before/after photos. No fake or misleading content."
-            },
-            {
-                "title": "Safety First",
-                "description": "Never post dangerous repair methods. If a repair involves electrical, gas, or structural work, recommend professional help."
-            },
-            {
-                "title": "No Spam",
-                "description": "Don't post advertisements, promotional content, or repetitive posts. Share to help, not to sell."
-            },
-            {
-                "title": "Appropriate Content",
-                "description": "Keep all content family-friendly. No inappropriate, offensive, or NSFW material."
-            },
-            {
-                "title": "Give Credit",
-                "description": "If you used someone else's repair guide or technique, give them credit."
-            }
-        ],
-        "reporting": {
-            "title": "Report Violations",
-            "description": "If you see content that violates these guidelines, please report it. We review all reports and take appropriate action.",
-            "reasons": [
-                "Inappropriate content",
-                "Spam or advertisements",
-                "Dangerous repair advice",
-                "Misleading information",
-                "Other violations"
-            ]
-        },
-        "consequences": {
-            "title": "Consequences",
-            "description": "Violations may result in content removal. Repeated violations may lead to account restrictions."
-        }
-    }
-    return guidelines
-
-# Gamification Endpoints
-from gamification import (
-    calculate_level, check_new_badges, calculate_streak,
-    calculate_xp_reward, XP_REWARDS, BADGES
-)
+@api_router.post("/community/moderate/bulk")
+async def moderate_posts_bulk(request: BulkModerationRequest):
+    """Apply moderation actions to many posts in one call (admin endpoint).
 
-@api_router.get("/gamification/profile")
-async def get_gamification_profile(user_id: str = "default_user"):
-    """Get user's gamification profile"""
+    Actions are applied in the order given, as one ordered bulk write on
+    posts followed by one on reports. Each item gets its own result: ok,
+    invalid_action, duplicate (the post already appears earlier in the
+    request), not_found, or failed when the bulk write stopped at or before it.
+    """
     try:
-        profile = await db.gamification_profiles.find_one({"user_id": user_id})
-        
-        if not profile:
-            # Create new profile
-            profile = {
-                "user_id": user_id,
-                "total_xp": 0,
-                "level": 1,
-                "current_streak": 0,
-                "longest_streak": 0,
-                "last_activity_date": None,
-                "badges_earned": [],
-                "stats": {},
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
-            await db.gamification_profiles.insert_one(profile)
-        
-        # Calculate level info
-        level_info = calculate_level(profile["total_xp"])
-        
-        # Get all available badges
-        all_badges = [
-            {
-                "id": badge_id,
-                "name": badge["name"],
-                "description": badge["description"],
-                "icon": badge["icon"],
-                "earned": badge_id in profile["badges_earned"]
-            }
-            for badge_id, badge in BADGES.items()
-        ]
+        if len(request.actions) > MAX_BULK_MODERATION:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_MODERATION} actions per request")
+        
+        post_ids = list({item.post_id for item in request.actions})
+        existing = {p["id"] async for p in db.community_posts.find({"id": {"$in": post_ids}}, {"id": 1})}
+        
+        results = [{"post_id": item.post_id, "action": item.action} for item in request.actions]
+        runnable = []  # (result index, post op, reports op)
+        seen = set()
+        for index, item in enumerate(request.actions):
+            if item.action not in MODERATION_ACTIONS:
+                results[index]["status"] = "invalid_action"
+            elif item.post_id in seen:
+                results[index]["status"] = "duplicate"
+            elif item.post_id not in existing:
+                results[index]["status"] = "not_found"
+            else:
+                seen.add(item.post_id)
+                runnable.append((index, *moderation_operations(item.post_id, item.action)))
         
-        return {
-            **profile,
-            "_id": str(profile["_id"]),
-            "level_info": level_info,
-            "all_badges": all_badges
-        }
+        applied = runnable
+        if runnable:
+            try:
+                result = await db.community_posts.bulk_write([op for _, op, _ in runnable], ordered=True)
+                if result.matched_count + result.deleted_count < len(runnable):
+                    logger.warning("Bulk moderation: some posts were deleted while the request was applied")
+            except BulkWriteError as e:
+                # Ordered: everything before the first error was applied, nothing after it
+                first_error = e.details["writeErrors"][0]["index"]
+                applied = runnable[:first_error]
+                for index, _, _ in runnable[first_error:]:
+                    results[index]["status"] = "failed"
+                logger.error(f"Bulk moderation stopped at item {runnable[first_error][0]}: {str(e)}")
+        
+        if applied:
+            await db.reports.bulk_write([op for _, _, op in applied], ordered=True)
+            deleted = [request.actions[index].post_id for index, _, _ in applied
+                       if request.actions[index].action == "delete"]
+            await record_tombstones(db.tombstones, "community_post", deleted)
+            for index, _, _ in applied:
+                results[index]["status"] = "ok"
+        
+        return {"results": results, "applied": len(applied)}
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error fetching gamification profile: {str(e)}")
+        logger.error(f"Error bulk moderating posts: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.post("/gamification/complete-step")
-async def complete_step(request: CompleteStepRequest, user_id: str = "default_user"):
-    """Award XP for completing a repair step"""
-    try:
-        profile = await db.gamification_profiles.find_one({"user_id": user_id})
-        
-        if not profile:
-            profile = {
-                "user_id": user_id,
-                "total_xp": 0,
-                "level": 1,
-                "current_streak": 0,
-                "longest_streak": 0,
-                "last_activity_date": None,
-                "badges_earned": [],
-                "stats": {"steps_completed": 0},
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
-            await db.gamification_profiles.insert_one(profile)
-        
-        # Calculate XP reward
-        xp_reward = calculate_xp_reward("complete_step")
-        new_total_xp = profile["total_xp"] + xp_reward["total_xp"]
-        old_level = calculate_level(profile["total_xp"])["level"]
-        new_level = calculate_level(new_total_xp)["level"]
-        leveled_up = new_level > old_level
-        
-        # Update streak
-        new_streak = calculate_streak(
-            profile.get("last_activity_date"),
-            profile.get("current_streak", 0)
-        )
-        longest_streak = max(new_streak, profile.get("longest_streak", 0))
-        
-        # Update stats
-        stats = profile.get("stats", {})
-        stats["steps_completed"] = stats.get("steps_completed", 0) + 1
-        
-        # Check for new badges
-        new_badges = check_new_badges(stats, profile.get("badges_earned", []))
-        
-        # Update profile
-        await db.gamification_profiles.update_one(
-            {"user_id": user_id},
-            {"$set": {
-                "total_xp": new_total_xp,
-                "current_streak": new_streak,
-                "longest_streak": longest_streak,
-                "last_activity_date": datetime.utcnow(),
-                "badges_earned": profile.get("badges_earned", []) + [b["id"] for b in new_badges],
-                "stats": stats,
-                "updated_at": datetime.utcnow()
-            }}
-        )
-        
-        level_info = calculate_level(new_total_xp)
-        
-        return {
-            "xp_awarded": xp_reward["total_xp"],
-            "bonus_xp": xp_reward["bonus_xp"],
-            "bonus_reasons": xp_reward["bonus_reasons"],
-            "new_total_xp": new_total_xp,
-            "leveled_up": leveled_up,
-            "new_level": new_level,
-            "level_info": level_info,
-            "new_badges": new_badges,
-            "current_streak": new_streak
+COMMUNITY_GUIDELINES = {
+    "title": "Community Guidelines",
+    "introduction": "FixIntel AI is a community of repair enthusiasts helping each other. Please follow these guidelines to keep our community safe, helpful, and respectful.",
+    "rules": [
+        {
+            "title": "Be Respectful",
+            "description": "Treat all community members with respect. No harassment, hate speech, or personal attacks."
+        },
+        {
+            "title": "Share Real Repairs",
+            "description": "Only post genuine repair experiences with actual before/after photos. No fake or misleading content."
+        },
+        {
+            "title": "Safety First",
+            "description": "Never post dangerous repair methods. If a repair involves electrical, gas, or structural work, recommend professional help."
+        },
+        {
+            "title": "No Spam",
+            "description": "Don't post advertisements, promotional content, or repetitive posts. Share to help, not to sell."
+        },
+        {
+            "title": "Appropriate Content",
+            "description": "Keep all content family-friendly. No inappropriate, offensive, or NSFW material."
+        },
+        {
+            "title": "Give Credit",
+            "description": "If you used someone else's repair guide or technique, give them credit."
         }
-        
-    except Exception as e:
-        logger.error(f"Error completing step: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+    ],
+    "reporting": {
+        "title": "Report Violations",
+        "description": "If you see content that violates these guidelines, please report it. We review all reports and take appropriate action.",
+        "reasons": [
+            "Inappropriate content",
+            "Spam or advertisements",
+            "Dangerous repair advice",
+            "Misleading information",
+            "Other violations"
+        ]
+    },
+    "consequences": {
+        "title": "Consequences",
+        "description": "Violations may result in content removal. Repeated violations may lead to account restrictions."
+    }
+}
 
-@api_router.post("/gamification/complete-repair")
-async def complete_repair(request: CompleteRepairRequest, user_id: str = "default_user"):
-    """Award XP for completing an entire repair"""
+# Static for the life of the process: serialized and hashed once at import
+community_guidelines_response = StaticJSON(COMMUNITY_GUIDELINES)
+
+@api_router.get("/community/guidelines")
+async def get_community_guidelines(request: Request):
+    """Get community guidelines"""
+    return community_guidelines_response.respond(request)
+
+@api_router.get("/search")
+async def search(q: str, scope: str = "all", limit: int = Query(20, ge=1, le=MAX_SEARCH_LIMIT),
+                 offset: int = Query(0, ge=0)):
+    """Full-text search over community posts and stored repair analyses.
+
+    Results are ordered by relevance and carry highlight snippets for the
+    matched fields. scope is all, posts or repairs; limit and offset page
+    through each scope independently.
+    """
     try:
-        profile = await db.gamification_profiles.find_one({"user_id": user_id})
-        
-        if not profile:
-            profile = {
-                "user_id": user_id,
-                "total_xp": 0,
-                "level": 1,
-                "current_streak": 0,
-                "longest_streak": 0,
-                "last_activity_date": None,
-                "badges_earned": [],
-                "stats": {},
-                "created_at": datetime.utcnow(),
-                "updated_at": datetime.utcnow()
-            }
-            await db.gamification_profiles.insert_one(profile)
-        
-        # Determine XP based on difficulty
-        action = f"complete_{request.difficulty}_repair"
-        
-        # Check if this is first repair
-        stats = profile.get("stats", {})
-        is_first = stats.get("completed_repairs", 0) == 0
-        
-        # Calculate XP with bonuses
-        details = {
-            "time_taken_minutes": request.time_taken_minutes,
-            "is_first_repair": is_first,
-            "completion_percentage": 100
-        }
-        xp_reward = calculate_xp_reward(action, details)
-        
-        new_total_xp = profile["total_xp"] + xp_reward["total_xp"]
-        old_level = calculate_level(profile["total_xp"])["level"]
-        new_level = calculate_level(new_total_xp)["level"]
-        leveled_up = new_level > old_level
-        
-        # Update streak
-        new_streak = calculate_streak(
-            profile.get("last_activity_date"),
-            profile.get("current_streak", 0)
-        )
-        longest_streak = max(new_streak, profile.get("longest_streak", 0))
-        
-        # Update stats
-        stats["completed_repairs"] = stats.get("completed_repairs", 0) + 1
-        stats["total_repairs"] = stats.get("total_repairs", 0) + 1
-        stats[f"{request.difficulty}_repairs_completed"] = stats.get(f"{request.difficulty}_repairs_completed", 0) + 1
-        stats["fastest_repair_minutes"] = min(request.time_taken_minutes, stats.get("fastest_repair_minutes", 999))
-        
-        # Track time of day
-        current_hour = datetime.utcnow().hour
-        if current_hour >= 22 or current_hour < 6:
-            stats["late_night_repairs"] = stats.get("late_night_repairs", 0) + 1
-        if current_hour < 8:
-            stats["early_morning_repairs"] = stats.get("early_morning_repairs", 0) + 1
-        
-        # Check for new badges
-        new_badges = check_new_badges(stats, profile.get("badges_earned", []))
-        
-        # Update profile
-        await db.gamification_profiles.update_one(
-            {"user_id": user_id},
-            {"$set": {
-                "total_xp": new_total_xp,
-                "current_streak": new_streak,
-                "longest_streak": longest_streak,
-                "last_activity_date": datetime.utcnow(),
-                "badges_earned": profile.get("badges_earned", []) + [b["id"] for b in new_badges],
-                "stats": stats,
-                "updated_at": datetime.utcnow()
-            }}
-        )
-        
-        level_info = calculate_level(new_total_xp)
-        
-        return {
-            "xp_awarded": xp_reward["total_xp"],
-            "base_xp": xp_reward["base_xp"],
-            "bonus_xp": xp_reward["bonus_xp"],
-            "bonus_reasons": xp_reward["bonus_reasons"],
-            "new_total_xp": new_total_xp,
-            "leveled_up": leveled_up,
-            "new_level": new_level,
-            "level_info": level_info,
-            "new_badges": new_badges,
-            "current_streak": new_streak,
-            "message": f"Amazing! You earned {xp_reward['total_xp']} XP!"
-        }
+        if not q.strip():
+            raise HTTPException(status_code=400, detail="Query must not be empty")
+        scopes = SEARCH_SCOPES if scope == "all" else (scope,)
+        if any(s not in SEARCH_SCOPES for s in scopes):
+            raise HTTPException(status_code=400, detail="Invalid scope. Use: all, posts or repairs")
+
+        results = {"query": q}
+        if "posts" in scopes:
+            results["posts"], results["posts_has_more"] = await text_search(
+                db.community_posts, q, POST_TEXT_WEIGHTS, POST_RESULT_FIELDS, limit, offset,
+                filters={"hidden": {"$ne": True}}
+            )
+            like_buffer.merge_pending(results["posts"])
+        if "repairs" in scopes:
+            results["repairs"], results["repairs_has_more"] = await text_search(
+                db.repairs, q, REPAIR_TEXT_WEIGHTS, REPAIR_RESULT_FIELDS, limit, offset
+            )
+        return results
         
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"Error completing repair: {str(e)}")
+        logger.error(f"Error searching: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.post("/feedback")
@@ -1417,18 +1728,41 @@ async def find_local_vendors(search: LocalVendorSearch):
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.post("/get-step-details")
-async def get_step_details(request: Dict[str, Any]):
+async def get_step_details(request: Dict[str, Any], http_request: Request):
     """Get comprehensive step-by-step details with visual diagram and tutorial videos"""
+    set_usage_user(request.get('user_id'))
     try:
-        step_number = request.get('step_number', 1)
-        step_text = request.get('step_text', '')
-        item_type = request.get('item_type', 'Unknown')
-        repair_type = request.get('repair_type', '')
+        key = cache_key(
+            request.get('step_number', 1),
+            request.get('step_text', ''),
+            request.get('item_type', 'Unknown'),
+            request.get('repair_type', '')
+        )
+        cached = step_details_cache.get(key)
+        if cached is not None:
+            return cached
         
-        # Use Gemini to generate ultra-detailed instructions
-        system_message = "You are an expert repair instructor who provides extremely detailed, beginner-friendly instructions."
+        # Step details are cacheable, so a disconnect lets the work finish into the cache
+        return await run_until_disconnect(http_request, build_step_details(request, key), detach=True)
         
-        prompt = f"""Break down this repair step into SIMPLIFIED SUB-STEPS for a complete beginner:
+    except ClientDisconnected:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching step details: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def build_step_details(request: Dict[str, Any], key: str) -> Dict[str, Any]:
+    """Generate detailed instructions, videos and a diagram for a step and cache the result"""
+    step_number = request.get('step_number', 1)
+    step_text = request.get('step_text', '')
+    item_type = request.get('item_type', 'Unknown')
+    repair_type = request.get('repair_type', '')
+    degraded = degradation.flags()
+    
+    # Use Gemini to generate ultra-detailed instructions
+    system_message = "You are an expert repair instructor who provides extremely detailed, beginner-friendly instructions."
+    
+    prompt = f"""Break down this repair step into SIMPLIFIED SUB-STEPS for a complete beginner:
 
 Item: {item_type}
 Repair: {repair_type}
@@ -1472,16 +1806,42 @@ Format your response EXACTLY like this:
 - Problem: [issue] → Solution: [fix]
 
 Make every instruction crystal clear - assume the person has never done any repair work before."""
+    
+    response = await call_gemini(prompt, system_message)
+    detailed_instructions = response.strip()
+    
+    # Search for relevant tutorial videos for this specific step (only cached ones when degraded)
+    videos_key = cache_key("step-videos", step_text, item_type)
+    step_videos = videos_cache.get(videos_key)
+    if step_videos is None and not degraded["videos"]:
+        step_videos = await find_step_videos(step_text, item_type)
+        if step_videos:
+            videos_cache.set(videos_key, step_videos)
+    
+    # Generate a helpful diagram/illustration
+    image_base64 = None
+    if not degraded["diagrams"]:
+        image_base64 = await generate_step_diagram(step_text, item_type)
+    
+    result = {
+        "detailed_instructions": detailed_instructions,
+        "diagram_image": image_base64,
+        "step_number": step_number,
+        "tutorial_videos": step_videos or [],
+        "degraded": degraded
+    }
+    # Degraded responses are missing enrichments, so keep them out of the cache
+    if not any(degraded.values()):
+        step_details_cache.set(key, result)
+    return result
+
+async def find_step_videos(step_text: str, item_type: str) -> List[Dict[str, Any]]:
+    """Ask Gemini for YouTube tutorials covering a single repair step"""
+    step_videos = []
+    try:
+        video_system = "You are an expert at finding specific YouTube repair tutorials."
         
-        response = await call_gemini(prompt, system_message)
-        detailed_instructions = response.strip()
-        
-        # Search for relevant tutorial videos for this specific step
-        step_videos = []
-        try:
-            video_system = "You are an expert at finding specific YouTube repair tutorials."
-            
-            video_prompt = f"""Find 2-3 REAL YouTube videos that specifically show how to: {step_text}
+        video_prompt = f"""Find 2-3 REAL YouTube videos that specifically show how to: {step_text}
 For item: {item_type}
 
 Look for videos from popular repair channels like:
@@ -1504,80 +1864,75 @@ Format as JSON array:
 
 IMPORTANT: Only include videos you are confident exist on YouTube."""
 
-            video_response = await call_gemini(video_prompt, video_system)
-            
-            # Parse video response
-            video_text = video_response.strip()
-            if video_text.startswith('```'):
-                video_text = video_text.split('```')[1]
-                if video_text.startswith('json'):
-                    video_text = video_text[4:]
-            video_text = video_text.strip()
-            
-            import json
-            ai_videos = json.loads(video_text)
-            
-            for v in ai_videos:
-                video_id = v.get('video_id', '')
-                if video_id and len(video_id) == 11:
-                    step_videos.append({
-                        'title': v.get('title', 'Tutorial Video'),
-                        'video_id': video_id,
-                        'url': f"https://www.youtube.com/watch?v={video_id}",
-                        'embed_url': f"https://www.youtube.com/embed/{video_id}",
-                        'thumbnail': f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg",
-                        'channel': v.get('channel', 'YouTube'),
-                        'relevance': v.get('relevance', '')
-                    })
-                    
-        except Exception as video_error:
-            logger.warning(f"Failed to fetch step videos: {str(video_error)}")
+        video_response = await call_gemini(video_prompt, video_system)
         
-        # Generate a helpful diagram/illustration
-        try:
-            from emergentintegrations.llm.openai.image_generation import OpenAIImageGeneration
-            import base64
-            
-            image_gen = OpenAIImageGeneration(api_key=OPENAI_API_KEY)
-            
-            # Create a clear, instructional diagram
-            image_prompt = f"""Create a clear, simple instructional diagram showing: {step_text} for {item_type} repair.
+        # Parse video response
+        video_text = video_response.strip()
+        if video_text.startswith('```'):
+            video_text = video_text.split('```')[1]
+            if video_text.startswith('json'):
+                video_text = video_text[4:]
+        video_text = video_text.strip()
+        
+        import json
+        ai_videos = json.loads(video_text)
+        
+        for v in ai_videos:
+            video_id = v.get('video_id', '')
+            if video_id and len(video_id) == 11:
+                step_videos.append({
+                    'title': v.get('title', 'Tutorial Video'),
+                    'video_id': video_id,
+                    'url': f"https://www.youtube.com/watch?v={video_id}",
+                    'embed_url': f"https://www.youtube.com/embed/{video_id}",
+                    'thumbnail': f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg",
+                    'channel': v.get('channel', 'YouTube'),
+                    'relevance': v.get('relevance', '')
+                })
+                
+    except Exception as video_error:
+        logger.warning(f"Failed to fetch step videos: {str(video_error)}")
+    
+    return step_videos
+
+async def generate_step_diagram(step_text: str, item_type: str) -> Optional[str]:
+    """Generate an instructional diagram for a single repair step"""
+    image_base64 = None
+    try:
+        from emergentintegrations.llm.openai.image_generation import OpenAIImageGeneration
+        import base64
+        
+        image_gen = OpenAIImageGeneration(api_key=OPENAI_API_KEY)
+        
+        # Create a clear, instructional diagram
+        image_prompt = f"""Create a clear, simple instructional diagram showing: {step_text} for {item_type} repair.
 Style: Technical illustration, clean lines, labeled parts, step-by-step visual guide, educational poster style.
 Include: Clear labels, arrows showing direction/sequence, important details highlighted."""
-            
+        
+        started = time.perf_counter()
+        try:
             images = await image_gen.generate_images(
                 prompt=image_prompt,
-                model="gpt-image-1",
+                model=IMAGE_MODEL,
                 number_of_images=1
             )
-            
-            image_base64 = None
-            if images and len(images) > 0:
-                image_base64 = base64.b64encode(images[0]).decode('utf-8')
-            
-            return {
-                "detailed_instructions": detailed_instructions,
-                "diagram_image": image_base64,
-                "step_number": step_number,
-                "tutorial_videos": step_videos
-            }
-        except Exception as img_error:
-            logger.warning(f"Failed to generate diagram: {str(img_error)}")
-            # Return instructions without image if generation fails
-            return {
-                "detailed_instructions": detailed_instructions,
-                "diagram_image": None,
-                "step_number": step_number,
-                "tutorial_videos": step_videos
-            }
+        except Exception:
+            record_image_usage(0, started, error=True)
+            raise
+        record_image_usage(len(images or []), started)
         
-    except Exception as e:
-        logger.error(f"Error fetching step details: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        if images and len(images) > 0:
+            image_base64 = base64.b64encode(images[0]).decode('utf-8')
+    except Exception as img_error:
+        # Return instructions without image if generation fails
+        logger.warning(f"Failed to generate diagram: {str(img_error)}")
+    
+    return image_base64
 
 @api_router.post("/get-tutorial-videos")
 async def get_tutorial_videos(request: Dict[str, Any]):
     """Search YouTube for real repair tutorial videos"""
+    set_usage_user(request.get('user_id'))
     try:
         import requests
         
@@ -1592,6 +1947,12 @@ async def get_tutorial_videos(request: Dict[str, Any]):
         if model_number:
             search_query = f"{model_number} {item_type} repair"
         
+        # Under load only previously found videos are served
+        videos_key = cache_key("tutorial-videos", search_query)
+        cached_videos = videos_cache.get(videos_key)
+        if cached_videos is not None or degradation.cached_videos_only:
+            return {"videos": cached_videos or [], "degraded": degradation.flags()}
+        
         # Get YouTube API key (use Google Maps API key which often has YouTube access)
         youtube_api_key = os.getenv('GOOGLE_MAPS_API_KEY')
         
@@ -1632,7 +1993,8 @@ async def get_tutorial_videos(request: Dict[str, Any]):
                     
                     if videos:
                         logger.info(f"Found {len(videos)} YouTube videos for: {search_query}")
-                        return {"videos": videos}
+                        videos_cache.set(videos_key, videos)
+                        return {"videos": videos, "degraded": degradation.flags()}
                 else:
                     logger.warning(f"YouTube API returned status {response.status_code}")
                     
@@ -1701,15 +2063,18 @@ IMPORTANT: Only include videos you are confident actually exist on YouTube."""
                     'duration': v.get('duration', '')
                 })
         
-        return {"videos": videos}
+        if videos:
+            videos_cache.set(videos_key, videos)
+        return {"videos": videos, "degraded": degradation.flags()}
         
     except Exception as e:
         logger.error(f"Error fetching tutorial videos: {str(e)}")
-        return {"videos": []}  # Return empty array instead of failing
+        return {"videos": [], "degraded": degradation.flags()}  # Return empty array instead of failing
 
 @api_router.post("/search-parts")
 async def search_parts(request: Dict[str, Any]):
     """Search for real parts with actual purchase links using web search"""
+    set_usage_user(request.get('user_id'))
     try:
         import requests
         
@@ -1734,6 +2099,11 @@ async def search_parts(request: Dict[str, Any]):
                 search_query = f"{part_name} {model_number} {item_type}"
             search_query += " buy price"
             
+            # Under heavy load skip the model call and link straight to store searches
+            if degradation.fallback_parts_search:
+                enhanced_parts.append(fallback_part_listing(part, part_name, item_type))
+                continue
+            
             # Use Gemini to search and find real product links
             system_message = "You are a helpful assistant that finds real product listings for repair parts."
             
@@ -1784,370 +2154,386 @@ IMPORTANT:
                 enhanced_parts.append(part_info)
             except json.JSONDecodeError:
                 # If JSON parsing fails, create a basic entry
-                enhanced_parts.append({
-                    "part_name": part_name,
-                    "search_term": f"{part_name} {item_type}",
-                    "estimated_price_range": part.get('price', 'Varies') if isinstance(part, dict) else 'Varies',
-                    "where_to_buy": [
-                        {
-                            "store": "Amazon",
-                            "search_url": f"https://www.amazon.com/s?k={part_name.replace(' ', '+')}+{item_type.replace(' ', '+')}",
-                            "notes": "Wide selection, check reviews"
-                        },
-                        {
-                            "store": "eBay",
-                            "search_url": f"https://www.ebay.com/sch/i.html?_nkw={part_name.replace(' ', '+')}+{item_type.replace(' ', '+')}",
-                            "notes": "Good for used/refurbished parts"
-                        }
-                    ],
-                    "tips": "Compare prices across multiple stores",
-                    "alternative_names": []
-                })
+                enhanced_parts.append(fallback_part_listing(part, part_name, item_type))
         
-        return {"parts": enhanced_parts}
+        return {"parts": enhanced_parts, "degraded": degradation.flags()}
         
     except Exception as e:
         logger.error(f"Error searching for parts: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
-# ============ GAMIFICATION SYSTEM ============
+def fallback_part_listing(part: Any, part_name: str, item_type: str) -> Dict[str, Any]:
+    """Basic store search links for a part when no model-generated listing is available"""
+    return {
+        "part_name": part_name,
+        "search_term": f"{part_name} {item_type}",
+        "estimated_price_range": part.get('price', 'Varies') if isinstance(part, dict) else 'Varies',
+        "where_to_buy": [
+            {
+                "store": "Amazon",
+                "search_url": f"https://www.amazon.com/s?k={part_name.replace(' ', '+')}+{item_type.replace(' ', '+')}",
+                "notes": "Wide selection, check reviews"
+            },
+            {
+                "store": "eBay",
+                "search_url": f"https://www.ebay.com/sch/i.html?_nkw={part_name.replace(' ', '+')}+{item_type.replace(' ', '+')}",
+                "notes": "Good for used/refurbished parts"
+            }
+        ],
+        "tips": "Compare prices across multiple stores",
+        "alternative_names": []
+    }
 
-# Rank definitions
-RANKS = [
-    {"name": "Novice Fixer", "min_xp": 0, "badge": "🔰", "color": "#9CA3AF"},
-    {"name": "Apprentice", "min_xp": 100, "badge": "🔧", "color": "#60A5FA"},
-    {"name": "Handyman", "min_xp": 300, "badge": "🛠️", "color": "#34D399"},
-    {"name": "Skilled Repairer", "min_xp": 600, "badge": "⚙️", "color": "#FBBF24"},
-    {"name": "Expert Technician", "min_xp": 1000, "badge": "🏆", "color": "#F97316"},
-    {"name": "Master Craftsman", "min_xp": 2000, "badge": "👑", "color": "#A855F7"},
-    {"name": "Repair Legend", "min_xp": 5000, "badge": "⭐", "color": "#EF4444"},
-]
+# ============ GAMIFICATION SYSTEM ============
 
-# Achievement definitions
-ACHIEVEMENTS = [
-    {"id": "first_repair", "name": "First Fix", "description": "Complete your first repair", "xp": 50, "badge": "🎉"},
-    {"id": "five_repairs", "name": "Getting Handy", "description": "Complete 5 repairs", "xp": 100, "badge": "✋"},
-    {"id": "ten_repairs", "name": "Repair Enthusiast", "description": "Complete 10 repairs", "xp": 200, "badge": "🔥"},
-    {"id": "twenty_five_repairs", "name": "Fix-It Pro", "description": "Complete 25 repairs", "xp": 500, "badge": "💪"},
-    {"id": "fifty_repairs", "name": "Repair Master", "description": "Complete 50 repairs", "xp": 1000, "badge": "🏅"},
-    {"id": "first_electronics", "name": "Tech Savvy", "description": "Repair an electronic device", "xp": 75, "badge": "📱"},
-    {"id": "first_appliance", "name": "Appliance Whisperer", "description": "Repair a home appliance", "xp": 75, "badge": "🏠"},
-    {"id": "first_auto", "name": "Grease Monkey", "description": "Complete an automotive repair", "xp": 75, "badge": "🚗"},
-    {"id": "streak_3", "name": "On a Roll", "description": "Complete repairs 3 days in a row", "xp": 100, "badge": "📅"},
-    {"id": "streak_7", "name": "Week Warrior", "description": "Complete repairs 7 days in a row", "xp": 250, "badge": "🗓️"},
-    {"id": "speed_demon", "name": "Speed Demon", "description": "Complete a repair in under 30 minutes", "xp": 75, "badge": "⚡"},
-    {"id": "perfectionist", "name": "Perfectionist", "description": "Complete all steps in a repair", "xp": 50, "badge": "✨"},
-]
+# Set by the startup bootstrap once profiles are migrated and the XP ledger's unique index exists
+gamification_schema_ready = False
 
-def get_rank_for_xp(xp: int) -> dict:
-    """Get the rank for a given XP amount"""
-    current_rank = RANKS[0]
-    for rank in RANKS:
-        if xp >= rank["min_xp"]:
-            current_rank = rank
-    return current_rank
-
-def get_next_rank(xp: int) -> dict:
-    """Get the next rank and XP needed"""
-    for i, rank in enumerate(RANKS):
-        if xp < rank["min_xp"]:
-            return {"rank": rank, "xp_needed": rank["min_xp"] - xp}
-    return None  # Max rank reached
+def check_gamification_ready():
+    if not gamification_schema_ready:
+        raise HTTPException(status_code=503, detail="Gamification is unavailable while the database is being migrated",
+                            headers={"Retry-After": "30"})
 
 @api_router.get("/gamification/profile")
-async def get_gamification_profile(user_id: str = "default_user"):
+async def get_gamification_profile(request: Request, user_id: str = "default_user"):
     """Get user's gamification profile"""
+    check_gamification_ready()
     try:
-        profile = await db.gamification_profiles.find_one({"user_id": user_id})
-        
-        if not profile:
-            # Create default profile
-            profile = {
-                "user_id": user_id,
-                "xp": 0,
-                "total_repairs_completed": 0,
-                "total_steps_completed": 0,
-                "achievements": [],
-                "current_streak": 0,
-                "longest_streak": 0,
-                "last_repair_date": None,
-                "repairs_by_category": {},
-                "created_at": datetime.utcnow().isoformat(),
-                "updated_at": datetime.utcnow().isoformat()
-            }
-            await db.gamification_profiles.insert_one(profile)
+        profile = await gamification_engine.get_profile(user_id)
         
-        # Calculate rank info
-        current_rank = get_rank_for_xp(profile.get("xp", 0))
-        next_rank_info = get_next_rank(profile.get("xp", 0))
+        # Everything below derives from the stored profile, so its updated_at versions the response
+        etag = version_etag("profile", user_id, profile.get("updated_at") if profile else None)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        return json_with_etag(request, serialize_json(profile_response(user_id, profile)), etag)
         
-        return {
-            "user_id": user_id,
-            "xp": profile.get("xp", 0),
-            "rank": current_rank,
-            "next_rank": next_rank_info,
-            "total_repairs_completed": profile.get("total_repairs_completed", 0),
-            "total_steps_completed": profile.get("total_steps_completed", 0),
-            "achievements": profile.get("achievements", []),
-            "current_streak": profile.get("current_streak", 0),
-            "longest_streak": profile.get("longest_streak", 0),
-            "repairs_by_category": profile.get("repairs_by_category", {}),
-            "all_ranks": RANKS,
-            "all_achievements": ACHIEVEMENTS
-        }
     except Exception as e:
         logger.error(f"Error getting gamification profile: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.post("/gamification/complete-step")
-async def complete_step(request: Dict[str, Any]):
+async def complete_step(request: CompleteStepRequest,
+                        idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     """Award XP for completing a repair step"""
+    check_gamification_ready()
+    return await run_idempotent(
+        idempotency_key,
+        f"complete-step:{request.user_id}",
+        request.dict(),
+        lambda: award_step_xp(request)
+    )
+
+async def award_step_xp(request: CompleteStepRequest):
     try:
-        user_id = request.get("user_id", "default_user")
-        repair_id = request.get("repair_id")
-        step_number = request.get("step_number")
-        
-        # Base XP for completing a step
-        xp_earned = 10
-        
-        # Get or create profile
-        profile = await db.gamification_profiles.find_one({"user_id": user_id})
-        if not profile:
-            profile = {
-                "user_id": user_id,
-                "xp": 0,
-                "total_repairs_completed": 0,
-                "total_steps_completed": 0,
-                "achievements": [],
-                "current_streak": 0,
-                "longest_streak": 0,
-                "repairs_by_category": {},
-                "completed_steps": []
-            }
-        
-        # Check if step already completed
-        completed_steps = profile.get("completed_steps", [])
-        step_key = f"{repair_id}_{step_number}"
-        if step_key in completed_steps:
-            return {"message": "Step already completed", "xp_earned": 0}
-        
-        # Update profile
-        completed_steps.append(step_key)
-        new_xp = profile.get("xp", 0) + xp_earned
-        new_steps = profile.get("total_steps_completed", 0) + 1
-        
-        await db.gamification_profiles.update_one(
-            {"user_id": user_id},
-            {
-                "$set": {
-                    "xp": new_xp,
-                    "total_steps_completed": new_steps,
-                    "completed_steps": completed_steps,
-                    "updated_at": datetime.utcnow().isoformat()
-                }
-            },
-            upsert=True
-        )
-        
-        # Check for rank up
-        old_rank = get_rank_for_xp(profile.get("xp", 0))
-        new_rank = get_rank_for_xp(new_xp)
-        ranked_up = old_rank["name"] != new_rank["name"]
-        
-        return {
-            "xp_earned": xp_earned,
-            "total_xp": new_xp,
-            "total_steps_completed": new_steps,
-            "ranked_up": ranked_up,
-            "new_rank": new_rank if ranked_up else None
-        }
+        return await gamification_engine.complete_step(request.user_id, request.repair_id, request.step_number)
     except Exception as e:
         logger.error(f"Error completing step: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @api_router.post("/gamification/complete-repair")
-async def complete_repair(request: Dict[str, Any]):
+async def complete_repair(request: CompleteRepairRequest,
+                          idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     """Award XP and check achievements for completing a repair"""
+    check_gamification_ready()
+    return await run_idempotent(
+        idempotency_key,
+        f"complete-repair:{request.user_id}",
+        request.dict(),
+        lambda: award_repair_xp(request)
+    )
+
+async def award_repair_xp(request: CompleteRepairRequest):
     try:
-        user_id = request.get("user_id", "default_user")
-        repair_id = request.get("repair_id")
-        item_type = request.get("item_type", "").lower()
-        total_steps = request.get("total_steps", 0)
-        time_taken_minutes = request.get("time_taken_minutes", 0)
-        
-        # Base XP for completing a repair
-        xp_earned = 50
-        
-        # Bonus XP based on complexity (steps)
-        if total_steps >= 10:
-            xp_earned += 50  # Complex repair bonus
-        elif total_steps >= 5:
-            xp_earned += 25  # Medium repair bonus
-        
-        # Speed bonus
-        if time_taken_minutes > 0 and time_taken_minutes < 30:
-            xp_earned += 25  # Speed bonus
-        
-        # Get profile
-        profile = await db.gamification_profiles.find_one({"user_id": user_id})
-        if not profile:
-            profile = {
-                "user_id": user_id,
-                "xp": 0,
-                "total_repairs_completed": 0,
-                "total_steps_completed": 0,
-                "achievements": [],
-                "current_streak": 0,
-                "longest_streak": 0,
-                "repairs_by_category": {},
-                "last_repair_date": None
-            }
-        
-        # Update repair count
-        new_repair_count = profile.get("total_repairs_completed", 0) + 1
-        
-        # Update category counts
-        repairs_by_category = profile.get("repairs_by_category", {})
-        category = "other"
-        if any(word in item_type for word in ["phone", "tablet", "computer", "laptop", "tv", "electronic"]):
-            category = "electronics"
-        elif any(word in item_type for word in ["car", "truck", "auto", "vehicle", "motorcycle"]):
-            category = "automotive"
-        elif any(word in item_type for word in ["washer", "dryer", "refrigerator", "dishwasher", "oven", "appliance"]):
-            category = "appliance"
-        elif any(word in item_type for word in ["furniture", "chair", "table", "desk"]):
-            category = "furniture"
-        
-        repairs_by_category[category] = repairs_by_category.get(category, 0) + 1
-        
-        # Check streak
-        current_streak = profile.get("current_streak", 0)
-        longest_streak = profile.get("longest_streak", 0)
-        last_repair_date = profile.get("last_repair_date")
-        today = datetime.utcnow().date().isoformat()
-        
-        if last_repair_date:
-            last_date = datetime.fromisoformat(last_repair_date).date()
-            days_diff = (datetime.utcnow().date() - last_date).days
-            if days_diff == 1:
-                current_streak += 1
-            elif days_diff > 1:
-                current_streak = 1
-            # Same day doesn't increase streak
-        else:
-            current_streak = 1
-        
-        longest_streak = max(longest_streak, current_streak)
-        
-        # Check achievements
-        new_achievements = []
-        existing_achievements = [a["id"] for a in profile.get("achievements", [])]
-        
-        # First repair
-        if new_repair_count == 1 and "first_repair" not in existing_achievements:
-            new_achievements.append(next(a for a in ACHIEVEMENTS if a["id"] == "first_repair"))
-            xp_earned += 50
-        
-        # Repair count achievements
-        if new_repair_count >= 5 and "five_repairs" not in existing_achievements:
-            new_achievements.append(next(a for a in ACHIEVEMENTS if a["id"] == "five_repairs"))
-            xp_earned += 100
-        if new_repair_count >= 10 and "ten_repairs" not in existing_achievements:
-            new_achievements.append(next(a for a in ACHIEVEMENTS if a["id"] == "ten_repairs"))
-            xp_earned += 200
-        if new_repair_count >= 25 and "twenty_five_repairs" not in existing_achievements:
-            new_achievements.append(next(a for a in ACHIEVEMENTS if a["id"] == "twenty_five_repairs"))
-            xp_earned += 500
-        if new_repair_count >= 50 and "fifty_repairs" not in existing_achievements:
-            new_achievements.append(next(a for a in ACHIEVEMENTS if a["id"] == "fifty_repairs"))
-            xp_earned += 1000
-        
-        # Category achievements
-        if category == "electronics" and repairs_by_category.get("electronics", 0) == 1 and "first_electronics" not in existing_achievements:
-            new_achievements.append(next(a for a in ACHIEVEMENTS if a["id"] == "first_electronics"))
-            xp_earned += 75
-        if category == "appliance" and repairs_by_category.get("appliance", 0) == 1 and "first_appliance" not in existing_achievements:
-            new_achievements.append(next(a for a in ACHIEVEMENTS if a["id"] == "first_appliance"))
-            xp_earned += 75
-        if category == "automotive" and repairs_by_category.get("automotive", 0) == 1 and "first_auto" not in existing_achievements:
-            new_achievements.append(next(a for a in ACHIEVEMENTS if a["id"] == "first_auto"))
-            xp_earned += 75
-        
-        # Streak achievements
-        if current_streak >= 3 and "streak_3" not in existing_achievements:
-            new_achievements.append(next(a for a in ACHIEVEMENTS if a["id"] == "streak_3"))
-            xp_earned += 100
-        if current_streak >= 7 and "streak_7" not in existing_achievements:
-            new_achievements.append(next(a for a in ACHIEVEMENTS if a["id"] == "streak_7"))
-            xp_earned += 250
-        
-        # Speed achievement
-        if time_taken_minutes > 0 and time_taken_minutes < 30 and "speed_demon" not in existing_achievements:
-            new_achievements.append(next(a for a in ACHIEVEMENTS if a["id"] == "speed_demon"))
-            xp_earned += 75
-        
-        # Calculate new XP
-        new_xp = profile.get("xp", 0) + xp_earned
-        
-        # Update profile
-        all_achievements = profile.get("achievements", []) + new_achievements
-        
-        await db.gamification_profiles.update_one(
-            {"user_id": user_id},
-            {
-                "$set": {
-                    "xp": new_xp,
-                    "total_repairs_completed": new_repair_count,
-                    "achievements": all_achievements,
-                    "current_streak": current_streak,
-                    "longest_streak": longest_streak,
-                    "last_repair_date": today,
-                    "repairs_by_category": repairs_by_category,
-                    "updated_at": datetime.utcnow().isoformat()
-                }
-            },
-            upsert=True
+        return await gamification_engine.complete_repair(
+            request.user_id, request.repair_id, request.item_type,
+            request.total_steps, request.time_taken_minutes
         )
-        
-        # Check for rank up
-        old_rank = get_rank_for_xp(profile.get("xp", 0))
-        new_rank = get_rank_for_xp(new_xp)
-        ranked_up = old_rank["name"] != new_rank["name"]
-        
-        return {
-            "xp_earned": xp_earned,
-            "total_xp": new_xp,
-            "total_repairs_completed": new_repair_count,
-            "current_streak": current_streak,
-            "new_achievements": new_achievements,
-            "ranked_up": ranked_up,
-            "new_rank": new_rank if ranked_up else None,
-            "current_rank": get_rank_for_xp(new_xp)
-        }
     except Exception as e:
         logger.error(f"Error completing repair: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.post("/gamification/events")
+async def record_xp_events(request: XpEventBatch,
+                           idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    """Award XP for a batch of step and repair completions, such as those queued offline.
+
+    All events are recorded in one insert and applied to the profile in one
+    update. Events already recorded are skipped. The response holds the
+    XP earned, every new achievement once, and the final profile.
+    """
+    check_gamification_ready()
+    if not request.events:
+        raise HTTPException(status_code=400, detail="No events to record")
+    if len(request.events) > MAX_XP_EVENT_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_XP_EVENT_BATCH} events per batch")
+    for event in request.events:
+        if event.kind not in (STEP_EVENT, REPAIR_EVENT):
+            raise HTTPException(status_code=400, detail=f"Unknown event kind: {event.kind}")
+        if event.kind == STEP_EVENT and event.step_number is None:
+            raise HTTPException(status_code=400, detail="Step events need a step_number")
+    
+    return await run_idempotent(
+        idempotency_key,
+        f"xp-events:{request.user_id}",
+        request.dict(),
+        lambda: award_xp_events(request)
+    )
+
+async def award_xp_events(request: XpEventBatch):
+    try:
+        now = datetime.utcnow()
+        events = []
+        for event in request.events:
+            # Device clocks can run ahead; nothing counts as happening after it reached us
+            occurred_at = min(naive_utc(event.occurred_at), now) if event.occurred_at else now
+            if event.kind == STEP_EVENT:
+                events.append(step_event(request.user_id, event.repair_id, event.step_number, now, occurred_at))
+            else:
+                events.append(repair_event(request.user_id, event.repair_id, event.item_type, event.total_steps,
+                                           event.time_taken_minutes, now, occurred_at))
+        return await gamification_engine.complete_batch(request.user_id, events)
+    except Exception as e:
+        logger.error(f"Error recording XP events: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def check_leaderboard_window(window: str):
+    if window != ALL_TIME and window not in WINDOW_RETENTION:
+        raise HTTPException(status_code=400, detail=f"Invalid window. Use: {ALL_TIME}, {', '.join(WINDOW_RETENTION)}")
+
 @api_router.get("/gamification/leaderboard")
-async def get_leaderboard(limit: int = 10):
-    """Get top users by XP"""
+async def get_leaderboard(limit: int = Query(10, ge=1, le=MAX_LEADERBOARD_LIMIT), window: str = ALL_TIME,
+                          period: Optional[str] = None):
+    """Get top users by XP.
+
+    window is all_time, week or month. Windowed boards rank XP earned in
+    the current ISO week or calendar month; pass period (such as 2026-W42
+    or 2026-10) for an earlier one.
+    """
+    check_gamification_ready()
     try:
-        cursor = db.gamification_profiles.find().sort("xp", -1).limit(limit)
+        check_leaderboard_window(window)
+        if window == ALL_TIME:
+            period = None
+            if leaderboard_service.ready:
+                top = leaderboard_service.leaderboard.top(limit)
+            else:
+                # Still loading at startup: read the top through the xp index instead
+                cursor = db.gamification_profiles.find({}, {"_id": 0, "user_id": 1, "xp": 1}).sort("xp", -1).limit(limit)
+                top = places([{"user_id": p["user_id"], "xp": p.get("xp", 0)} async for p in cursor])
+        else:
+            current = windowed_leaderboards.current(window)
+            if current is not None and period in (None, current[0]):
+                period, board = current
+                top = board.top(limit)
+            else:
+                period = period or period_key(window, datetime.utcnow())
+                top = await windowed_leaderboards.top_from_index(window, period, limit)
+        
+        details = db.gamification_profiles.find(
+            {"user_id": {"$in": [entry["user_id"] for entry in top]}},
+            {"_id": 0, "user_id": 1, "xp": 1, "total_repairs_completed": 1, "achievements.id": 1}
+        )
+        profiles = {profile["user_id"]: profile async for profile in details}
         leaders = []
-        async for profile in cursor:
-            rank = get_rank_for_xp(profile.get("xp", 0))
+        for entry in top:
+            profile = profiles.get(entry["user_id"], {})
             leaders.append({
-                "user_id": profile.get("user_id"),
-                "xp": profile.get("xp", 0),
-                "rank": rank,
+                **entry,
+                # Rank tiers always follow lifetime XP
+                "rank": get_rank_for_xp(profile.get("xp", entry["xp"])),
                 "total_repairs": profile.get("total_repairs_completed", 0),
                 "achievements_count": len(profile.get("achievements", []))
             })
-        return {"leaderboard": leaders}
+        return {"window": window, "period": period, "leaderboard": leaders}
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting leaderboard: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/gamification/leaderboard/rank")
+async def get_leaderboard_rank(user_id: str = "default_user", window: str = ALL_TIME,
+                               radius: int = Query(5, ge=0, le=MAX_AROUND_RADIUS)):
+    """Get a user's place on the leaderboard and the users just above and below them"""
+    check_gamification_ready()
+    try:
+        check_leaderboard_window(window)
+        period = None
+        if window == ALL_TIME:
+            board = leaderboard_service.leaderboard if leaderboard_service.ready else None
+        else:
+            current = windowed_leaderboards.current(window)
+            period, board = current if current is not None else (None, None)
+        if board is None:
+            raise HTTPException(status_code=503, detail="Leaderboard is still loading")
+        return {
+            "user_id": user_id,
+            "window": window,
+            "period": period,
+            "xp": board.xp(user_id) or 0,
+            "place": board.place(user_id),  # None until the user earns XP in this window
+            "total_players": len(board),
+            "around": board.around(user_id, radius),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting leaderboard rank: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Offline mutations a sync can carry, applied through the same code as the HTTP routes
+async def apply_sync_mutation(mutation: SyncMutation, user_id: str) -> Any:
+    data = mutation.data
+    if mutation.op == "save_session":
+        return await save_repair_session(SaveRepairSession(**{**data, "user_id": user_id}))
+    if mutation.op == "update_session":
+        patch = RepairSessionPatch(**{k: v for k, v in data.items() if k != "repair_id"})
+        return await update_repair_session(data.get("repair_id", ""), patch, user_id)
+    if mutation.op == "delete_session":
+        return await delete_repair_session(data.get("repair_id", ""), user_id)
+    if mutation.op == "complete_step":
+        check_gamification_ready()
+        step = CompleteStepRequest(**{**data, "user_id": user_id})
+        return await run_idempotent(mutation.client_id, f"complete-step:{user_id}", step.dict(),
+                                    lambda: award_step_xp(step))
+    if mutation.op == "complete_repair":
+        check_gamification_ready()
+        repair = CompleteRepairRequest(**{**data, "user_id": user_id})
+        return await run_idempotent(mutation.client_id, f"complete-repair:{user_id}", repair.dict(),
+                                    lambda: award_repair_xp(repair))
+    raise HTTPException(status_code=400, detail=f"Unknown sync operation: {mutation.op}")
+
+@api_router.post("/sync")
+async def sync(request: SyncRequest):
+    """Apply queued offline mutations, then return everything changed since the watermark.
+
+    Pass the returned server_time as since on the next call. When
+    full_resync is true the watermark was missing or too old for deletes to
+    be known, so the client should replace its local state with the response.
+
+    Sessions, posts and tombstones are paged. While has_more is true, call
+    again with the same since, no mutations and the returned cursors, and
+    only adopt server_time from the last page.
+    """
+    try:
+        import json
+        results = []
+        for mutation in request.mutations:
+            try:
+                body = await apply_sync_mutation(mutation, request.user_id)
+                if isinstance(body, Response):
+                    # Idempotent replays come back as ready-made responses
+                    body = json.loads(body.body)
+                results.append({"client_id": mutation.client_id, "op": mutation.op, "status": 200, "body": body})
+            except HTTPException as e:
+                results.append({"client_id": mutation.client_id, "op": mutation.op, "status": e.status_code, "error": e.detail})
+            except ValidationError as e:
+                results.append({"client_id": mutation.client_id, "op": mutation.op, "status": 422, "error": e.errors()})
+
+        # Taken before reading so anything written during the reads is picked up next time
+        server_time = datetime.utcnow()
+        since = naive_utc(request.since)
+        full_resync = needs_full_resync(since, server_time)
+        since = None if full_resync else since
+        changed = {"$gt": since} if since else {"$exists": True}
+
+        cursors = {}
+        sessions, cursors["sessions"] = await page_since(
+            db.repair_sessions, {"user_id": request.user_id, "updated_at": changed}, None,
+            SESSION_SYNC_SORT, request.cursors.get("sessions")
+        )
+        profile = await db.gamification_profiles.find_one(
+            {"user_id": request.user_id, "updated_at": changed}, PROFILE_PROJECTION
+        )
+        # Every write to a post bumps its updated_at: creation, likes, reports and moderation
+        posts, cursors["community_posts"] = await page_since(
+            db.community_posts, {"updated_at": changed, "hidden": {"$ne": True}}, POST_LISTING_PROJECTION,
+            POST_SYNC_SORT, request.cursors.get("community_posts")
+        )
+        tombstones, cursors["tombstones"] = await tombstones_since(
+            db.tombstones, request.user_id, since, request.cursors.get("tombstones")
+        )
+        cursors = {listing: cursor for listing, cursor in cursors.items() if cursor}
+
+        return {
+            "server_time": server_time,
+            "full_resync": full_resync,
+            "mutations": results,
+            "sessions": sessions,
+            "sessions_has_more": "sessions" in cursors,
+            "profile": profile,
+            "community_posts": like_buffer.merge_pending(posts),
+            "tombstones": tombstones,
+            "has_more": bool(cursors),
+            "cursors": cursors,
+        }
+        
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error syncing: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/batch")
+async def batch(request: BatchRequest):
+    """Run several API requests in one round trip.
+
+    Each item names a method, path, query, headers and JSON body for an
+    existing /api route. Items run concurrently unless they list other
+    items' ids in depends_on; an item whose dependency failed is answered
+    with 424 and not run. Results come back in request order, or with
+    stream set, as NDJSON lines in completion order.
+    """
+    try:
+        validate_batch(request.requests)
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if request.stream:
+        return StreamingResponse(stream_batch(batch_executor, request.requests), media_type="application/x-ndjson")
+    return {"responses": await collect_batch(batch_executor, request.requests)}
+
+@api_router.get("/usage/rollup")
+async def get_usage_rollup(group_by: str = "hour", hours: int = 24, endpoint: Optional[str] = None, user_id: Optional[str] = None):
+    """Get model usage and estimated cost rolled up by hour, endpoint, model or user (admin endpoint)"""
+    try:
+        # Include calls that are still buffered in memory
+        await usage_tracker.flush()
+        rows = await usage_rollup(
+            db.usage,
+            group_by=group_by,
+            since=datetime.utcnow() - timedelta(hours=hours),
+            endpoint=endpoint,
+            user_id=user_id
+        )
+        return {"group_by": group_by, "hours": hours, "rows": rows}
+        
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching usage rollup: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Result of the last startup index/migration run
+schema_report: Dict[str, Any] = {}
+SCHEMA_BOOTSTRAP_RETRY_SECONDS = 60
+
+@api_router.get("/admin/schema")
+async def get_schema_status():
+    """Get index drift and applied migrations (admin endpoint)"""
+    try:
+        migrations = await applied_migrations(db)
+        return {"indexes": schema_report, "migrations": migrations}
+        
+    except Exception as e:
+        logger.error(f"Error fetching schema status: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/degradation")
+async def get_degradation_status():
+    """Get the current load signals and which optional enrichments are degraded"""
+    return degradation.status()
+
 @api_router.get("/")
 async def root():
     return {"message": "FixIt Pro API", "version": "1.0.0"}
@@ -2162,8 +2548,51 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
+@app.on_event("startup")
+async def start_background_jobs():
+    usage_tracker.start()
+    like_buffer.start()
+    degradation.start()
+    insights_rollup.start()
+    hot_score_refresher.start()
+    xp_ledger_compactor.start()
+    # Index builds can take a while on large collections, so don't hold up startup
+    asyncio.ensure_future(bootstrap_schema())
+
+async def bootstrap_schema():
+    """Bootstrap the schema, retrying until migrations succeed and gamification can serve"""
+    global gamification_schema_ready
+    while True:
+        try:
+            report = await bootstrap_database(db)
+            schema_report.clear()
+            schema_report.update(report)
+            if not gamification_schema_ready and \
+                    await schema_requirements_met(db, GAMIFICATION_MIGRATIONS, GAMIFICATION_INDEXES):
+                gamification_schema_ready = True
+                gamification_engine.start()
+                # Leaderboards are loaded from migrated profiles only
+                leaderboard_service.start()
+                windowed_leaderboards.start()
+            if report["migration_error"] is None and gamification_schema_ready:
+                return
+        except Exception as e:
+            logger.error(f"Error bootstrapping database schema: {str(e)}")
+        await asyncio.sleep(SCHEMA_BOOTSTRAP_RETRY_SECONDS)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await usage_tracker.stop()
+    await like_buffer.stop()
+    await degradation.stop()
+    await insights_rollup.stop()
+    await hot_score_refresher.stop()
+    await xp_ledger_compactor.stop()
+    await gamification_engine.stop()
+    await leaderboard_service.stop()
+    await windowed_leaderboards.stop()
+    image_store.shutdown()
     client.close()
@@ -0,0 +1,157 @@
+"""
+FixIntel AI - Near-Duplicate Post Detection
+Company: RentMouse
+"""
+
+import asyncio
+import hashlib
+import io
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Image fingerprints are skipped without Pillow
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Fingerprints are only kept while a spam wave could still be under way (TTL index)
+FINGERPRINT_TTL_SECONDS = 30 * 24 * 3600
+
+# SimHash over title/description/tips. With 5 disjoint bands of 12 bits, any
+# two fingerprints within 4 bits share at least one band exactly (pigeonhole),
+# so band lookups find every candidate without scanning. One-word edits of a
+# post typically land 1-5 bits away; unrelated posts around 20-30.
+TEXT_BANDS = (5, 12)
+TEXT_MAX_DISTANCE = 4
+MIN_TEXT_TOKENS = 8  # Shorter texts collide too easily to judge
+
+# dHash of the before image, in 8 bands of 8 bits: candidates within 7 bits
+IMAGE_BANDS = (8, 8)
+IMAGE_MAX_DISTANCE = 6
+
+# Upper bound on band-sharing candidates verified per new post
+MAX_CANDIDATES = 500
+
+_TOKEN = re.compile(r"\w+")
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash over words and word pairs; None when the text is too short"""
+    tokens = _TOKEN.findall(text.lower())
+    if len(tokens) < MIN_TEXT_TOKENS:
+        return None
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    weights = [0] * 64
+    for feature in features:
+        h = _hash64(feature)
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def dhash(raw: bytes) -> Optional[int]:
+    """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail"""
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(raw)) as image:
+            pixels = list(image.convert("L").resize((9, 8), Image.LANCZOS).getdata())
+    except Exception as e:
+        logger.warning(f"Could not hash image: {str(e)}")
+        return None
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = value << 1 | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+def bands(value: int, layout: Tuple[int, int]) -> List[str]:
+    """Split a hash into (count, width) disjoint bit bands, tagged with their position"""
+    count, width = layout
+    mask = (1 << width) - 1
+    return [f"{i}:{value >> (i * width) & mask:x}" for i in range(count)]
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _to_int64(value: int) -> int:
+    """Mongo integers are signed 64-bit"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def _from_int64(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+@dataclass
+class Fingerprint:
+    text: Optional[int]
+    image: Optional[int]
+
+
+class SpamDetector:
+    """Finds near-duplicates of a new post among recent posts via LSH band lookups.
+
+    Candidates come from a multikey index on the band values, so the cost
+    depends on how many posts share a band, not on how many posts exist.
+    Each candidate is then confirmed by its exact Hamming distance.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def fingerprint(self, title: str, description: str, tips: Optional[str],
+                          image: Optional[bytes]) -> Fingerprint:
+        text = simhash(" ".join(filter(None, [title, description, tips])))
+        # Decoding and resizing the image is CPU work; keep it off the event loop
+        image_hash = await asyncio.get_running_loop().run_in_executor(None, dhash, image) if image else None
+        return Fingerprint(text=text, image=image_hash)
+
+    async def find_duplicates(self, fingerprint: Fingerprint) -> List[Dict[str, Any]]:
+        """Recent posts whose text or before image is within the distance thresholds"""
+        clauses = []
+        if fingerprint.text is not None:
+            clauses.append({"text_bands": {"$in": bands(fingerprint.text, TEXT_BANDS)}})
+        if fingerprint.image is not None:
+            clauses.append({"image_bands": {"$in": bands(fingerprint.image, IMAGE_BANDS)}})
+        if not clauses:
+            return []
+
+        matches = []
+        async for candidate in self.collection.find({"$or": clauses}, {"post_id": 1, "text": 1, "image": 1}).limit(MAX_CANDIDATES):
+            match = {"post_id": candidate["post_id"]}
+            if fingerprint.text is not None and candidate.get("text") is not None:
+                distance = hamming(fingerprint.text, _from_int64(candidate["text"]))
+                if distance <= TEXT_MAX_DISTANCE:
+                    match["text_distance"] = distance
+            if fingerprint.image is not None and candidate.get("image") is not None:
+                distance = hamming(fingerprint.image, _from_int64(candidate["image"]))
+                if distance <= IMAGE_MAX_DISTANCE:
+                    match["image_distance"] = distance
+            if len(match) > 1:
+                matches.append(match)
+        return matches
+
+    async def record(self, post_id: str, fingerprint: Fingerprint):
+        if fingerprint.text is None and fingerprint.image is None:
+            return
+        await self.collection.insert_one({
+            "post_id": post_id,
+            "text": _to_int64(fingerprint.text) if fingerprint.text is not None else None,
+            "text_bands": bands(fingerprint.text, TEXT_BANDS) if fingerprint.text is not None else [],
+            "image": _to_int64(fingerprint.image) if fingerprint.image is not None else None,
+            "image_bands": bands(fingerprint.image, IMAGE_BANDS) if fingerprint.image is not None else [],
+            "created_at": datetime.utcnow(),
+        })
@@ -0,0 +1,70 @@
+"""
+FixIntel AI - Delta Sync Support
+Company: RentMouse
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pagination import keyset_filter, split_page
+
+# How long deletes are remembered; clients that have not synced for longer
+# than this cannot be sent a complete delta and must resync from scratch
+TOMBSTONE_TTL_SECONDS = 30 * 24 * 3600
+
+# Upper bound on changed documents returned per collection in one sync
+SYNC_MAX_ITEMS = 500
+
+# Order each delta is paged in; the tie-breaker lets a page end inside a run
+# of equal timestamps, such as posts touched by the same like flush
+SESSION_SYNC_SORT = [("updated_at", 1), ("_id", 1)]
+POST_SYNC_SORT = [("updated_at", 1), ("id", 1)]
+TOMBSTONE_SYNC_SORT = [("deleted_at", 1), ("_id", 1)]
+
+
+async def record_tombstones(collection, kind: str, keys: List[str], user_id: Optional[str] = None):
+    """Remember deletes so clients syncing later can drop their copies.
+
+    Tombstones without a user_id (such as removed community posts) are
+    visible to every user.
+    """
+    if not keys:
+        return
+    now = datetime.utcnow()
+    await collection.insert_many([
+        {"kind": kind, "key": key, "user_id": user_id, "deleted_at": now}
+        for key in keys
+    ])
+
+
+async def page_since(collection, query: Dict[str, Any], projection: Dict[str, Any], sort: List[Tuple[str, int]],
+                     cursor: Optional[str]) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of a delta listing and the cursor for the next (None on the last page)"""
+    items = await collection.find({**query, **keyset_filter(sort, cursor)}, projection) \
+        .sort(sort).to_list(SYNC_MAX_ITEMS + 1)
+    items, next_page = split_page(items, sort, SYNC_MAX_ITEMS)
+    for item in items:
+        item.pop("_id", None)
+    return items, next_page
+
+
+async def tombstones_since(collection, user_id: str, since: Optional[datetime],
+                           cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    if since is None:
+        return [], None
+    return await page_since(
+        collection, {"user_id": {"$in": [user_id, None]}, "deleted_at": {"$gt": since}},
+        {"kind": 1, "key": 1, "user_id": 1, "deleted_at": 1}, TOMBSTONE_SYNC_SORT, cursor
+    )
+
+
+def naive_utc(moment: Optional[datetime]) -> Optional[datetime]:
+    """Stored timestamps are naive UTC; clients may send an offset"""
+    if moment is None or moment.tzinfo is None:
+        return moment
+    return moment.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def needs_full_resync(since: Optional[datetime], now: datetime) -> bool:
+    """True when the watermark is missing or older than the tombstones we keep"""
+    return since is None or since < now - timedelta(seconds=TOMBSTONE_TTL_SECONDS)
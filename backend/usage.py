@@ -0,0 +1,195 @@
+"""
+FixIntel AI - Model Usage Accounting
+Company: RentMouse
+"""
+
+import asyncio
+import logging
+from contextvars import ContextVar
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from periodic import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+# Approximate list prices (USD) used for cost estimates only
+MODEL_PRICING = {
+    "gemini-2.0-flash": {"input_per_million": 0.10, "output_per_million": 0.40},
+    "gpt-image-1": {"per_image": 0.04},
+}
+
+# Endpoint and user of the request currently being served
+usage_context: ContextVar[Dict[str, str]] = ContextVar(
+    "usage_context", default={"endpoint": "unknown", "user_id": "unknown"}
+)
+
+
+def set_usage_context(endpoint: str, user_id: Optional[str] = None):
+    """Attribute model calls made by the current request to an endpoint and user"""
+    return usage_context.set({"endpoint": endpoint, "user_id": user_id or "anonymous"})
+
+
+def set_usage_user(user_id: Optional[str]):
+    """Attribute the current request's model calls to the user named in its body.
+
+    The middleware only sees the query string; handlers call this once the
+    body is parsed, before any model call or task that should inherit it.
+    """
+    if user_id:
+        usage_context.set({**usage_context.get(), "user_id": user_id})
+
+
+def estimate_cost(model: str, input_tokens: int = 0, output_tokens: int = 0, images: int = 0) -> float:
+    """Estimate the USD cost of a model call from the pricing table"""
+    pricing = MODEL_PRICING.get(model, {})
+    cost = input_tokens / 1_000_000 * pricing.get("input_per_million", 0)
+    cost += output_tokens / 1_000_000 * pricing.get("output_per_million", 0)
+    cost += images * pricing.get("per_image", 0)
+    return cost
+
+
+def gemini_token_counts(response: Any) -> Tuple[int, int]:
+    """Extract (input, output) token counts from a Gemini response"""
+    metadata = getattr(response, "usage_metadata", None)
+    if not metadata:
+        return 0, 0
+    return (
+        getattr(metadata, "prompt_token_count", 0) or 0,
+        getattr(metadata, "candidates_token_count", 0) or 0,
+    )
+
+
+class UsageTracker:
+    """Aggregates model call usage in memory and flushes it to Mongo in batches.
+
+    Calls are rolled up per (hour, endpoint, model, user_id) so a flush writes
+    one upsert per bucket regardless of how many calls landed in it.
+    """
+
+    def __init__(self, collection, flush_interval: float = 30.0, max_pending: int = 500):
+        self.collection = collection
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[Tuple[datetime, str, str, str], Dict[str, float]] = {}
+        self._flush_lock = asyncio.Lock()
+        self._periodic = PeriodicTask("usage flush", self.flush, flush_interval, on_stop=self.flush)
+
+    def record(self, model: str, input_tokens: int = 0, output_tokens: int = 0,
+               latency_ms: float = 0.0, images: int = 0, error: bool = False,
+               endpoint: Optional[str] = None, user_id: Optional[str] = None):
+        """Record a single model call against the current request context"""
+        context = usage_context.get()
+        hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        key = (hour, endpoint or context["endpoint"], model, user_id or context["user_id"])
+        self._merge(key, {
+            "calls": 1,
+            "errors": 1 if error else 0,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "images": images,
+            "latency_ms_total": latency_ms,
+            "latency_ms_max": latency_ms,
+            "cost_usd": estimate_cost(model, input_tokens, output_tokens, images),
+        })
+
+        if len(self._pending) >= self.max_pending:
+            self._periodic.trigger()
+
+    def _merge(self, key: Tuple[datetime, str, str, str], delta: Dict[str, float]):
+        bucket = self._pending.get(key)
+        if bucket is None:
+            self._pending[key] = dict(delta)
+            return
+        for field, value in delta.items():
+            if field == "latency_ms_max":
+                bucket[field] = max(bucket[field], value)
+            else:
+                bucket[field] += value
+
+    async def flush(self):
+        """Write all pending buckets to Mongo as one unordered bulk upsert"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+
+            keys = list(pending)
+            operations = []
+            for (hour, endpoint, model, user_id), bucket in pending.items():
+                increments = {k: v for k, v in bucket.items() if k != "latency_ms_max"}
+                operations.append(UpdateOne(
+                    {"hour": hour, "endpoint": endpoint, "model": model, "user_id": user_id},
+                    {"$inc": increments, "$max": {"latency_ms_max": bucket["latency_ms_max"]}},
+                    upsert=True,
+                ))
+
+            try:
+                await self.collection.bulk_write(operations, ordered=False)
+            except BulkWriteError as e:
+                # Unordered: everything but the reported failures was applied, so only those are retried
+                for error in e.details.get("writeErrors", []):
+                    key = keys[error["index"]]
+                    self._merge(key, pending[key])
+                logger.error(f"Failed to flush some usage records: {str(e)}")
+            except Exception as e:
+                logger.error(f"Failed to flush usage records: {str(e)}")
+                # Keep the counts so the next flush retries them
+                for key, bucket in pending.items():
+                    self._merge(key, bucket)
+
+    def start(self):
+        self._periodic.start()
+
+    async def stop(self):
+        await self._periodic.stop()
+
+
+async def usage_rollup(collection, group_by: str = "hour", since: Optional[datetime] = None,
+                       endpoint: Optional[str] = None, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Roll usage buckets up by hour, endpoint, model or user"""
+    group_fields = {
+        "hour": "$hour",
+        "endpoint": "$endpoint",
+        "model": "$model",
+        "user": "$user_id",
+        "hour_endpoint": {"hour": "$hour", "endpoint": "$endpoint"},
+    }
+    if group_by not in group_fields:
+        raise ValueError(f"group_by must be one of: {', '.join(group_fields)}")
+
+    match: Dict[str, Any] = {"hour": {"$gte": since or datetime.utcnow() - timedelta(hours=24)}}
+    if endpoint:
+        match["endpoint"] = endpoint
+    if user_id:
+        match["user_id"] = user_id
+
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": group_fields[group_by],
+            "calls": {"$sum": "$calls"},
+            "errors": {"$sum": "$errors"},
+            "input_tokens": {"$sum": "$input_tokens"},
+            "output_tokens": {"$sum": "$output_tokens"},
+            "images": {"$sum": "$images"},
+            "latency_ms_total": {"$sum": "$latency_ms_total"},
+            "latency_ms_max": {"$max": "$latency_ms_max"},
+            "cost_usd": {"$sum": "$cost_usd"},
+        }},
+        {"$sort": {"_id": 1} if group_by in ("hour", "hour_endpoint") else {"cost_usd": -1}},
+    ]
+
+    rows = []
+    async for row in collection.aggregate(pipeline):
+        calls = row["calls"] or 1
+        rows.append({
+            group_by: row.pop("_id"),
+            **row,
+            "avg_latency_ms": round(row["latency_ms_total"] / calls, 1),
+            "cost_usd": round(row["cost_usd"], 6),
+        })
+    return rows
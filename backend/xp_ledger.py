@@ -0,0 +1,140 @@
+"""
+FixIntel AI - Append-Only XP Event Ledger
+Company: RentMouse
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from periodic import PeriodicTask
+
+logger = logging.getLogger(__name__)
+
+# Events older than this are folded into the user's snapshot and stripped down
+# to their dedupe key, which is kept for good so the work is never awarded twice
+XP_EVENT_RETENTION = timedelta(days=90)
+
+# Everything but the (user_id, repair_id, kind, step_number) key, removed on compaction.
+# Without created_at a compacted row falls out of every ledger query.
+EVENT_PAYLOAD_FIELDS = ("xp", "created_at", "occurred_at", "item_type", "total_steps", "time_taken_minutes",
+                        "applied", "batch", "backfilled")
+
+STEP_EVENT = "step"
+REPAIR_EVENT = "repair"
+# Achievement bonuses; repair_id holds the achievement id, so each is recorded once per user
+ACHIEVEMENT_EVENT = "achievement"
+
+
+def xp_event(user_id: str, kind: str, repair_id: str, step_number: Optional[int], xp: int,
+             created_at: datetime, occurred_at: Optional[datetime] = None, **details) -> Dict[str, Any]:
+    """One award; (user_id, repair_id, kind, step_number) is unique so replays are rejected.
+
+    created_at is when the server recorded it and drives compaction;
+    occurred_at is when the user did it, which differs for offline work.
+    Events with applied false are not in the profile yet and are skipped
+    by everything that sums the ledger.
+    """
+    return {
+        "user_id": user_id,
+        "kind": kind,
+        "repair_id": repair_id,
+        "step_number": step_number,
+        "xp": xp,
+        "created_at": created_at,
+        "occurred_at": occurred_at or created_at,
+        **details,
+    }
+
+
+class XpLedgerCompactor:
+    """Folds expired XP events into one xp_snapshots document per user.
+
+    Profiles hold running totals maintained as events arrive, so the ledger
+    is only read here. Folded events keep their unique key, marked
+    compacted, so replays are still rejected after the retention window.
+    Each snapshot records the created_at of the last event it folded, and
+    the next pass only sums events after that, so a pass that dies between
+    updating the snapshot and compacting the events does not count them twice.
+    """
+
+    def __init__(self, events, snapshots, retention: timedelta = XP_EVENT_RETENTION,
+                 interval: float = 3600.0, batch: int = 100):
+        self.events = events
+        self.snapshots = snapshots
+        self.retention = retention
+        self.interval = interval
+        self.batch = batch
+        self._periodic = PeriodicTask("XP ledger compactor", self._compact_pass, interval)
+
+    async def compact_user(self, user_id: str, cutoff: datetime) -> int:
+        snapshot = await self.snapshots.find_one({"user_id": user_id}, {"through": 1})
+        through = snapshot.get("through") if snapshot else None
+        window = {"$lt": cutoff}
+        if through is not None:
+            window["$gt"] = through
+
+        totals = await self.events.aggregate([
+            {"$match": {"user_id": user_id, "created_at": window, "applied": {"$ne": False}}},
+            {"$group": {
+                "_id": None,
+                "xp": {"$sum": "$xp"},
+                "steps": {"$sum": {"$cond": [{"$eq": ["$kind", STEP_EVENT]}, 1, 0]}},
+                "repairs": {"$sum": {"$cond": [{"$eq": ["$kind", REPAIR_EVENT]}, 1, 0]}},
+                "events": {"$sum": 1},
+                "through": {"$max": "$created_at"},
+            }},
+        ]).to_list(1)
+
+        if totals:
+            folded = totals[0]
+            try:
+                # Guarded on the watermark read above, so a concurrent pass folds each event once
+                result = await self.snapshots.update_one(
+                    {"user_id": user_id, "through": through},
+                    {
+                        "$inc": {"xp": folded["xp"], "steps": folded["steps"], "repairs": folded["repairs"]},
+                        "$set": {"through": folded["through"], "updated_at": datetime.utcnow()},
+                    },
+                    upsert=through is None
+                )
+            except DuplicateKeyError:
+                return 0
+            if result.matched_count == 0 and result.upserted_id is None:
+                return 0
+            through = folded["through"]
+
+        if through is None:
+            return 0
+        result = await self.events.update_many(
+            {"user_id": user_id, "created_at": {"$lte": through}, "applied": {"$ne": False}},
+            {"$set": {"compacted": True}, "$unset": {field: "" for field in EVENT_PAYLOAD_FIELDS}}
+        )
+        return result.modified_count
+
+    async def compact(self) -> int:
+        """Compact up to one batch of users with expired events; returns events compacted"""
+        cutoff = datetime.utcnow() - self.retention
+        users = await self.events.aggregate([
+            {"$match": {"created_at": {"$lt": cutoff}, "applied": {"$ne": False}}},
+            {"$group": {"_id": "$user_id"}},
+            {"$limit": self.batch},
+        ]).to_list(self.batch)
+
+        compacted = 0
+        for user in users:
+            compacted += await self.compact_user(user["_id"], cutoff)
+        return compacted
+
+    async def _compact_pass(self):
+        compacted = await self.compact()
+        if compacted:
+            logger.info(f"Compacted {compacted} XP event(s) into snapshots")
+
+    def start(self):
+        self._periodic.start()
+
+    async def stop(self):
+        await self._periodic.stop()
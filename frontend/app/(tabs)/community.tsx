@@ -19,13 +19,25 @@ import * as ImagePicker from 'expo-image-picker';
 import { LinearGradient } from 'expo-linear-gradient';
 import ReportModal from '../components/ReportModal';
 import CommunityGuidelinesModal from '../components/CommunityGuidelinesModal';
+import { useUser } from '../contexts/UserContext';
 
 const BACKEND_URL = process.env.EXPO_PUBLIC_BACKEND_URL;
 
+// Posted images live in the image store; older clients' posts may still carry inline base64
+const postImageUri = (ref: any, inline?: string) => {
+  if (ref?.digest) {
+    return `${BACKEND_URL}/api/images/${ref.digest}/feed`;
+  }
+  return inline ? `data:image/jpeg;base64,${inline}` : null;
+};
+
 export default function CommunityScreen() {
+  const { userId } = useUser();
   const [posts, setPosts] = useState<any[]>([]);
   const [loading, setLoading] = useState(true);
   const [refreshing, setRefreshing] = useState(false);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [showCreateModal, setShowCreateModal] = useState(false);
   
   // PR #6: Community Moderation
@@ -52,6 +64,7 @@ export default function CommunityScreen() {
       if (response.ok) {
         const data = await response.json();
         setPosts(data);
+        setNextCursor(response.headers.get('X-Next-Cursor'));
       }
     } catch (error) {
       console.error('Error fetching posts:', error);
@@ -61,6 +74,31 @@ export default function CommunityScreen() {
     }
   };
 
+  // Infinite scroll: each page continues from the cursor the previous one returned
+  const fetchMorePosts = async () => {
+    if (!nextCursor || loadingMore) return;
+    setLoadingMore(true);
+    try {
+      const response = await fetch(`${BACKEND_URL}/api/community/posts?cursor=${encodeURIComponent(nextCursor)}`);
+      if (response.ok) {
+        const data = await response.json();
+        setPosts(current => [...current, ...data]);
+        setNextCursor(response.headers.get('X-Next-Cursor'));
+      }
+    } catch (error) {
+      console.error('Error fetching more posts:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const handleScroll = ({ nativeEvent }: any) => {
+    const { layoutMeasurement, contentOffset, contentSize } = nativeEvent;
+    if (layoutMeasurement.height + contentOffset.y >= contentSize.height - 600) {
+      fetchMorePosts();
+    }
+  };
+
   const onRefresh = () => {
     setRefreshing(true);
     fetchPosts();
@@ -136,12 +174,14 @@ export default function CommunityScreen() {
 
   const likePost = async (postId: string) => {
     try {
-      await fetch(`${BACKEND_URL}/api/community/like/${postId}`, {
+      const response = await fetch(`${BACKEND_URL}/api/community/like/${postId}?user_id=${userId}`, {
         method: 'POST',
       });
-      // Update local state
+      if (!response.ok) return;
+      const data = await response.json();
+      // Update local state with the server's count (repeat likes are not counted)
       setPosts(posts.map(post => 
-        post.id === postId ? { ...post, likes: post.likes + 1 } : post
+        post.id === postId ? { ...post, likes: data.likes } : post
       ));
     } catch (error) {
       console.error('Error liking post:', error);
@@ -171,6 +211,8 @@ export default function CommunityScreen() {
           <ScrollView
             contentContainerStyle={styles.scrollContent}
             refreshControl={<RefreshControl refreshing={refreshing} onRefresh={onRefresh} tintColor="#00D9FF" />}
+            onScroll={handleScroll}
+            scrollEventThrottle={200}
           >
         {/* Header */}
         <View style={styles.header}>
@@ -227,21 +269,21 @@ export default function CommunityScreen() {
 
               {/* Images */}
               <View style={styles.imagesContainer}>
-                {post.before_image && (
+                {postImageUri(post.before_image_ref, post.before_image) && (
                   <View style={styles.imageWrapper}>
                     <Text style={styles.imageLabel}>Before</Text>
                     <Image
-                      source={{ uri: `data:image/jpeg;base64,${post.before_image}` }}
+                      source={{ uri: postImageUri(post.before_image_ref, post.before_image)! }}
                       style={styles.postImage}
                       resizeMode="cover"
                     />
                   </View>
                 )}
-                {post.after_image && (
+                {postImageUri(post.after_image_ref, post.after_image) && (
                   <View style={styles.imageWrapper}>
                     <Text style={styles.imageLabel}>After</Text>
                     <Image
-                      source={{ uri: `data:image/jpeg;base64,${post.after_image}` }}
+                      source={{ uri: postImageUri(post.after_image_ref, post.after_image)! }}
                       style={styles.postImage}
                       resizeMode="cover"
                     />
@@ -279,6 +321,7 @@ export default function CommunityScreen() {
             </View>
           ))
         )}
+        {loadingMore && <ActivityIndicator size="small" color="#00D9FF" />}
       </ScrollView>
 
       {/* Create Post Modal */}
@@ -47,8 +47,8 @@ export default function ProgressScreen() {
 
   const fetchBackendSessions = async () => {
     try {
-      // Pass user_id to only get this user's repairs
-      const response = await fetch(`${BACKEND_URL}/api/repair-sessions?user_id=${userId}`);
+      // Pass user_id to only get this user's repairs; details are loaded when opened
+      const response = await fetch(`${BACKEND_URL}/api/repair-sessions?user_id=${userId}&fields=summary`);
       if (response.ok) {
         const data = await response.json();
         return Array.isArray(data) ? data : [];
@@ -171,7 +171,27 @@ export default function ProgressScreen() {
     );
   };
 
-  const handleViewDetails = (session: any) => {
+  const fetchSessionDetails = async (repairId: string) => {
+    try {
+      const response = await fetch(`${BACKEND_URL}/api/repair-sessions/${repairId}?user_id=${userId}`);
+      if (response.ok) {
+        return await response.json();
+      }
+      return null;
+    } catch (error) {
+      console.error('Error fetching session details:', error);
+      return null;
+    }
+  };
+
+  const handleViewDetails = async (session: any) => {
+    // Backend list entries are summaries; fetch the full analysis on demand
+    if (!session.repair_data && session.repair_id) {
+      const details = await fetchSessionDetails(session.repair_id);
+      if (details) {
+        session = details;
+      }
+    }
     // Ensure we have the repair data in the correct structure
     const repairData = session.repair_data || session;
     setSelectedSession(repairData);
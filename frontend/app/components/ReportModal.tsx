@@ -19,6 +19,7 @@ import { Ionicons } from '@expo/vector-icons';
 import { LinearGradient } from 'expo-linear-gradient';
 import { BlurView } from 'expo-blur';
 import { useTheme } from '../contexts/ThemeContext';
+import { useUser } from '../contexts/UserContext';
 
 interface ReportModalProps {
   visible: boolean;
@@ -39,6 +40,7 @@ const BACKEND_URL = process.env.EXPO_PUBLIC_BACKEND_URL;
 
 export default function ReportModal({ visible, postId, onClose, onReportSubmitted }: ReportModalProps) {
   const { theme } = useTheme();
+  const { userId } = useUser();
   const [selectedReason, setSelectedReason] = useState<string>('');
   const [details, setDetails] = useState('');
   const [reporterName, setReporterName] = useState('');
@@ -60,6 +62,7 @@ export default function ReportModal({ visible, postId, onClose, onReportSubmitte
           reason: selectedReason,
           details: details || undefined,
           reporter_name: reporterName || 'Anonymous',
+          reporter_id: userId,
         }),
       });
 
@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from gamification import APPLIED_BATCH_HISTORY, STEP_XP, award_pipeline, repair_event, step_event
+
+NOW = datetime(2026, 10, 19, 12, 0)
+
+
+def _set_fields(stages):
+    return [field for stage in stages if "$set" in stage for field in stage["$set"]]
+
+
+def test_step_events_are_summed_in_the_first_stage():
+    events = [step_event("u1", "r1", n, NOW) for n in range(3)]
+    stages = award_pipeline(events, NOW)
+
+    first = stages[0]["$set"]
+    assert first["_xp_earned"] == 3 * STEP_XP
+    assert first["xp"] == {"$add": [{"$ifNull": ["$xp", 0]}, 3 * STEP_XP]}
+    assert first["total_steps_completed"] == {"$add": [{"$ifNull": ["$total_steps_completed", 0]}, 3]}
+    assert "applied_batches" not in first
+    assert "total_repairs_completed" not in _set_fields(stages)
+
+
+def test_batch_is_appended_to_a_bounded_history():
+    stages = award_pipeline([step_event("u1", "r1", 1, NOW)], NOW, batch="b1")
+    assert stages[0]["$set"]["applied_batches"] == {"$slice": [
+        {"$concatArrays": [{"$ifNull": ["$applied_batches", []]}, ["b1"]]}, -APPLIED_BATCH_HISTORY
+    ]}
+
+
+def test_repairs_are_applied_in_the_order_they_happened():
+    later = repair_event("u1", "later", "laptop", 3, 30, NOW, occurred_at=NOW)
+    earlier = repair_event("u1", "earlier", "car", 3, 30, NOW, occurred_at=NOW - timedelta(days=1))
+    stages = award_pipeline([later, earlier], NOW)
+
+    categories = [field.split(".")[1] for field in _set_fields(stages) if field.startswith("repairs_by_category.")]
+    assert categories == ["automotive", "electronics"]
+
+
+def test_award_is_left_for_the_caller_and_scratch_fields_removed():
+    stages = award_pipeline([repair_event("u1", "r1", "chair", 12, 5, NOW)], NOW)
+
+    assert stages[-2]["$set"]["last_award"]["at"] == NOW
+    assert stages[-2]["$set"]["updated_at"] == NOW
+    scratch = [field for field in _set_fields(stages) if field.startswith("_")]
+    assert set(scratch) <= set(stages[-1]["$unset"])
@@ -0,0 +1,61 @@
+import random
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from leaderboard import IndexableSkipList, Leaderboard, places
+
+
+def test_skip_list_keeps_keys_sorted_and_indexable():
+    keys = random.Random(7).sample(range(10000), 500)
+    skip_list = IndexableSkipList()
+    for key in keys:
+        skip_list.insert(key)
+
+    ordered = sorted(keys)
+    assert len(skip_list) == len(keys)
+    assert [skip_list[i] for i in range(len(ordered))] == ordered
+    assert list(skip_list.islice(100, 25)) == ordered[100:125]
+    for key in ordered[::37]:
+        assert skip_list.count_less(key) == ordered.index(key)
+
+
+def test_skip_list_remove():
+    skip_list = IndexableSkipList()
+    for key in range(50):
+        skip_list.insert(key)
+    for key in range(0, 50, 2):
+        skip_list.remove(key)
+
+    assert len(skip_list) == 25
+    assert list(skip_list.islice(0, 25)) == list(range(1, 50, 2))
+    assert skip_list.count_less(11) == 5
+
+
+def test_skip_list_islice_past_the_end():
+    skip_list = IndexableSkipList()
+    for key in range(5):
+        skip_list.insert(key)
+    assert list(skip_list.islice(3, 10)) == [3, 4]
+    assert list(skip_list.islice(5, 10)) == []
+
+
+def test_leaderboard_places_and_updates():
+    board = Leaderboard()
+    board.update("a", 10)
+    board.update("b", 30)
+    board.update("c", 20)
+    assert [row["user_id"] for row in board.top(3)] == ["b", "c", "a"]
+    assert board.place("a") == 3
+
+    assert board.update("a", 40)
+    assert not board.update("a", 40)
+    assert board.place("a") == 1
+    assert board.xp("a") == 40
+    assert len(board) == 3
+
+
+def test_places_share_ties():
+    rows = places([{"xp": 50}, {"xp": 50}, {"xp": 20}], first_place=4)
+    assert [row["place"] for row in rows] == [4, 4, 6]